@@ -0,0 +1,188 @@
+from .utils.device_utils.Camera import Camera
+from .utils.device_utils.SyntheticCamera import SyntheticCamera
+from .utils.device_utils.VideoFileCamera import VideoFileCamera
+from .utils.device_utils.EventLog import EventLog
+from .FrameProcessor import FrameProcessor
+from concurrent.futures import ThreadPoolExecutor
+from app.settings import *
+import re
+
+
+def parse_camera_sources(spec : str, default_source : str) -> dict[str, str]:
+
+    '''
+        Parse a camera specification of comma separated name=source pairs, e.g. "front=picamera,yard=picamera:1,
+            clip=file:videos/clip.mp4,test=synthetic". An empty specification yields a single camera named main.
+
+        Paramaters:
+            * spec (str) : Camera specification, typically the CAMERAS environment variable.
+            * default_source (str) : Source of the single camera used when no specification is given.
+        Returns:
+            * sources (dict[str, str]) : Source of each camera keyed by its name, in the order given.
+    '''
+
+    sources = {}
+
+    for index, entry in enumerate(part.strip() for part in spec.split(',') if part.strip()):
+
+        name, _, source = entry.partition('=') if '=' in entry else (f'camera{index}', '', entry)
+
+        # Names appear in URLs and capture filenames, where underscores separate fields.
+        name = re.sub(r'[^A-Za-z0-9-]', '-', name.strip()) or f'camera{index}'
+
+        if name in sources:
+            raise ValueError(f'Camera name {name} is used more than once.')
+
+        sources[name] = source.strip()
+
+    return sources or {'main' : default_source}
+
+
+def create_camera(source : str, index : int = 0) -> Camera:
+
+    '''
+        Instantiate a frame source from its specification.
+
+        Paramaters:
+            * source (str) : picamera[:number], synthetic[:seed] or file:<path>.
+            * index (int) : Position of the camera, seeds synthetic sources so each camera renders a different scene.
+    '''
+
+    kind, _, argument = source.partition(':')
+
+    if kind == 'synthetic':
+        return SyntheticCamera(resolution=high_resolution, framerate=high_frame_rate, seed=int(argument or index), capture_format=CAPTURE_FORMAT)
+
+    if kind == 'file':
+        return VideoFileCamera(path=argument, resolution=high_resolution, framerate=high_frame_rate, capture_format=CAPTURE_FORMAT)
+
+    if kind == 'picamera':
+        return Camera(
+            resolution=high_resolution,
+            framerate=high_frame_rate,
+            content_type=content_type,
+            use_video_port=use_video_port,
+            camera_num=int(argument or 0),
+            capture_format=CAPTURE_FORMAT
+        )
+
+    raise ValueError(f'Unknown camera source {source}, expected picamera, synthetic or file:<path>.')
+
+
+class CameraManager(object):
+
+    '''
+        Runs each named camera through its own pipeline, with its own detector, tracker and threat state. The CPU heavy
+            detection and encoding stages of every camera are run on one bounded worker pool, so cameras take turns on
+            the available cores rather than each adding threads which contend for them.
+    '''
+
+    def __init__(self, sources : dict[str, str], worker_threads : int = WORKER_THREADS, event_log : EventLog | None = None):
+
+        '''
+            Paramaters:
+                * sources (dict[str, str]) : Source specification of each camera keyed by name, the first is the default.
+                * worker_threads (int) : Size of the worker pool shared between cameras.
+                * event_log (EventLog | None) : Store every camera's track lifecycle events are recorded to.
+        '''
+
+        self.cameras = {name : create_camera(source, index) for index, (name, source) in enumerate(sources.items())}
+        self.processors = {}
+        self.event_log = event_log
+
+        # A lone camera has nothing to share CPU with, its stages run inline on its own pipeline thread.
+        self.worker_pool = ThreadPoolExecutor(max_workers=worker_threads, thread_name_prefix='camera-worker') \
+            if len(self.cameras) > 1 else None
+
+        # Cameras which failed to start, with the reason.
+        self.errors = {}
+
+
+    @property
+    def names(self) -> list[str]:
+
+        return list(self.cameras)
+
+
+    @property
+    def default_name(self) -> str:
+
+        ''' First camera which started, or the first configured if none have yet. '''
+
+        return next(iter(self.processors), next(iter(self.cameras)))
+
+
+    def get(self, name : str | None = None) -> FrameProcessor | None:
+
+        ''' Pipeline of a named camera, the default camera if no name is given, None if it is unknown or failed. '''
+
+        return self.processors.get(name or self.default_name)
+
+
+    def initialise(self, settings : dict) -> None:
+
+        '''
+            Bring up each camera and its pipeline, warming each up with a single frame. A camera which fails is reported
+                and left out rather than preventing the others from starting.
+
+            Paramaters:
+                * settings (dict) : Application settings applied to every pipeline.
+        '''
+
+        for name, camera in self.cameras.items():
+
+            try:
+
+                camera.initialise_camera()
+
+                frame_processor = FrameProcessor(camera, camera_name=name, worker_pool=self.worker_pool, event_log=self.event_log)
+                frame_processor.update_modules_settings(settings)
+                frame_processor.warm_up()
+
+                self.processors[name] = frame_processor
+
+            except Exception as e:
+
+                self.errors[name] = str(e)
+                print(f'Failed to initialise camera {name}!\n\n{e}')
+
+        if not self.processors:
+            raise RuntimeError(f'No cameras could be started: {self.errors}')
+
+
+    def start(self) -> None:
+
+        for frame_processor in self.processors.values():
+            frame_processor.start()
+
+
+    def stop(self) -> None:
+
+        for frame_processor in self.processors.values():
+            frame_processor.stop()
+
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown(wait=False)
+
+
+    def update_settings(self, settings : dict) -> None:
+
+        ''' Apply updated application settings to every camera. '''
+
+        for frame_processor in self.processors.values():
+            frame_processor.update_modules_settings(settings)
+
+
+    def status(self) -> list[dict]:
+
+        ''' Name, activity and frame rate of each configured camera. '''
+
+        return [
+            {
+                'name' : name,
+                'active' : name in self.processors and camera.is_active(),
+                'fps' : round(self.processors[name].telemetry.fps(), 1) if name in self.processors else 0.0,
+                'error' : self.errors.get(name)
+            }
+            for name, camera in self.cameras.items()
+        ]
@@ -4,19 +4,50 @@ from app.utils.cv_utils.Annotate import Annotations
 from app.utils.cv_utils.ObjectDetection import ObjectDetection
 from app.utils.cv_utils.ObjectTracking import ObjectTracking
 from app.utils.cv_utils.ThreatManagement import ThreatManagement
+from app.utils.cv_utils.FrameFormat import YUV420, luma_plane, yuv420_to_bgr
+from app.utils.device_utils.ConfigManager import ConfigManager
+from app.utils.device_utils.FileManager import FileManager
+from app.utils.device_utils.EventLog import EventLog
+from app.utils.pipeline_utils.Metrics import PipelineMetrics
+from app.utils.pipeline_utils.Profiler import PipelineProfiler, StackSampler
+from app.utils.pipeline_utils.Telemetry import TelemetryAggregator
+from app.utils.pipeline_utils.StreamVariants import StreamVariant, VariantRegistry
+from app.utils.pipeline_utils.QualityController import QualityController
+from app.utils.pipeline_utils.FramePool import FramePool
+from app.utils.LazyImport import lazy_import
 from .settings import *
-import cv2 
+from concurrent.futures import Executor, Future
+from copy import deepcopy
+from time import perf_counter
+import numpy as np
+import threading
+import time
+
+cv2 = lazy_import('cv2')
 
 
 class FrameProcessor(object):
 
     ''' Pipeline processing class. '''
 
-    def __init__(self, camera : Camera):
-
-        ''' camera : Camera - Camera object. '''
+    def __init__(
+            self,
+            camera : Camera,
+            camera_name : str = 'main',
+            worker_pool : Executor | None = None,
+            event_log : EventLog | None = None
+        ):
+
+        '''
+            camera : Camera - Camera object.
+            camera_name : str - Name the camera is served and its captures are tagged under.
+            worker_pool : Executor | None - Pool shared between cameras for detection and encoding, None to run inline.
+            event_log : EventLog | None - Store track lifecycle events are queued to, None to not record them.
+        '''
 
         self.camera = camera
+        self.camera_name = camera_name
+        self.worker_pool = worker_pool
         self.annotations = Annotations()
         self.object_detection = ObjectDetection()
         self.object_tracking = ObjectTracking()
@@ -25,67 +56,444 @@ class FrameProcessor(object):
             CLIENT_PASSWORD=APP_PASSWORD,
             TARGET_EMAIL=RECIPIENT_EMAIL, 
             MAX_THREAT_LEVEL=3,
-            CAPTURES_DIR=CAPTURES_DIR_PATH
+            CAPTURES_DIR=CAPTURES_DIR_PATH,
+            CAMERA_NAME=camera_name
         )
 
+        # Settings currently applied to the running modules, used to diff incoming changes against.
+        self.applied_settings = {}
+
+        # Changes waiting to be swapped in between frames, guarded by the settings lock.
+        self.pending_settings = {}
+        self.settings_lock = threading.Lock()
+
+        # Whether a pipeline loop is currently consuming frames.
+        self.pipeline_active = False
+
+        # Per stage timings and counters for the pipeline.
+        self.metrics = PipelineMetrics()
+
+        # On demand profiling, idle until requested through the admin routes.
+        self.profiler = PipelineProfiler(PROFILES_DIR_PATH)
+        self.sampler = StackSampler(PROFILES_DIR_PATH)
+
+        # Identity of the thread running the frame loop, the target for stack sampling.
+        self.pipeline_thread_id = None
+
+        # Producer thread and the stream variants its encoded frames are shared through.
+        self.pipeline_thread = None
+        self.stop_event = threading.Event()
+        self.stream_variants = VariantRegistry()
+
+        # Latest annotated frame as (index, capture time, frame, detections) and its JPEG as (index, bytes), encoded on
+        #   demand for snapshot polling when no viewer is watching the full stream. The frame is a pooled buffer owned by
+        #   latest_frame until it is replaced, swapped and read under the snapshot lock. YUV420 frames nothing needed in
+        #   colour are held unrendered with their detections instead, rendered only if a snapshot is requested.
+        self.frame_index = 0
+        self.latest_frame = None
+        self.snapshot_cache = None
+        self.snapshot_lock = threading.Lock()
+
+        # Annotation and display buffers reused from frame to frame rather than allocated per copy.
+        self.frame_pool = FramePool(size=4)
+
+        # Detection state carried between frames.
+        self.prev_raw_frame = None
+        self.tracked_detections = []
+
+        # Live health snapshot pushed to the status page, seeded with a single scan of todays captures.
+        self.telemetry = TelemetryAggregator(camera)
+        self.telemetry.seed_captures_today(len(FileManager().serve_captures_today(CAPTURES_DIR_PATH)))
+        self.telemetry.register_queue('pending_settings', lambda: len(self.pending_settings))
+        self.telemetry.register_queue('stream_subscribers', self.stream_variants.subscribers)
+
+        # Steps stream and analysis quality to hold the camera frame rate when the device falls behind.
+        self.quality_controller = QualityController(target_fps=camera.framerate, name=camera_name)
+        self.telemetry.register_section('adaptive_quality', self.quality_controller.status)
+        self.telemetry.register_section('tiles', self.object_detection.tile_statistics)
+        self.telemetry.register_section('frame_pool', self.frame_pool.status)
+        self.telemetry.register_section('stream_latency', self.metrics.stream_latency_summary)
+        self.telemetry.register_section('track_lifecycle', self.object_tracking.scheduler.status)
+
+        # Track lifecycle events are queued to the event log, which writes them off the frame loop.
+        self.event_log = event_log
+
+        if event_log is not None:
+            self.object_tracking.event_listener = self.record_event
+            self.threat_manager.event_listener = self.record_event
+            self.telemetry.register_section('event_log', event_log.status)
+
     
-    def generate_frames(self):
+    def start(self) -> None:
+
+        ''' Run the pipeline on a background thread, publishing encoded frames into the shared frame buffer. '''
+
+        if self.pipeline_thread is not None and self.pipeline_thread.is_alive():
+            return
+
+        self.stop_event.clear()
+
+        self.pipeline_thread = threading.Thread(target=self.run_pipeline, name=f'frame-pipeline-{self.camera_name}', daemon=True)
+        self.pipeline_thread.start()
+
+
+    def stop(self) -> None:
+
+        ''' Stop the pipeline thread, the camera is closed once it exits. '''
+
+        self.stop_event.set()
 
-        ''' Generator function to yield JPEG fames encoded for Flask web server streaming. '''
+        if self.pipeline_thread is not None:
+            self.pipeline_thread.join()
+            self.pipeline_thread = None
+
+
+    def run_pipeline(self) -> None:
+
+        ''' Frame loop run by the pipeline thread, a single producer shared by every viewer. '''
 
         try:
+
+            self.pipeline_active = True
+            self.pipeline_thread_id = threading.get_ident()
+
+            while not self.stop_event.is_set():
+                self.process_frame()
+
+        finally:
+
+            self.pipeline_active = False
+            self.pipeline_thread_id = None
+            self.profiler.cancel()
+
+            # Resource clean up.
+            self.camera.close_camera()
+
+
+    def process_frame(self) -> bool:
+
+        '''
+            Capture, analyse and annotate a single frame, encoding it for each stream variant being watched.
+
+            Returns:
+                * processed : (bool) : False if the camera failed to deliver a frame.
+        '''
+
+        # Swap in any settings changed since the previous frame.
+        self.apply_pending_settings()
+
+        profiling = self.profiler.armed
+
+        if profiling:
+            self.profiler.begin_frame()
+
+        mark = perf_counter()
+        
+        # Fetch frame from camera, stamped with its sequence number and monotonic capture time, which travel with it to
+        #   every viewer.
+        raw_frame, frame_seq, captured_at = self.camera.read_stamped_frame()
+
+        # Processing latency is measured from the frame arriving, waiting on the sensor is excluded.
+        frame_start = mark = self.metrics.lap('capture', mark)
+
+        # Camera failed to deliver a frame, count it and try again.
+        if raw_frame is None:
+            self.metrics.increment('frames_dropped')
+            return False
+
+        yuv_input = self.camera.capture_format == YUV420
+
+        # YUV420 frames lead with their luma plane, detection reads it in place with no colour conversion at all.
+        source_frame = luma_plane(raw_frame) if yuv_input else raw_frame
+
+        # Analyse a downscaled copy when adaptive quality has traded detection resolution for frame rate.
+        analysis_frame = self.resize_frame(source_frame, self.object_detection.analysis_scale)
+
+        # Pursue detection logic is both current & previous frames are available, at the same analysis scale.
+        if self.prev_raw_frame is not None and self.prev_raw_frame.shape == analysis_frame.shape:
             
-            prev_raw_frame = None
-            persistent_detections = {}
-            tracked_detections = []
+            # Return detection bounding boxes.
+            _, detection_bboxes = self.submit(
+                self.object_detection.detect_motion, self.prev_raw_frame, analysis_frame
+            ).result()
 
-            while True:
+            # Detection stages are timed internally, fold them into the pipeline histograms.
+            for stage, seconds in self.object_detection.stage_timings.items():
+                self.metrics.observe(stage, seconds)
+
+            # Lighting jumps return no boxes, so existing tracks are carried over below without being updated.
+            if self.object_detection.global_change:
+                self.metrics.increment('global_changes')
+
+            mark = perf_counter()
+
+            # If bounding boxes returned.
+            if detection_bboxes:
                 
-                # Fetch frame from camera.
-                raw_frame = self.camera.read_frame()
-                annotated_frame = raw_frame.copy()
-                thresholded_frame = raw_frame.copy()
-
-                # Pursue detection logic is both current & previous frames are available.
-                if prev_raw_frame is not None:
-                    
-                    # Return detection bounding boxes.
-                    thresholded_frame, detection_bboxes = self.object_detection.detect_motion(prev_raw_frame.copy(), raw_frame)
-
-                    # If bounding boxes returned.
-                    if detection_bboxes:
-                        
-                        # Track the detections by assigning IDs.
-                        tracked_detections = self.object_tracking.update_tracker(detection_bboxes)
-                        
-                        # List -> Dict w/ ID key.
-                        persistent_detections = {detection['ID']: detection for detection in tracked_detections}
-
-                    else:
-                        
-                        # Dict -> List when no other detections present.
-                        tracked_detections = list(persistent_detections.values())
-
-                # Annotate detections in frame with processed detection data. 
-                annotated_frame = self.annotations.annotate_frame(frame=annotated_frame, detections=tracked_detections)
-                    
-                # Update previous frame with current.
-                prev_raw_frame = raw_frame.copy()
-
-                # Switch colour channels RGB -> BGR.
-                annotated_frame = self.convert_frame_colour_channels(annotated_frame)
-
-                # Check detections, their threat levels and whether or not they need to be handled.
-                self.threat_manager.handle_threats(tracked_detections, annotated_frame)
-
-                # Encode raw frame.
-                encoded_frame = self.encode_frame_2_jpeg(annotated_frame)
-
-                # Yield that frame for streaming.
-                yield (
-                    b'--frame\r\n'
-                    b'Content-Type: image/jpeg\r\n\r\n' + encoded_frame + b'\r\n'
-                )
+                # Track the detections by assigning IDs.
+                self.tracked_detections = self.object_tracking.update_tracker(detection_bboxes)
+
+            else:
+
+                # Nothing moved, tracks are still escalated and pruned as their timers fall due.
+                self.tracked_detections = self.object_tracking.tick()
+
+            mark = self.metrics.lap('tracking', mark)
+
+        tracked_detections = self.tracked_detections
+
+        # Update previous frame with current, after a global change this resets the reference to the new lighting. Detection
+        #   only reads its inputs, so the frame is handed over rather than copied.
+        self.prev_raw_frame = analysis_frame
+
+        due_variants = self.stream_variants.due(perf_counter())
+
+        # RGB frames are always rendered. A YUV420 frame is only converted to colour when a viewer is due a frame or a
+        #   threat is about to be captured from it.
+        capture_time = time.time() - (time.monotonic() - captured_at)
+
+        if not yuv_input or due_variants or any(
+            detection['threat_level'] >= self.threat_manager.MAX_THREAT_LEVEL for detection in tracked_detections
+        ):
+            display_frame, mark = self.render_display_frame(raw_frame, tracked_detections, mark)
+            latest_frame = (self.frame_index + 1, capture_time, display_frame, None)
+        else:
+            display_frame = None
+            latest_frame = (self.frame_index + 1, capture_time, raw_frame, [dict(detection) for detection in tracked_detections])
+
+        # Check detections, their threat levels and whether or not they need to be handled. The frame is only absent
+        #   when no detection has reached the threat level which would capture it.
+        self.threat_manager.handle_threats(tracked_detections, display_frame)
+
+        self.frame_index += 1
+
+        # The display buffer now belongs to latest_frame, the one it replaces goes back to the pool once no snapshot
+        #   can be encoding it.
+        with self.snapshot_lock:
+            previous_frame, self.latest_frame = self.latest_frame, latest_frame
+
+        if previous_frame is not None and previous_frame[3] is None:
+            self.frame_pool.release(previous_frame[2])
+
+        mark = perf_counter()
+
+        # Encode and hand the frame to each variant being watched.
+        if display_frame is not None:
+            mark = self.publish_variants(display_frame, mark, due_variants, frame_seq, captured_at)
+
+        self.update_counters(tracked_detections)
+        self.telemetry.record_frame(mark - frame_start, tracked_detections, self.threat_manager.captures_taken)
+
+        if self.quality_controller.update(self.telemetry.fps(), self.telemetry.latency()):
+            self.object_detection.analysis_scale = self.quality_controller.settings['analysis_scale']
+
+        if profiling:
+            self.profiler.end_frame()
+
+        return True
+
+
+    def render_display_frame(self, raw_frame, detections : list[dict], mark : float | None = None) -> tuple[np.ndarray, float | None]:
+
+        '''
+            Annotate a frame and convert it to display colour order, in a buffer from the frame pool which the caller owns
+                until it is released. The raw frame is never written, so it can serve as the next detection reference.
+
+            Paramaters:
+                * raw_frame : (np.ndarray) : Frame as delivered by the camera, in its capture format.
+                * detections : (list[dict]) : Tracked detections to annotate.
+                * mark : (float | None) : perf_counter value the stage began at, None to leave the stage untimed.
+            Returns:
+                * display_frame, mark : (tuple[np.ndarray, float | None]) : Rendered frame and the perf_counter value it
+                    was finished at.
+        '''
+
+        metrics = self.metrics if mark is not None else None
+
+        if self.camera.capture_format == YUV420:
+
+            # Convert straight into the display buffer and annotate it there, it is already in display colour order.
+            height, width = luma_plane(raw_frame).shape
+            display_frame = yuv420_to_bgr(raw_frame, dst=self.frame_pool.acquire((height, width, 3)))
+
+            mark = metrics.lap('colour_conversion', mark) if metrics else mark
+
+            self.annotations.annotate_frame(frame=display_frame, detections=detections)
+
+            return display_frame, metrics.lap('annotation', mark) if metrics else mark
+
+        # Annotate a pooled copy, leaving the raw frame untouched.
+        annotated_frame = self.frame_pool.acquire(raw_frame.shape, raw_frame.dtype)
+        np.copyto(annotated_frame, raw_frame)
+
+        # Annotate detections in frame with processed detection data. 
+        annotated_frame = self.annotations.annotate_frame(frame=annotated_frame, detections=detections)
+
+        mark = metrics.lap('annotation', mark) if metrics else mark
+
+        # Switch colour channels RGB -> BGR, straight into the display buffer, then return the annotation buffer.
+        display_frame = self.convert_frame_colour_channels(
+            annotated_frame, dst=self.frame_pool.acquire(raw_frame.shape[:2] + (3,), raw_frame.dtype)
+        )
+        self.frame_pool.release(annotated_frame)
+
+        return display_frame, metrics.lap('colour_conversion', mark) if metrics else mark
+
+
+    def publish_variants(
+            self,
+            annotated_frame,
+            mark : float,
+            due_variants : list[StreamVariant] | None = None,
+            frame_seq : int = 0,
+            captured_at : float | None = None
+        ) -> float:
+
+        '''
+            Produce each due stream variant once from the shared annotated frame. Variants without subscribers or not yet
+                due for their frame rate are skipped before any resizing or encoding happens. Variants sharing a scale
+                share a single resize.
+
+            Paramaters:
+                * annotated_frame : (np.ndarray) : Annotated frame in display colour order.
+                * mark : (float) : perf_counter value the encode stage began at.
+                * due_variants : (list[StreamVariant] | None) : Variants already found due this frame, None to check.
+                * frame_seq : (int) : Camera sequence number of the frame, sent to viewers with each part.
+                * captured_at : (float | None) : time.monotonic() capture time of the frame, sent alongside it.
+            Returns:
+                * mark : (float) : perf_counter value once every variant has been published.
+        '''
+
+        if due_variants is None:
+            due_variants = self.stream_variants.due(mark)
+
+        if not due_variants:
+            return mark
+
+        # Adaptive quality scales every variant down and caps its JPEG quality while the device is falling behind.
+        quality_settings = self.quality_controller.settings
+
+        # Snapshots stay at full scale and the configured quality whatever the stream is degraded to.
+        default_quality = self.stream_variants.default.quality
+        degraded = quality_settings['stream_scale'] < 1.0 or quality_settings['jpeg_quality'] < default_quality
+
+        resized_frames = {}
+        encode_jobs = []
+
+        for variant in due_variants:
+
+            scale = round(variant.scale * quality_settings['stream_scale'], 2)
+            frame = resized_frames.get(scale)
+
+            if frame is None:
+                frame = self.resize_frame(annotated_frame, scale)
+                resized_frames[scale] = frame
+
+            encode_jobs.append((variant, self.submit(self.encode_frame_2_jpeg, frame, min(variant.quality, quality_settings['jpeg_quality']))))
+
+        encoded_frames = [(variant, job.result()) for variant, job in encode_jobs]
+
+        mark = self.metrics.lap('encode', mark)
+
+        for variant, encoded_frame in encoded_frames:
+
+            variant.frame_buffer.publish(encoded_frame, frame_seq, captured_at)
+
+            # Full stream frames double as the snapshot, saving a second encode for pollers, unless degraded.
+            if variant is self.stream_variants.default and not degraded:
+                self.snapshot_cache = (self.frame_index, encoded_frame)
+
+        return self.metrics.lap('yield', mark)
+
+
+    def submit(self, function, *args) -> Future:
+
+        ''' Run a CPU heavy stage on the shared worker pool, or inline when there is none. '''
+
+        if self.worker_pool is not None:
+            return self.worker_pool.submit(function, *args)
+
+        future = Future()
+        future.set_result(function(*args))
+
+        return future
+
+
+    def snapshot(self) -> tuple[int, float, bytes] | None:
+
+        '''
+            Latest annotated frame as a JPEG at full scale and the default stream's configured quality, never the adaptive
+                level the stream is currently degraded to. Encoded at most once per frame however often it is polled.
+
+            Returns:
+                * snapshot : (tuple[int, float, bytes] | None) : Frame index, capture time and JPEG bytes, None before
+                    the first frame.
+        '''
+
+        # Held while encoding, the pipeline cannot recycle the frame's buffer underneath it.
+        with self.snapshot_lock:
+
+            if self.latest_frame is None:
+                return None
+
+            index, captured_at, frame, detections = self.latest_frame
+
+            cached = self.snapshot_cache
+
+            if cached is None or cached[0] != index:
+
+                # Frame was held unrendered, render a private copy for this snapshot alone.
+                if detections is not None:
+                    frame, _ = self.render_display_frame(frame, detections)
+
+                cached = self.snapshot_cache = (index, self.encode_frame_2_jpeg(frame, self.stream_variants.default.quality))
+
+                if detections is not None:
+                    self.frame_pool.release(frame)
+
+        return index, captured_at, cached[1]
+
+
+    def resize_frame(self, frame, scale : float):
+
+        ''' Downscale a frame by a factor, returning it untouched at full scale. '''
+
+        if scale >= 1.0:
+            return frame
+
+        height, width = frame.shape[:2]
+
+        return cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+    def generate_frames(self, variant : StreamVariant | None = None, subscribed : bool = False):
+
+        '''
+            Generator function to yield JPEG fames encoded for Flask web server streaming, read from the shared frame buffer
+                of the requested stream variant. A variant fetched with subscribe=True is passed with subscribed=True,
+                the subscription is released once the stream ends either way.
+        '''
+
+        frame_buffer = (variant or self.stream_variants.default).frame_buffer
+        sequence = 0
+
+        if not subscribed:
+            frame_buffer.subscribe()
+
+        try:
+
+            while True:
+
+                sequence, part, captured_at = frame_buffer.wait_for_frame(sequence, timeout=5.0)
+
+                # No fresh frame within the timeout, keep waiting.
+                if part is None:
+                    continue
+
+                self.metrics.observe_stream_latency(time.monotonic() - captured_at)
+
+                # Yield the preformatted header, JPEG payload and trailer as separate chunks, leaving the payload uncopied.
+                yield from part
 
         except GeneratorExit:
 
@@ -94,15 +502,60 @@ class FrameProcessor(object):
 
         finally:
 
-            # Resource clean up.
-            self.camera.close_camera()
+            frame_buffer.unsubscribe()
 
     
-    def encode_frame_2_jpeg(self, frame):
+    def warm_up(self) -> None:
+
+        '''
+            Run a single frame through each stage so lazy imports, allocator pools and codec tables are initialised
+                before the first viewer connects.
+        '''
+
+        frame = self.camera.read_frame()
+
+        if frame is None:
+            return
+
+        detection_frame = luma_plane(frame) if self.camera.capture_format == YUV420 else frame
+
+        self.object_detection.detect_motion(detection_frame.copy(), detection_frame)
+
+        display_frame, _ = self.render_display_frame(frame, [])
+        self.encode_frame_2_jpeg(display_frame)
+        self.frame_pool.release(display_frame)
+
+
+    def update_counters(self, tracked_detections : list[dict]) -> None:
+
+        ''' Refresh frame, track and alert counters once a frame has been fully processed. '''
+
+        metrics = self.metrics
+
+        metrics.increment('frames')
+        metrics.set_gauge('active_tracks', len(tracked_detections))
+
+        # Tracker and threat manager keep running totals, mirror them rather than re-counting.
+        metrics.counters['tracks'] = self.object_tracking.ID_increment_counter - 1
+        metrics.counters['alerts'] = self.threat_manager.alerts_raised
+        metrics.counters['suppressed_alerts'] = self.threat_manager.alerts_suppressed
+        metrics.counters['duplicate_captures'] = self.threat_manager.captures_deduplicated
 
-        ''' Encode parsed frame '''
 
-        success, buffer = cv2.imencode('.jpg', frame)
+    def record_event(self, event : str, detection : dict, at : float) -> None:
+
+        ''' Queue a track lifecycle event from the tracker or threat manager, tagged with this camera. '''
+
+        self.event_log.record(event, self.camera_name, detection, at)
+
+    
+    def encode_frame_2_jpeg(self, frame, quality : int | None = None):
+
+        ''' Encode parsed frame, at the given JPEG quality if one is specified. '''
+
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)] if quality is not None else []
+
+        success, buffer = cv2.imencode('.jpg', frame, params)
 
         if not success:
             raise ValueError('Failed to encode frame, please check input.')
@@ -110,24 +563,74 @@ class FrameProcessor(object):
         return buffer.tobytes()
 
     
-    def convert_frame_colour_channels(self, frame):
+    def convert_frame_colour_channels(self, frame, dst = None):
 
-        ''' Switch colour channels to prevent confusion. '''
+        ''' Switch colour channels to prevent confusion, written into dst when a buffer of the same shape is given. '''
 
-        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=dst)
 
     
-    def update_modules_settings(self, settings : dict):
+    def update_modules_settings(self, settings : dict) -> dict:
+
+        '''
+            Diff incoming settings against those currently applied and queue only the changed sections. Changes are
+                swapped in between frames by the pipeline, or immediately if no pipeline is running.
+
+            Paramaters:
+                * settings : (dict) : Full settings dictionary loaded from the configuration file.
+            Returns:
+                * changes : (dict) : Changed sections mapped to their changed keys.
+        '''
+
+        changes = ConfigManager.diff_settings(self.applied_settings, settings)
 
-        ''' Update module objects initialised in pipelines. '''
+        if not changes:
+            return changes
+
+        with self.settings_lock:
+
+            for section in changes:
+                self.pending_settings[section] = deepcopy(settings[section])
+
+        # No frame boundary to wait for, apply straight away.
+        if not self.pipeline_active:
+            self.apply_pending_settings()
+
+        return changes
+
+
+    def apply_pending_settings(self) -> None:
+
+        ''' Route queued settings sections to the modules concerned with them. '''
+
+        # Cheap check to keep the frame loop free of locking when nothing has changed.
+        if not self.pending_settings:
+            return
+
+        with self.settings_lock:
+            pending, self.pending_settings = self.pending_settings, {}
 
         modules_map = {
-            'stream_quality' : (self.camera, 'update_settings'),
-            'motion_detection' : (self.object_detection, 'update_settings'),
+            'stream_quality' : [(self.camera, 'update_settings')],
+            'motion_detection' : [
+                (self.object_detection, 'update_settings'),
+                (self.object_tracking, 'update_settings'),
+                (self.threat_manager, 'update_settings')
+            ],
+            'alerts' : [(self.threat_manager, 'update_settings')],
         }
 
-        for key, (module, method) in modules_map.items():
+        for key, module_config in pending.items():
+
+            for module, method in modules_map.get(key, []):
+                getattr(module, method)(module_config)
 
-            module_config = settings.get(key, {})
+            self.applied_settings[key] = module_config
 
-            getattr(module, method)(module_config)
+        # Target the frame rate of the selected stream profile, picked up by the camera above.
+        if 'stream_quality' in pending:
+            self.quality_controller.configure(
+                enabled=bool(pending['stream_quality'].get('adaptive', True)),
+                target_fps=self.camera.framerate
+            )
+            self.object_detection.analysis_scale = self.quality_controller.settings['analysis_scale']
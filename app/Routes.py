@@ -1,12 +1,59 @@
 
 from flask import Flask, Response, render_template, request, jsonify, send_from_directory, Blueprint, current_app
 from .settings import *
+from .utils.device_utils.EventLog import EVENT_TYPES
+import sqlite3
+import json
+import math
 import re
 import time 
 
 # Register main app blueprint.
 main = Blueprint('main', __name__)
 
+# Endpoints which cannot be served until the camera and pipeline have warmed up.
+PIPELINE_ENDPOINTS = {
+    'main.profile_pipeline', 'main.serve_profile', 'main.sample_pipeline', 'main.status_stream', 'main.snapshot',
+    'main.camera_snapshot'
+}
+
+# Captures are never rewritten once saved, so browsers may keep them for a year without revalidating.
+CAPTURE_MAX_AGE : int = 365 * 24 * 60 * 60
+
+# Distinguishes snapshot ETags across restarts, where frame indexes begin again from one.
+BOOT_TOKEN : str = format(time.time_ns(), 'x')
+
+
+def pipeline_ready() -> bool:
+
+    ''' Whether the camera and pipeline have finished warming up. '''
+
+    return current_app.ready.is_set()
+
+
+@main.before_request
+def require_pipeline():
+
+    ''' Turn away requests needing the pipeline while it is still warming up. '''
+
+    if request.endpoint in PIPELINE_ENDPOINTS and not pipeline_ready():
+        return jsonify({"status": "error", "message": "Camera is still starting up."}), 503
+
+
+@main.route('/ready')
+def readiness():
+
+    ''' Readiness probe, 200 once the camera and pipeline are warm and 503 until then. '''
+
+    if pipeline_ready():
+        return jsonify({"status": "ready", "startup_seconds": round(current_app.startup_seconds, 3)})
+
+    if current_app.startup_error:
+        return jsonify({"status": "failed", "message": current_app.startup_error}), 503
+
+    return jsonify({"status": "starting"}), 503
+
+
 @main.route('/')
 def index():
 
@@ -14,27 +61,70 @@ def index():
 
     ''' Application main page. '''
 
-    camera_active = camera.is_active()
+    camera_active = pipeline_ready() and camera.is_active()
+
+    camera_manager = current_app.camera_manager
+
+    # A single camera keeps the unnamed stream, several are each shown under their own name.
+    if len(camera_manager.processors) > 1:
+        streams = [{'name' : name, 'url' : stream_url(f'/video_feed/{name}')} for name in camera_manager.processors]
+    else:
+        streams = [{'name' : camera_manager.default_name, 'url' : stream_url('/video_feed')}]
 
     return render_template(
         'index.html',
-        camera_active=camera_active
+        camera_active=camera_active,
+        streams=streams
     )
 
 
+def stream_url(path : str) -> str:
+
+    ''' URL of a streaming endpoint, served by the asyncio stream server on its own port when enabled. '''
+
+    if STREAM_MODE == 'asyncio':
+        return f'{request.scheme}://{request.host.rsplit(":", 1)[0]}:{STREAM_PORT}{path}'
+
+    return path
+
+
+@main.route('/cameras')
+def cameras():
+
+    ''' Name, activity and frame rate of each configured camera. '''
+
+    return jsonify(current_app.camera_manager.status())
+
+
 @main.route('/video_feed')
-def video_feed():
+@main.route('/video_feed/<camera_name>')
+def video_feed(camera_name=None):
 
-    camera = current_app.camera
+    ''' Route to render the cameras captured frames, optionally as a variant via ?scale=, ?fps= and ?quality=. '''
 
-    ''' Route to render the cameras captured frames. '''
+    camera_manager = current_app.camera_manager
 
-    # If camera status is active.
-    if camera.is_active():
+    if camera_name is not None and camera_name not in camera_manager.cameras:
+        return jsonify({"status": "error", "message": f"Unknown camera {camera_name}."}), 404
+
+    frame_processor = camera_manager.get(camera_name) if pipeline_ready() else None
 
-        # Return generator function response with cameras frames.
+    # If camera status is active.
+    if frame_processor is not None and frame_processor.camera.is_active():
+
+        try:
+            variant = frame_processor.stream_variants.get(
+                scale=request.args.get('scale', type=float),
+                fps=request.args.get('fps', type=int),
+                quality=request.args.get('quality', type=int),
+                subscribe=True
+            )
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        # Return generator function response with cameras frames, the subscription taken above is released when it ends.
         return Response(
-            current_app.frame_processor.generate_frames(),
+            frame_processor.generate_frames(variant, subscribed=True),
             mimetype='multipart/x-mixed-replace; boundary=frame'
         )
     else:
@@ -82,7 +172,8 @@ def update_settings():
         settings = config_manager.load_settings() 
 
         ''' 3) Push values into frameprocessor where all modules are initialised. '''
-        frame_processor.update_modules_settings(settings)
+        # Cameras still warming up load settings from the config file once their pipeline is built.
+        current_app.camera_manager.update_settings(settings)
 
         # Return JSON success response. 
         return jsonify({"status": "success", "message": "Settings updated successfully"})
@@ -92,10 +183,55 @@ def update_settings():
         return jsonify({"status": "error", "message": f"Failed to update settings!\n{e}"})
 
 
+@main.route('/snapshot.jpg')
+def snapshot():
+
+    ''' Latest annotated frame of the default camera as a still image for dashboards polling it, revalidated by ETag. '''
+
+    return snapshot_response(current_app.frame_processor)
+
+
+@main.route('/snapshot/<camera_name>.jpg')
+def camera_snapshot(camera_name):
+
+    ''' Latest annotated frame of a named camera. '''
+
+    frame_processor = current_app.camera_manager.get(camera_name)
+
+    if frame_processor is None:
+        return jsonify({"status": "error", "message": f"Unknown camera {camera_name}."}), 404
+
+    return snapshot_response(frame_processor)
+
+
+def snapshot_response(frame_processor) -> Response:
+
+    ''' Conditional response for the latest frame of a pipeline, 304 while the client already holds it. '''
+
+    snapshot = frame_processor.snapshot()
+
+    if snapshot is None:
+        return jsonify({"status": "error", "message": "No frame captured yet."}), 503
+
+    index, captured_at, frame = snapshot
+
+    response = Response(frame, mimetype='image/jpeg')
+    response.set_etag(f'{BOOT_TOKEN}-{frame_processor.camera_name}-{index}')
+    response.last_modified = captured_at
+    response.cache_control.no_cache = True
+
+    return response.make_conditional(request)
+
+
 @main.route('/captures/<path:filename>')
 def serve_capture_file(filename):
-    # serves GET /captures/<filename>
-    return send_from_directory(CAPTURES_DIR_PATH, filename)
+
+    ''' Serve a stored capture. Conditional and Range requests are answered by send_from_directory from the file's mtime and size. '''
+
+    response = send_from_directory(CAPTURES_DIR_PATH, filename, max_age=CAPTURE_MAX_AGE)
+    response.cache_control.immutable = True
+
+    return response
 
 
 @main.route('/captures', methods=['GET'])
@@ -136,21 +272,189 @@ def delete_capture(filename):
 @main.route('/status')
 def device_status():
 
-    camera = current_app.camera
-    file_manager = current_app.file_manager
+    ''' Render the status page from the in memory telemetry snapshot, later updates are pushed over /status/stream. '''
 
-    formatted_uptime = time.strftime('%H:%M:%S', time.gmtime(time.time() - camera.uptime)) if camera.uptime else "Inactive"
+    frame_processor = getattr(current_app, 'frame_processor', None)
 
-    captures_today = file_manager.serve_captures_today(CAPTURES_DIR_PATH)
+    if frame_processor:
+        snapshot = frame_processor.telemetry.snapshot()
+        stage_timings = frame_processor.metrics.stage_summary()
+    else:
+        snapshot = {'camera_active' : current_app.camera.is_active(), 'uptime_seconds' : None, 'captures_today' : 0}
+        stage_timings = []
+
+    uptime = snapshot['uptime_seconds']
 
     camera_status = {
-        'status' : camera.is_active(),
-        'uptime' : formatted_uptime,
-        'caps_today' : len(captures_today)
+        'status' : snapshot['camera_active'],
+        'uptime' : time.strftime('%H:%M:%S', time.gmtime(uptime)) if uptime is not None else "Inactive",
+        'caps_today' : snapshot['captures_today']
     }
 
     return render_template(
         'status.html',
-        camera_status=camera_status
+        telemetry_url=stream_url('/status/stream'),
+        camera_status=camera_status,
+        telemetry=snapshot,
+        stage_timings=stage_timings
     ) 
-    
\ No newline at end of file
+
+
+@main.route('/status/stream')
+def status_stream():
+
+    ''' Server-Sent Events stream pushing a telemetry snapshot roughly once per second, ?interval= between 0.25 and 60 seconds. '''
+
+    telemetry = current_app.frame_processor.telemetry
+    interval = request.args.get('interval', 1.0, type=float)
+
+    # Snapshots are taken on the request thread, too short an interval would spin it at the pipeline's expense.
+    if not math.isfinite(interval):
+        return jsonify({"status": "error", "message": "Interval must be a finite number of seconds."}), 400
+
+    interval = min(max(interval, 0.25), 60.0)
+
+    def generate_events():
+
+        while True:
+            yield f'data: {json.dumps(telemetry.snapshot())}\n\n'
+            time.sleep(interval)
+
+    return Response(
+        generate_events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control' : 'no-cache', 'X-Accel-Buffering' : 'no'}
+    )
+
+
+@main.route('/clock')
+def clock():
+
+    ''' Server wall clock, letting viewers line their own clock up with the capture times stamped on stream frames. '''
+
+    return jsonify({"time": time.time()}), 200, {'Cache-Control' : 'no-store'}
+
+
+@main.route('/metrics')
+def metrics():
+
+    ''' Expose pipeline counters and stage latency histograms in the Prometheus text format, ?camera= for other cameras. '''
+
+    frame_processor = current_app.camera_manager.get(request.args.get('camera'))
+    body = frame_processor.metrics.render_prometheus() if frame_processor else ''
+
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+@main.route('/events')
+def events():
+
+    '''
+        Query the track lifecycle event log. Filters, all optional: start and end as seconds since the epoch, camera,
+            track, session and event, with limit capping the number of events returned (default 1000, at most 10000).
+    '''
+
+    event = request.args.get('event')
+
+    if event is not None and event not in EVENT_TYPES:
+        return jsonify({"status": "error", "message": f"Unknown event {event}, expected one of {', '.join(EVENT_TYPES)}."}), 400
+
+    try:
+
+        results = current_app.event_log.query(
+            start=request.args.get('start', type=float),
+            end=request.args.get('end', type=float),
+            camera=request.args.get('camera'),
+            track_id=request.args.get('track', type=int),
+            session=request.args.get('session', type=int),
+            event=event,
+            # SQLite treats a negative limit as no limit at all, keep it within the cap.
+            limit=max(1, min(request.args.get('limit', 1000, type=int), 10000))
+        )
+
+    except sqlite3.Error as e:
+        return jsonify({"status": "error", "message": f"Event log unavailable: {e}"}), 503
+
+    return jsonify({"events": results, "count": len(results), **current_app.event_log.status()})
+    
+
+@main.route('/admin/profile', methods=['GET', 'POST'])
+def profile_pipeline():
+
+    ''' Arm cProfile for the next N frames of the running pipeline (POST), or report profiler status (GET). '''
+
+    profiler = current_app.frame_processor.profiler
+
+    if request.method == 'POST':
+
+        frames = request.args.get('frames', 100, type=int)
+
+        if not profiler.request(frames):
+            return jsonify({"status": "error", "message": "A profiling session is already in progress."}), 409
+
+        return jsonify({"status": "armed", **profiler.status()}), 202
+
+    return jsonify(profiler.status())
+
+
+@main.route('/admin/profile/<path:filename>')
+def serve_profile(filename):
+
+    ''' Download a stored pstats dump, or view it as text with ?format=text. '''
+
+    profiler = current_app.frame_processor.profiler
+
+    if request.args.get('format') == 'text':
+
+        try:
+            report = profiler.render_stats(filename, sort_key=request.args.get('sort', 'cumulative'))
+        except FileNotFoundError as e:
+            return jsonify({"status": "error", "message": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        return Response(report, mimetype='text/plain')
+
+    return send_from_directory(PROFILES_DIR_PATH, filename, as_attachment=True)
+
+
+@main.route('/admin/sampler/<action>', methods=['POST'])
+def sample_pipeline(action):
+
+    ''' Start or stop low rate stack sampling of the pipeline thread, written as collapsed stacks for flame graphs. '''
+
+    frame_processor = current_app.frame_processor
+    sampler = frame_processor.sampler
+
+    if action == 'start':
+
+        if frame_processor.pipeline_thread_id is None:
+            return jsonify({"status": "error", "message": "Pipeline is not running."}), 409
+
+        try:
+            started = sampler.start(
+                frame_processor.pipeline_thread_id,
+                interval=request.args.get('interval', 0.02, type=float),
+                duration=request.args.get('duration', type=float)
+            )
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        if not started:
+            return jsonify({"status": "error", "message": "Sampler is already running."}), 409
+
+        return jsonify({"status": "started", **sampler.status()}), 202
+
+    if action == 'stop':
+        sampler.stop()
+        return jsonify({"status": "stopped", **sampler.status()})
+
+    return jsonify({"status": "error", "message": f"Unknown action {action}."}), 404
+
+
+@main.route('/admin/sampler/<path:filename>')
+def serve_samples(filename):
+
+    ''' Download a collapsed stack file. '''
+
+    return send_from_directory(PROFILES_DIR_PATH, filename, as_attachment=True)
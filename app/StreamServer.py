@@ -0,0 +1,273 @@
+
+from urllib.parse import urlsplit, parse_qs
+from flask import Flask
+import asyncio
+import json
+import time
+
+
+class StreamServer(object):
+
+    '''
+        Asyncio server for the long lived streaming endpoints, /video_feed and /status/stream. Every connection is served
+            from one event loop instead of a thread each, writing the same shared frame bytes to each socket. The HTML pages
+            remain on the Flask server.
+    '''
+
+    def __init__(
+            self,
+            app : Flask,
+            host : str,
+            port : int,
+            max_buffered_bytes : int = 1_048_576,
+            drain_timeout : float = 10.0,
+            telemetry_interval : float = 1.0
+        ):
+
+        '''
+            Paramaters:
+                * app (Flask) : Application whose frame processor is streamed, once it reports ready.
+                * host (str) : Interface to listen on.
+                * port (int) : Port to listen on.
+                * max_buffered_bytes (int) : Frames are skipped for a connection while more than this is still unsent.
+                * drain_timeout (float) : Seconds a connection may stay above max_buffered_bytes without accepting any data
+                    before it is dropped.
+                * telemetry_interval (float) : Seconds between telemetry events.
+        '''
+
+        self.app = app
+        self.host = host
+        self.port = port
+        self.max_buffered_bytes = max_buffered_bytes
+        self.drain_timeout = drain_timeout
+        self.telemetry_interval = telemetry_interval
+
+        self.loop = None
+
+        # One event per streaming connection, set when a new frame is published.
+        self.frame_events = set()
+
+        self.routes = {
+            '/video_feed' : self.stream_frames,
+            '/status/stream' : self.stream_telemetry,
+        }
+
+
+    def run(self) -> None:
+
+        ''' Serve forever once the pipeline is ready, intended to be the target of a dedicated thread. '''
+
+        self.app.ready.wait()
+
+        asyncio.run(self.serve())
+
+
+    async def serve(self) -> None:
+
+        self.loop = asyncio.get_running_loop()
+
+        # Any camera publishing wakes the connections, each then checks its own buffer for a new frame.
+        frame_processors = list(self.app.camera_manager.processors.values())
+
+        for frame_processor in frame_processors:
+            frame_processor.stream_variants.add_listener(self.notify_frame)
+
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+
+        print(f'Stream server listening on {self.host}:{self.port}')
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for frame_processor in frame_processors:
+                frame_processor.stream_variants.remove_listener(self.notify_frame)
+
+
+    def notify_frame(self) -> None:
+
+        ''' Called on the pipeline thread after each publish, hands the wake up over to the event loop. '''
+
+        if self.loop is not None and self.frame_events:
+            self.loop.call_soon_threadsafe(self.wake_connections)
+
+
+    def wake_connections(self) -> None:
+
+        for event in self.frame_events:
+            event.set()
+
+
+    async def handle_connection(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+
+        ''' Parse a minimal HTTP/1.1 GET request and hand it to the matching route. '''
+
+        try:
+
+            request_line = await asyncio.wait_for(reader.readline(), timeout=10)
+            parts = request_line.decode('latin-1').split()
+
+            # Headers are read to clear them from the socket, none are needed.
+            while True:
+                header = await asyncio.wait_for(reader.readline(), timeout=10)
+                if header in (b'\r\n', b'\n', b''):
+                    break
+
+            if len(parts) != 3 or parts[0] != 'GET':
+                await self.write_error(writer, 405, 'Method Not Allowed')
+                return
+
+            url = urlsplit(parts[1])
+            query = {key : values[-1] for key, values in parse_qs(url.query).items()}
+
+            # Named cameras are streamed from /video_feed/<camera>, passed to the route alongside the query.
+            path, _, camera_name = url.path.partition('/video_feed/')
+            path = '/video_feed' if camera_name and not path else url.path
+
+            if camera_name:
+                query['camera'] = camera_name
+
+            route = self.routes.get(path)
+
+            if route is None:
+                await self.write_error(writer, 404, 'Not Found')
+                return
+
+            await route(writer, query)
+
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+
+        finally:
+            writer.close()
+
+
+    async def write_error(self, writer : asyncio.StreamWriter, status : int, reason : str) -> None:
+
+        body = reason.encode()
+
+        writer.write(
+            f'HTTP/1.1 {status} {reason}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\n'
+            f'Connection: close\r\n\r\n'.encode() + body
+        )
+
+        await writer.drain()
+
+
+    async def stream_frames(self, writer : asyncio.StreamWriter, query : dict[str, str]) -> None:
+
+        '''
+            Stream the frame buffer of the requested variant as multipart JPEG. Wake ups coalesce, so a connection still
+                writing when new frames arrive sends only the newest once it catches up. Writes never wait on the client,
+                frames are skipped outright while its unsent data is above max_buffered_bytes, and the connection is dropped
+                if it stays above without taking any data for drain_timeout.
+        '''
+
+        frame_processor = self.app.camera_manager.get(query.get('camera'))
+
+        if frame_processor is None:
+            await self.write_error(writer, 404, 'Not Found')
+            return
+
+        try:
+            variant = frame_processor.stream_variants.get(
+                scale=query.get('scale'),
+                fps=query.get('fps'),
+                quality=query.get('quality'),
+                subscribe=True
+            )
+        except ValueError:
+            await self.write_error(writer, 400, 'Bad Request')
+            return
+
+        # Subscribed by get() so the variant cannot be evicted before the first frame, released once the stream ends.
+        frame_buffer = variant.frame_buffer
+
+        # Raise the transport's own high water mark to ours, the default of 64KiB is smaller than a single full frame.
+        writer.transport.set_write_buffer_limits(high=self.max_buffered_bytes)
+
+        event = asyncio.Event()
+        last_sequence = 0
+
+        # Unsent bytes when the connection last made progress while over the limit, and when that was.
+        stalled_size = None
+        stalled_since = None
+
+        self.frame_events.add(event)
+
+        try:
+
+            writer.write(
+                b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: multipart/x-mixed-replace; boundary=frame\r\n'
+                b'Cache-Control: no-cache, private\r\n'
+                # Pages served by Flask on another port read the stream with fetch to follow each frame's latency.
+                b'Access-Control-Allow-Origin: *\r\n'
+                b'Connection: close\r\n\r\n'
+            )
+
+            while True:
+
+                await event.wait()
+                event.clear()
+
+                # Nothing awaits the writes, so a disconnect is only noticed here.
+                if writer.is_closing():
+                    break
+
+                sequence, part, captured_at = frame_buffer.latest()
+
+                if sequence == last_sequence or part is None:
+                    continue
+
+                buffered = writer.transport.get_write_buffer_size()
+
+                # Client has not taken the previous frames yet, skip rather than queue.
+                if buffered > self.max_buffered_bytes:
+
+                    now = time.monotonic()
+
+                    if stalled_size is None or buffered < stalled_size:
+                        stalled_size, stalled_since = buffered, now
+
+                    elif now - stalled_since > self.drain_timeout:
+                        # Closing would wait to flush what the client is not reading, drop the connection instead.
+                        writer.transport.abort()
+                        break
+
+                    continue
+
+                stalled_size = None
+
+                last_sequence = sequence
+
+                frame_processor.metrics.observe_stream_latency(time.monotonic() - captured_at)
+
+                # Preformatted header, payload and trailer go out as separate writes, the JPEG is never copied.
+                writer.writelines(part)
+
+        finally:
+            self.frame_events.discard(event)
+            frame_buffer.unsubscribe()
+
+
+    async def stream_telemetry(self, writer : asyncio.StreamWriter, query : dict[str, str]) -> None:
+
+        ''' Push telemetry snapshots as Server-Sent Events. '''
+
+        telemetry = self.app.frame_processor.telemetry
+
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/event-stream\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'Access-Control-Allow-Origin: *\r\n'
+            b'Connection: close\r\n\r\n'
+        )
+
+        while True:
+
+            writer.write(f'data: {json.dumps(telemetry.snapshot())}\n\n'.encode())
+
+            await asyncio.wait_for(writer.drain(), timeout=self.drain_timeout)
+            await asyncio.sleep(self.telemetry_interval)
@@ -1,35 +1,78 @@
 from app.Routes import main 
 from flask import Flask 
-from .utils.device_utils.Camera import Camera
 from app.utils.device_utils.ConfigManager import ConfigManager
 from app.utils.device_utils.FileManager import FileManager
-from .FrameProcessor import FrameProcessor
+from app.utils.device_utils.EventLog import EventLog
+from .CameraManager import CameraManager, parse_camera_sources
+import threading
+import atexit
+import time
 import os 
 from app.settings import *
 
 
-def build_app():
+def build_app(warm_up : bool = True):
+
+    '''
+        Create the application. The camera and pipeline are brought up on a background thread so the server can accept
+            requests straight away, readiness is reported through /ready.
+
+        Paramaters:
+            * warm_up (bool) : Start bringing up the camera and pipeline immediately.
+    '''
 
     app = Flask(__name__)
 
     app.file_manager = FileManager()
     app.config_manager = ConfigManager(config_file=CAMERA_CONFIG_PATH, default_config=DEFAULT_SETTINGS)
 
-    # Instantiate Camera Object, apply settings.
-    app.camera = Camera(
-        resolution=high_resolution,
-        framerate=high_frame_rate,
-        content_type=content_type,
-        use_video_port=use_video_port
-    )
+    # Track lifecycle events of every camera, written in the background.
+    app.event_log = EventLog(EVENT_LOG_PATH)
+    atexit.register(app.event_log.stop)
+
+    # Instantiate each configured camera, the first is served from the unnamed routes.
+    app.camera_manager = CameraManager(parse_camera_sources(CAMERAS, CAMERA_SOURCE), event_log=app.event_log)
+    app.camera = app.camera_manager.cameras[app.camera_manager.default_name]
 
-    @app.before_first_request
-    def initalise_modules():
-        app.camera.initialise_camera()
-        app.frame_processor = FrameProcessor(app.camera)
+    # Startup state, set by the warm up thread.
+    app.ready = threading.Event()
+    app.startup_began = time.monotonic()
+    app.startup_seconds = None
+    app.startup_error = None
 
     app.register_blueprint(main)
+
+    if warm_up:
+        threading.Thread(target=initialise_modules, args=(app,), name='pipeline-warm-up', daemon=True).start()
     
     # Return application.
     return app
-    
\ No newline at end of file
+
+
+def initialise_modules(app : Flask) -> None:
+
+    ''' Initialise the cameras and pipelines, running a frame through each so the first viewer does not pay for start up. '''
+
+    try:
+
+        camera_manager = app.camera_manager
+
+        app.event_log.start()
+
+        camera_manager.initialise(app.config_manager.load_settings())
+
+        # The default camera is the first to have started.
+        app.camera = camera_manager.cameras[camera_manager.default_name]
+        app.frame_processor = camera_manager.get()
+
+        camera_manager.start()
+
+        app.startup_seconds = time.monotonic() - app.startup_began
+        app.ready.set()
+
+        print(f'Camera and pipeline ready in {app.startup_seconds:.2f} seconds.')
+
+    except Exception as e:
+
+        app.startup_error = str(e)
+        print(f'Failed to initialise camera and pipeline!\n\n{e}')
@@ -17,6 +17,35 @@ low_frame_rate = 20
 content_type = 'jpeg'
 use_video_port = True
 
+# Frame source, 'picamera' for the onboard camera or 'synthetic' for generated frames without camera hardware.
+CAMERA_SOURCE : str = os.getenv('CAMERA_SOURCE', 'picamera')
+
+# Capture format of every camera, 'rgb' or 'yuv420' to detect motion on the luma plane and only convert frames to
+#   colour when they are streamed or captured.
+CAPTURE_FORMAT : str = os.getenv('CAPTURE_FORMAT', 'rgb').lower()
+
+# Several named cameras as name=source pairs, e.g. 'front=picamera,yard=picamera:1,clip=file:clip.mp4'. Empty runs a
+#   single camera named main from CAMERA_SOURCE.
+CAMERAS : str = os.getenv('CAMERAS', '')
+
+# Worker threads shared by every camera for detection and encoding.
+WORKER_THREADS : int = int(os.getenv('WORKER_THREADS', os.cpu_count() or 2))
+
+''' Motion Detection. '''
+
+# Columns x rows of the tile grid motion is localised with, only changing tiles are analysed in full. 1x1 analyses whole frames.
+TILE_GRID : tuple[int, int] = tuple(int(count) for count in os.getenv('TILE_GRID', '8x6').lower().split('x'))
+
+# How bounding boxes are extracted from the motion mask, 'contours' or 'components' to label every blob in one pass and
+#   filter them as arrays. Components only pay off once a frame holds a few hundred separate blobs, such as a noisy mask.
+BBOX_EXTRACTION : str = os.getenv('BBOX_EXTRACTION', 'contours').lower()
+
+''' Streaming Server. '''
+
+# 'flask' streams from the Flask server, 'asyncio' serves streaming endpoints from an event loop on STREAM_PORT.
+STREAM_MODE : str = os.getenv('STREAM_MODE', 'flask')
+STREAM_PORT : int = int(os.getenv('STREAM_PORT', 8001))
+
 ''' Paths. '''
 
 CAPTURES_DIR = 'captures'
@@ -24,6 +53,9 @@ BASE_DIR = Path(__file__).resolve().parent
 CAMER_CONFIG = 'camera_settings.json'
 CAMERA_CONFIG_PATH = os.path.join(BASE_DIR, CAMER_CONFIG)
 CAPTURES_DIR_PATH = os.path.join(BASE_DIR, CAPTURES_DIR)
+PROFILES_DIR = 'profiles'
+PROFILES_DIR_PATH = os.path.join(BASE_DIR, PROFILES_DIR)
+EVENT_LOG_PATH = os.getenv('EVENT_LOG_PATH') or os.path.join(BASE_DIR, 'events.db')
 
 ''' Base config file. '''
 
@@ -35,6 +67,7 @@ DEFAULT_SETTINGS = {
     },
     "stream_quality" : {
         "preferred_quality": "performance",
+        "adaptive": True,
         "performance": {
             "framerate": 20,
             "resolution": [
@@ -52,7 +85,8 @@ DEFAULT_SETTINGS = {
     },
     "alerts" : {
         "toggle": False,
-        "frequency": 493
+        "frequency": 493,
+        "digest": True
     },
     "client" : {
         "target_email": "example@email.com",
@@ -0,0 +1,184 @@
+/**
+ * Module to play the live feeds from their multipart streams read with fetch, rather than handing them to an <img>, so
+ * each frame's sequence number and capture time can be read from its part headers and the glass to glass latency shown
+ * over the feed. Browsers without streaming fetch keep the plain <img> stream.
+ */
+
+// Frames the latency shown is the median of.
+const LATENCY_WINDOW = 30
+
+document.addEventListener('DOMContentLoaded', function() {
+
+    if (!window.ReadableStream || !window.TextDecoder) return
+
+    estimateClockOffset().then((clockOffset) => {
+        document.querySelectorAll('.live-feed-window').forEach((feed) => playStream(feed, clockOffset))
+    })
+
+})
+
+async function estimateClockOffset(samples = 5) {
+
+    /**
+     * Milliseconds to add to the local clock to read the server's, taken from the sample with the shortest round trip.
+     * Zero if the server cannot be asked, which assumes both clocks are already in sync.
+     */
+
+    let best = null
+
+    try {
+
+        for (let sample = 0; sample < samples; sample++) {
+
+            const sent = Date.now()
+            const response = await fetch('/clock', { cache: 'no-store' })
+            const { time } = await response.json()
+            const received = Date.now()
+
+            if (best === null || received - sent < best.roundTrip) {
+                best = { roundTrip: received - sent, offset: time * 1000 - (sent + received) / 2 }
+            }
+        }
+
+    } catch (error) {
+        return best ? best.offset : 0
+    }
+
+    return best.offset
+}
+
+async function playStream(feed, clockOffset) {
+
+    /**
+     * Read a feed's stream, showing each frame as it completes and updating the latency overlay once it is decoded.
+     */
+
+    const image = feed.querySelector('img')
+    const overlay = feed.querySelector('.latency-overlay')
+
+    let response
+
+    try {
+        response = await fetch(image.dataset.streamUrl, { cache: 'no-store' })
+    } catch (error) {
+        return
+    }
+
+    if (!response.ok || !response.body) return
+
+    // Frames are drawn from here on, close the connection the <img> opened itself.
+    image.removeAttribute('src')
+
+    const reader = response.body.getReader()
+    const latencies = []
+
+    let buffer = new Uint8Array(0)
+    let previousUrl = null
+    let previousSeq = null
+    let skipped = 0
+
+    while (true) {
+
+        const { value, done } = await reader.read()
+
+        if (done) break
+
+        buffer = concatenate(buffer, value)
+
+        let part
+
+        while ((part = nextPart(buffer)) !== null) {
+
+            buffer = buffer.subarray(part.end)
+
+            const frameUrl = URL.createObjectURL(new Blob([part.payload], { type: 'image/jpeg' }))
+
+            image.src = frameUrl
+            await image.decode().catch(() => {})
+
+            if (previousUrl) URL.revokeObjectURL(previousUrl)
+            previousUrl = frameUrl
+
+            // Frames never sent to this viewer, whether skipped for pacing or while it was still catching up.
+            if (previousSeq !== null && part.seq > previousSeq + 1) skipped += part.seq - previousSeq - 1
+            previousSeq = part.seq
+
+            if (!overlay || part.captureTime === null) continue
+
+            latencies.push(Date.now() + clockOffset - part.captureTime * 1000)
+
+            if (latencies.length > LATENCY_WINDOW) latencies.shift()
+
+            overlay.hidden = false
+            overlay.textContent = `${Math.round(median(latencies))} ms glass to glass | frame ${part.seq} | ${skipped} skipped`
+        }
+    }
+}
+
+function nextPart(buffer) {
+
+    /**
+     * First complete part in the buffer as its payload, sequence number, capture time and the offset it ends at, or
+     * null until the whole part has arrived. Parts are framed by their Content-Length header.
+     */
+
+    const headerEnd = indexOfSequence(buffer, [13, 10, 13, 10])
+
+    if (headerEnd < 0) return null
+
+    const headers = new TextDecoder('latin1').decode(buffer.subarray(0, headerEnd))
+    const length = headers.match(/content-length:\s*(\d+)/i)
+
+    // Only parts framed by length are understood.
+    if (!length) return null
+
+    const start = headerEnd + 4
+    const end = start + Number(length[1])
+
+    if (buffer.length < end) return null
+
+    const seq = headers.match(/x-frame-seq:\s*(\d+)/i)
+    const captureTime = headers.match(/x-capture-time:\s*([\d.]+)/i)
+
+    return {
+        payload: buffer.subarray(start, end),
+        seq: seq ? Number(seq[1]) : null,
+        captureTime: captureTime ? Number(captureTime[1]) : null,
+        end: end
+    }
+}
+
+function indexOfSequence(buffer, sequence) {
+
+    /**
+     * Offset of the first occurrence of a byte sequence, -1 if absent.
+     */
+
+    outer: for (let index = 0; index <= buffer.length - sequence.length; index++) {
+
+        for (let offset = 0; offset < sequence.length; offset++) {
+            if (buffer[index + offset] !== sequence[offset]) continue outer
+        }
+
+        return index
+    }
+
+    return -1
+}
+
+function concatenate(first, second) {
+
+    const joined = new Uint8Array(first.length + second.length)
+
+    joined.set(first)
+    joined.set(second, first.length)
+
+    return joined
+}
+
+function median(values) {
+
+    const sorted = values.slice().sort((a, b) => a - b)
+
+    return sorted[Math.floor(sorted.length / 2)]
+}
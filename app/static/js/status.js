@@ -0,0 +1,124 @@
+/**
+ * Module to keep the status page current from telemetry pushed over Server-Sent Events.
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+
+    subscribeTelemetry()
+
+})
+
+function subscribeTelemetry() {
+
+    /**
+     * Open the telemetry stream, the browser reconnects on its own if the connection drops.
+     */
+
+    const container = document.getElementById('status-container')
+    const source = new EventSource(container ? container.dataset.telemetryUrl : '/status/stream')
+
+    source.addEventListener('message', (event) => {
+        renderTelemetry(JSON.parse(event.data))
+    })
+}
+
+function renderTelemetry(telemetry) {
+
+    /**
+     * Update each status field in place with the latest snapshot.
+     */
+
+    const deviceStatus = document.getElementById('device-status')
+
+    if (deviceStatus) {
+        deviceStatus.innerHTML = telemetry.camera_active
+            ? '<span style="color: green;">Active</span>'
+            : '<span style="color: red;">Inactive</span>'
+    }
+
+    updateField('uptime', telemetry.uptime_seconds === null ? 'Inactive' : formatUptime(telemetry.uptime_seconds))
+    updateField('fps', `${telemetry.fps} fps`)
+    updateField('latency', `${telemetry.latency_ms === null ? '-' : telemetry.latency_ms} ms`)
+    updateField('active-tracks', telemetry.active_tracks)
+    updateField('max-threat', telemetry.max_threat_level)
+    updateField('captures-today', telemetry.captures_today)
+    updateField(
+        'queues',
+        Object.entries(telemetry.queues).map(([name, depth]) => `${name}: ${depth}`).join(' ')
+    )
+
+    if (telemetry.stream_latency) {
+        const streamLatency = telemetry.stream_latency
+        updateField(
+            'stream-latency',
+            streamLatency.count
+                ? `p50 ${streamLatency.p50_ms} | p95 ${streamLatency.p95_ms} | p99 ${streamLatency.p99_ms} ms`
+                : '-'
+        )
+    }
+
+    if (telemetry.adaptive_quality) renderAdaptiveQuality(telemetry.adaptive_quality)
+
+    if (telemetry.tiles) {
+        updateField(
+            'active-tiles',
+            `${telemetry.tiles.active_tiles} of ${telemetry.tiles.grid[0] * telemetry.tiles.grid[1]} | ` +
+            `Mean ${(telemetry.tiles.mean_active_fraction * 100).toFixed(1)}%`
+        )
+    }
+}
+
+function renderAdaptiveQuality(quality) {
+
+    /**
+     * Show the current adaptive quality level and the most recent adjustments, newest first.
+     */
+
+    updateField(
+        'adaptive-quality',
+        quality.enabled
+            ? `Level ${quality.level} | JPEG ${quality.jpeg_quality} | Stream x${quality.stream_scale} | Analysis x${quality.analysis_scale}`
+            : 'Off'
+    )
+
+    const list = document.getElementById('quality-adjustments')
+
+    if (!list) return
+
+    const adjustments = quality.adjustments.slice().reverse()
+
+    list.replaceChildren(...(adjustments.length ? adjustments : [null]).map((adjustment) => {
+
+        const item = document.createElement('li')
+
+        item.textContent = adjustment
+            ? `${adjustment.direction === 'down' ? 'Down' : 'Up'} to level ${adjustment.level} (${adjustment.reason})`
+            : `No adjustments, holding ${quality.target_fps} fps.`
+
+        return item
+    }))
+}
+
+function formatUptime(totalSeconds) {
+
+    /**
+     * Format seconds as HH:MM:SS to match the server rendered value.
+     */
+
+    const hours = String(Math.floor(totalSeconds / 3600) % 24).padStart(2, '0')
+    const minutes = String(Math.floor(totalSeconds / 60) % 60).padStart(2, '0')
+    const seconds = String(totalSeconds % 60).padStart(2, '0')
+
+    return `${hours}:${minutes}:${seconds}`
+}
+
+function updateField(elementID, value) {
+
+    /**
+     * Replace the text content of a field if it is present on the page.
+     */
+
+    const element = document.getElementById(elementID)
+
+    if (element) element.textContent = value
+}
@@ -0,0 +1,57 @@
+import importlib
+import threading
+
+
+class LazyModule(object):
+
+    '''
+        Stand-in for a module which is only imported the first time one of its attributes is accessed. Attributes are
+            cached on the stand-in once fetched, so hot paths pay for a normal attribute lookup after first use.
+    '''
+
+    def __init__(self, name : str):
+
+        '''
+            Paramaters:
+                * name (str) : Fully qualified name of the module to import on first use.
+        '''
+
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+
+    def load(self):
+
+        ''' Import the underlying module if it has not been already, returning it. '''
+
+        with self._lock:
+
+            if self._module is None:
+                self.__dict__['_module'] = importlib.import_module(self._name)
+
+        return self._module
+
+
+    def __getattr__(self, attribute : str):
+
+        # Only reached for attributes not yet cached on the stand-in.
+        value = getattr(self._module or self.load(), attribute)
+
+        self.__dict__[attribute] = value
+
+        return value
+
+
+    def __repr__(self) -> str:
+
+        state = 'loaded' if self._module is not None else 'not loaded'
+
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+def lazy_import(name : str) -> LazyModule:
+
+    ''' Defer importing a heavy module until it is first used. '''
+
+    return LazyModule(name)
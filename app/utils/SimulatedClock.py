@@ -0,0 +1,35 @@
+class SimulatedClock(object):
+
+    '''
+        Stand-in for time.time driven by the caller rather than the wall clock, allowing recorded footage to be replayed
+            faster than real time while timers such as track escalation and deregistration still see the footage's own
+            timing.
+    '''
+
+    def __init__(self, start : float = 0.0):
+
+        '''
+            Paramaters:
+                * start (float) : Time in seconds the clock reads before it is first advanced.
+        '''
+
+        self.now = start
+
+
+    def __call__(self) -> float:
+
+        return self.now
+
+
+    def advance(self, seconds : float) -> float:
+
+        ''' Move the clock forward, returning the new time. '''
+
+        self.now += seconds
+
+        return self.now
+
+
+    def set(self, now : float) -> None:
+
+        self.now = now
@@ -4,4 +4,5 @@ from .device_utils.Camera import Camera
 from .cv_utils.ObjectDetection import ObjectDetection
 from .cv_utils.ObjectTracking import ObjectTracking
 from .device_utils.ConfigManager import ConfigManager
-from .device_utils.FileManager import FileManager
\ No newline at end of file
+from .device_utils.FileManager import FileManager
+from .pipeline_utils.Metrics import PipelineMetrics
\ No newline at end of file
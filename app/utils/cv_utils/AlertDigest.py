@@ -0,0 +1,127 @@
+from app.utils.LazyImport import lazy_import
+import numpy as np
+import time
+
+cv2 = lazy_import('cv2')
+
+
+def build_contact_sheet(thumbnails : list[np.ndarray], labels : list[str], columns : int = 4) -> np.ndarray:
+
+    '''
+        Tile equally sized thumbnails into a single contact sheet, filling the last row with blank tiles.
+
+        Paramaters:
+            * thumbnails (list[np.ndarray]) : BGR thumbnails, all of one size.
+            * labels (list[str]) : Caption drawn onto each thumbnail.
+            * columns (int) : Most thumbnails per row.
+        Returns:
+            * sheet (np.ndarray) : BGR contact sheet.
+    '''
+
+    tile_height, tile_width = thumbnails[0].shape[:2]
+
+    columns = min(columns, len(thumbnails))
+    rows = -(-len(thumbnails) // columns)
+
+    tiles = np.zeros((rows * columns, tile_height, tile_width, 3), dtype=np.uint8)
+    tiles[:len(thumbnails)] = thumbnails
+
+    for tile, label in zip(tiles, labels):
+        cv2.rectangle(tile, (0, 0), (tile_width, 18), (0, 0, 0), -1)
+        cv2.putText(tile, label, (4, 13), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1, cv2.LINE_AA)
+
+    # (rows, columns, height, width) -> (rows, height, columns, width), laying each row's tiles side by side.
+    return tiles.reshape(rows, columns, tile_height, tile_width, 3).transpose(0, 2, 1, 3, 4).reshape(
+        rows * tile_height, columns * tile_width, 3
+    )
+
+
+def make_thumbnail(frame : np.ndarray, size : tuple[int, int]) -> np.ndarray:
+
+    ''' Shrink a frame to fit within size, letterboxed so every thumbnail shares the same dimensions. '''
+
+    width, height = size
+    frame_height, frame_width = frame.shape[:2]
+
+    scale = min(width / frame_width, height / frame_height)
+    resized = cv2.resize(frame, (max(1, int(frame_width * scale)), max(1, int(frame_height * scale))), interpolation=cv2.INTER_AREA)
+
+    if resized.ndim == 2:
+        resized = cv2.cvtColor(resized, cv2.COLOR_GRAY2BGR)
+
+    thumbnail = np.zeros((height, width, 3), dtype=np.uint8)
+
+    top, left = (height - resized.shape[0]) // 2, (width - resized.shape[1]) // 2
+    thumbnail[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+
+    return thumbnail
+
+
+class AlertDigest(object):
+
+    '''
+        Coalesces alerts into one email per window. The first alert after a quiet window is sent straight away and
+            opens a window, alerts during it are held and sent together once it closes, which opens the next. A window
+            closing with nothing held ends the busy period, so the next alert is again sent straight away.
+    '''
+
+    def __init__(self, window : float, max_thumbnails : int = 16, thumbnail_size : tuple[int, int] = (320, 240)):
+
+        '''
+            Paramaters:
+                * window (float) : Seconds between emails while alerts keep arriving.
+                * max_thumbnails (int) : Most captures shown on the contact sheet, further alerts are only summarised.
+                * thumbnail_size (tuple[int, int]) : Width and height of each capture on the contact sheet.
+        '''
+
+        self.window = window
+        self.max_thumbnails = max_thumbnails
+        self.thumbnail_size = thumbnail_size
+
+        # Alerts held for the next digest, each a summary dict with an optional thumbnail.
+        self.pending = []
+
+        # Alerts are held until this time, zero while quiet.
+        self.window_ends = 0.0
+
+
+    def submit(self, alert : dict, frame : np.ndarray | None, now : float | None = None) -> bool:
+
+        '''
+            Offer an alert to the digest.
+
+            Paramaters:
+                * alert (dict) : Summary of the alert, its time, track ID, threat level and capture path.
+                * frame (np.ndarray | None) : Captured frame, shrunk to a thumbnail while space remains on the sheet.
+                * now (float | None) : Current time, defaults to the system clock.
+            Returns:
+                * send_now (bool) : Whether the alert should be sent straight away, otherwise it is held.
+        '''
+
+        now = time.time() if now is None else now
+
+        if now >= self.window_ends and not self.pending:
+            self.window_ends = now + self.window
+            return True
+
+        if frame is not None and sum('thumbnail' in held for held in self.pending) < self.max_thumbnails:
+            alert = {**alert, 'thumbnail' : make_thumbnail(frame, self.thumbnail_size)}
+
+        self.pending.append(alert)
+
+        return False
+
+
+    def collect(self, now : float | None = None) -> list[dict]:
+
+        ''' Alerts held for a window which has now closed, opening the next window if there were any. '''
+
+        now = time.time() if now is None else now
+
+        if not self.pending or now < self.window_ends:
+            return []
+
+        alerts, self.pending = self.pending, []
+        self.window_ends = now + self.window
+
+        return alerts
@@ -1,6 +1,8 @@
-import cv2 
 import numpy as np
 from .BboxUtils import measure_euclidean_distance, calculate_center_point
+from app.utils.LazyImport import lazy_import
+
+cv2 = lazy_import('cv2')
 
 
 class Annotations(object):
@@ -0,0 +1,64 @@
+from app.utils.LazyImport import lazy_import
+import numpy as np
+
+cv2 = lazy_import('cv2')
+
+
+# Capture formats a camera can deliver frames in. RGB frames hold three or four interleaved channels, YUV420 frames are
+#   planar I420, a full resolution luma plane followed by quarter resolution U and V planes, stacked into one
+#   (height * 3 / 2, width) array.
+RGB : str = 'rgb'
+YUV420 : str = 'yuv420'
+CAPTURE_FORMATS : tuple[str, ...] = (RGB, YUV420)
+
+
+def luma_plane(frame : np.ndarray) -> np.ndarray:
+
+    ''' Greyscale view of a YUV420 frame's luma plane, nothing is copied or converted. '''
+
+    return frame[:frame.shape[0] * 2 // 3]
+
+
+def yuv420_to_bgr(frame : np.ndarray, dst : np.ndarray | None = None) -> np.ndarray:
+
+    ''' Convert a YUV420 frame to BGR, written into dst when a (height, width, 3) buffer is given. '''
+
+    return cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420, dst=dst)
+
+
+def bgr_to_yuv420(frame : np.ndarray) -> np.ndarray:
+
+    ''' Convert a BGR frame to YUV420, both dimensions must be even. '''
+
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420)
+
+
+def pack_yuv420(frame : np.ndarray, width : int, height : int) -> np.ndarray:
+
+    '''
+        Strip the row padding a sensor may add to YUV420 frames, returning tightly packed I420. Each padded chroma row
+            holds two rows of a chroma plane, each half the stride wide.
+
+        Paramaters:
+            * frame (np.ndarray) : YUV420 frame of shape (height * 3 / 2, stride).
+            * width (int) : Picture width, at most the stride.
+            * height (int) : Picture height.
+        Returns:
+            * frame (np.ndarray) : YUV420 frame of shape (height * 3 / 2, width), the input itself when unpadded.
+    '''
+
+    stride = frame.shape[1]
+
+    if stride == width:
+        return frame
+
+    packed = np.empty((height * 3 // 2, width), dtype=frame.dtype)
+    packed[:height] = frame[:height, :width]
+
+    chroma_rows = height // 4
+
+    for plane, start in enumerate((height, height + chroma_rows)):
+        chroma = frame[start:start + chroma_rows].reshape(height // 2, stride // 2)[:, :width // 2]
+        packed[height + plane * chroma_rows:height + (plane + 1) * chroma_rows] = chroma.reshape(chroma_rows, width)
+
+    return packed
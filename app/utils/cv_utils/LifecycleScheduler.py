@@ -0,0 +1,129 @@
+import itertools
+import heapq
+
+
+class LifecycleScheduler(object):
+
+    '''
+        Min-heap of timed events, such as a track's expiry or its next escalation, so each tick only pops the events which
+            have fallen due instead of checking every track. Events are keyed by what they concern and their name, and
+            scheduling one again replaces it. Replaced and cancelled entries stay in the heap, skipped when they
+            surface, until they outnumber live ones and the heap is rebuilt.
+    '''
+
+    def __init__(self, compact_after : int = 64):
+
+        '''
+            Paramaters:
+                * compact_after (int) : Fewest stale entries worth rebuilding the heap to drop.
+        '''
+
+        self.compact_after = compact_after
+
+        # Entries as (deadline, order, key, event), order breaking ties between equal deadlines first come first served.
+        self.heap = []
+        self.order = itertools.count()
+
+        # Order of the live entry of each event, by key. Entries whose order differs have been replaced or cancelled.
+        self.live = {}
+        self.stale = 0
+
+
+    def __len__(self) -> int:
+
+        return len(self.heap) - self.stale
+
+
+    def schedule(self, key, event : str, deadline : float) -> None:
+
+        ''' Schedule an event for a key, replacing any of the same name already scheduled for it. '''
+
+        events = self.live.setdefault(key, {})
+
+        if event in events:
+            self.stale += 1
+
+        order = next(self.order)
+        events[event] = order
+
+        heapq.heappush(self.heap, (deadline, order, key, event))
+
+        self.compact()
+
+
+    def cancel(self, key, event : str | None = None) -> None:
+
+        ''' Cancel one of a key's events, or all of them, such as when a track is removed. '''
+
+        events = self.live.get(key)
+
+        if not events:
+            return
+
+        if event is None:
+            self.stale += len(events)
+            events.clear()
+
+        elif events.pop(event, None) is not None:
+            self.stale += 1
+
+        if not events:
+            del self.live[key]
+
+        self.compact()
+
+
+    def pop_due(self, now : float) -> list[tuple]:
+
+        '''
+            Remove and return every event due by now, soonest first. Events scheduled while handling these are left for
+                the next tick, even if already due.
+
+            Paramaters:
+                * now (float) : Current time.
+            Returns:
+                * due (list[tuple]) : (key, event, deadline) of each event due.
+        '''
+
+        due = []
+
+        while self.heap and self.heap[0][0] <= now:
+
+            deadline, order, key, event = heapq.heappop(self.heap)
+
+            events = self.live.get(key)
+
+            if not events or events.get(event) != order:
+                self.stale -= 1
+                continue
+
+            del events[event]
+
+            if not events:
+                del self.live[key]
+
+            due.append((key, event, deadline))
+
+        return due
+
+
+    def compact(self) -> None:
+
+        ''' Rebuild the heap without stale entries once they make up most of it. '''
+
+        if self.stale < self.compact_after or self.stale * 2 < len(self.heap):
+            return
+
+        self.heap = [entry for entry in self.heap if self.live.get(entry[2], {}).get(entry[3]) == entry[1]]
+        heapq.heapify(self.heap)
+
+        self.stale = 0
+
+
+    def status(self) -> dict:
+
+        return {
+            'scheduled' : len(self),
+            'stale' : self.stale,
+            'next_deadline' : self.heap[0][0] if self.heap else None
+        }
@@ -1,8 +1,19 @@
-import cv2 
 import os
 import numpy as np
+from time import perf_counter
 from .BboxUtils import calculate_center_point, measure_euclidean_distance
 from app.settings import *
+from app.utils.LazyImport import lazy_import
+
+cv2 = lazy_import('cv2')
+
+
+# Ways bounding boxes can be extracted from the thresholded motion mask. 'contours' traces each blob's outline and
+#   measures it one contour at a time, 'components' labels every blob in one pass and filters their stats as one array.
+CONTOURS : str = 'contours'
+COMPONENTS : str = 'components'
+BBOX_EXTRACTIONS : tuple[str, ...] = (CONTOURS, COMPONENTS)
+
 
 class ObjectDetection(object):
 
@@ -18,6 +29,53 @@ class ObjectDetection(object):
         self.settings = {}
         self.sensisitvity = DEFAULT_SETTINGS['motion_detection']['sensitivity'] # Min contour area.
 
+        # Minimum difference in intensity for a pixel to count as changed, and the distance within which nearby
+        #   bounding boxes are merged into one detection.
+        self.binarisation_threshold = 90
+        self.merge_distance = 160
+
+        # Durations in seconds of each detection stage run by the most recent call, read by pipeline instrumentation.
+        self.stage_timings = {}
+
+        # Change map. Both frames are shrunk by this factor in each direction with area averaging, which smooths sensor
+        #   noise for free, and their difference drives both the global change gate and the tile grid.
+        self.change_map_decimation = 8
+        self.change_pixel_threshold = 25
+
+        # Global change gate. Lighting switching, passing clouds and auto exposure shift the whole frame at once, which
+        #   differencing would report as one giant detection.
+        self.gate_mean_shift = 15.0
+        self.gate_change_ratio = 0.6
+
+        # Whether the most recent frame was gated as a global change, and how many have been.
+        self.global_change = False
+        self.global_changes = 0
+
+        # Tile grid as (columns, rows). Smoothing, thresholding and contour extraction only run over dirty tiles, those with
+        #   at least the given number of changed downscaled pixels, and their neighbours. The whole frame is analysed
+        #   instead once the regions would cover more than the given fraction of it.
+        self.tile_grid = TILE_GRID
+        self.tile_dirty_pixels = 1.0
+        self.tile_full_frame_ratio = 0.4
+
+        # Running tile activity, for tuning the grid.
+        self.tile_frames = 0
+        self.tile_activity = np.zeros((self.tile_grid[1], self.tile_grid[0]), dtype=np.int64)
+        self.active_tiles = 0
+        self.active_tiles_total = 0
+
+        # Margin of context added around each region so smoothing at its edges matches smoothing of the whole frame.
+        self.region_margin = 6
+
+        # Scale frames are analysed at relative to the camera, bounding boxes are always returned at camera scale.
+        self.analysis_scale = 1.0
+
+        if BBOX_EXTRACTION not in BBOX_EXTRACTIONS:
+            raise ValueError(f"Unknown bbox extraction {BBOX_EXTRACTION}, expected one of {', '.join(BBOX_EXTRACTIONS)}.")
+
+        # How blobs in the motion mask become bounding boxes.
+        self.bbox_extraction = BBOX_EXTRACTION
+
 
     def pre_process_frame(self, frame : np.ndarray) -> np.ndarray:
 
@@ -26,6 +84,13 @@ class ObjectDetection(object):
         # Convert the frame to greyscale to reduce colours channels, in turn reducing processing.
         frame_greyscale = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
+        return self.smooth_frame(frame_greyscale)
+
+
+    def smooth_frame(self, frame_greyscale : np.ndarray) -> np.ndarray:
+
+        ''' Suppress sensor noise in a greyscale frame, or a region of one, ahead of differencing. '''
+
         # Apply gaussian filter to reduce noise in an attempt to mitigate false positives. 
         frame_blur = cv2.GaussianBlur(frame_greyscale, (9, 9), 1.5)
 
@@ -35,9 +100,9 @@ class ObjectDetection(object):
         return frame_smoothed
 
 
-    def detect_motion(self, prev_frame : np.ndarray, curr_frame : np.ndarray, binarisation_threshold : int = 90) -> tuple[np.ndarray, list[np.ndarray]]:
+    def detect_motion(self, prev_frame : np.ndarray, curr_frame : np.ndarray, binarisation_threshold : int | None = None) -> tuple[np.ndarray, list[np.ndarray]]:
 
-        ''' Detect motion in frame utilising traditional computer vision techniques. '''
+        ''' Detect motion in frame utilising traditional computer vision techniques, frames may be BGR or already greyscale. '''
 
         bboxes = []
 
@@ -45,48 +110,316 @@ class ObjectDetection(object):
         if curr_frame is None or prev_frame is None:
             raise ValueError('Provided frames were returned as None!')
 
-        # Preprocess frames for operating upon.
-        curr_frame = self.pre_process_frame(curr_frame)
-        prev_frame = self.pre_process_frame(prev_frame)
+        self.stage_timings.clear()
+
+        mark = perf_counter()
+
+        binarisation_threshold = self.binarisation_threshold if binarisation_threshold is None else binarisation_threshold
+
+        # Convert frames to greyscale, smoothing is left until the regions worth analysing are known.
+        if curr_frame.ndim == 3:
+            curr_frame = cv2.cvtColor(curr_frame, cv2.COLOR_BGR2GRAY)
+
+        if prev_frame.ndim == 3:
+            prev_frame = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
+
+        # Heavily downscaled difference the gate and tile grid are both judged from.
+        frame_height, frame_width = curr_frame.shape
+        map_size = (max(1, frame_width // self.change_map_decimation), max(1, frame_height // self.change_map_decimation))
 
-        # Compute absolute difference between current and previous frames. 
-        frame_difference = cv2.absdiff(prev_frame, curr_frame)
-        # Apply a binary threshold to fetch regions with significant change within the frame.
-        _, frame_thresholded = cv2.threshold(frame_difference, binarisation_threshold, 255, cv2.THRESH_BINARY)
+        curr_map = cv2.resize(curr_frame, map_size, interpolation=cv2.INTER_AREA)
+        prev_map = cv2.resize(prev_frame, map_size, interpolation=cv2.INTER_AREA)
+
+        mark = self.record_stage('preprocess', mark)
+
+        self.global_change = self.detect_global_change(prev_map, curr_map)
+
+        mark = self.record_stage('gate', mark)
+
+        # Whole scene changed, nothing here is motion. Skip extraction, the caller differences the next frame against this one.
+        if self.global_change:
+            self.global_changes += 1
+            return np.zeros_like(curr_frame), []
+
+        regions = self.find_active_regions(prev_map, curr_map, (frame_width, frame_height))
+
+        mark = self.record_stage('tiles', mark)
+
+        frame_dilation = np.zeros_like(curr_frame)
 
         # Initialise kernel for morphological operations.
         kernel = np.ones((3, 3), np.uint8)
-        # Dilate on the thresholded frame to fill in the gaps and solidify contour areas.
-        frame_dilation = cv2.dilate(frame_thresholded, kernel, iterations=1)
 
-        # Fetch regions in the frame where motion has been detected. 
-        contours = cv2.findContours(frame_dilation, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+        # Minimum area is configured at camera scale, shrink it with the analysed frame.
+        minimum_area = self.sensisitvity * (self.analysis_scale ** 2)
 
-        # Store list of detected motion areas.
-        filtered_contours = [contour for contour in contours if (cv2.contourArea(contour)) > (self.sensisitvity)]
-        
-        # Iterate over the filtrated detections.
-        for contour in filtered_contours:
-            
-            # Use opencv to draw a bounding box around the detected contour, unpack its values. 
-            x1, y1, w, h = cv2.boundingRect(contour)
+        for x1, y1, x2, y2 in regions:
+
+            # Smooth each region with a margin of context, then keep only the region itself.
+            padded_x1, padded_y1 = max(0, x1 - self.region_margin), max(0, y1 - self.region_margin)
+            padded_x2, padded_y2 = min(frame_width, x2 + self.region_margin), min(frame_height, y2 + self.region_margin)
+
+            curr_region = self.smooth_frame(curr_frame[padded_y1:padded_y2, padded_x1:padded_x2])
+            prev_region = self.smooth_frame(prev_frame[padded_y1:padded_y2, padded_x1:padded_x2])
+
+            region = (slice(y1 - padded_y1, y2 - padded_y1), slice(x1 - padded_x1, x2 - padded_x1))
+
+            mark = self.record_stage('preprocess', mark)
+
+            # Compute absolute difference between current and previous frames. 
+            frame_difference = cv2.absdiff(prev_region[region], curr_region[region])
+            # Apply a binary threshold to fetch regions with significant change within the frame.
+            _, frame_thresholded = cv2.threshold(frame_difference, binarisation_threshold, 255, cv2.THRESH_BINARY)
+
+            # Dilate on the thresholded frame to fill in the gaps and solidify contour areas.
+            region_dilation = cv2.dilate(frame_thresholded, kernel, iterations=1)
+            frame_dilation[y1:y2, x1:x2] = region_dilation
 
-            # Append these values to a dictionary for each detection. Convert to x1, y1, x2, y2 format.
-            bboxes.append({'x1' : int(x1), 'y1' : int(y1), 'x2' : int(x1 + w), 'y2' : int(y1 + h)})
+            mark = self.record_stage('threshold', mark)
+
+            # Fetch regions in the frame where motion has been detected, offset back into frame coordinates.
+            bboxes.extend(self.extract_bboxes(region_dilation, (x1, y1), minimum_area))
+
+            # Timed as the contours stage whichever backend extracted them, keeping stage names stable.
+            mark = self.record_stage('contours', mark)
+
+        # Regions can overlap where their bounding rectangles do, rejoin anything split or found twice across them.
+        if len(regions) > 1:
+            bboxes = self.stitch_bboxes(bboxes)
 
         bboxes = self.compile_small_contours(bboxes)
 
+        self.record_stage('merge', mark)
+
         # Return process frame and parsed bounding boxes
         return frame_dilation, bboxes
-    
 
-    def compile_small_contours(self, bboxes, merge_distance = 160):
+
+    def extract_bboxes(self, mask : np.ndarray, offset : tuple[int, int], minimum_area : float) -> list[dict]:
+
+        '''
+            Bounding boxes of the blobs in a binary motion mask larger than the minimum area, using the configured backend.
+
+            Paramaters:
+                * mask (np.ndarray) : Binary mask of a region, or of the whole frame.
+                * offset (tuple[int, int]) : x, y of the mask within the analysed frame.
+                * minimum_area (float) : Smallest blob area kept, in analysed pixels.
+            Returns:
+                * bboxes (list[dict]) : x1, y1, x2, y2 of each blob at camera scale.
+        '''
+
+        if self.bbox_extraction == COMPONENTS:
+            return self.extract_component_bboxes(mask, offset, minimum_area)
+
+        return self.extract_contour_bboxes(mask, offset, minimum_area)
+
+
+    def extract_contour_bboxes(self, mask : np.ndarray, offset : tuple[int, int], minimum_area : float) -> list[dict]:
+
+        ''' Trace the outer contour of each blob, measuring and boxing them one at a time. '''
+
+        bboxes = []
+
+        contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)[0]
+
+        # Store list of detected motion areas.
+        filtered_contours = [contour for contour in contours if (cv2.contourArea(contour)) > (minimum_area)]
+
+        # Iterate over the filtrated detections.
+        for contour in filtered_contours:
+
+            # Use opencv to draw a bounding box around the detected contour, unpack its values.
+            x, y, w, h = cv2.boundingRect(contour)
+
+            # Append these values to a dictionary for each detection. Convert to x1, y1, x2, y2 format at camera scale.
+            bboxes.append({
+                'x1' : int(x / self.analysis_scale), 'y1' : int(y / self.analysis_scale),
+                'x2' : int((x + w) / self.analysis_scale), 'y2' : int((y + h) / self.analysis_scale)
+            })
+
+        return bboxes
+
+
+    def extract_component_bboxes(self, mask : np.ndarray, offset : tuple[int, int], minimum_area : float) -> list[dict]:
+
+        '''
+            Label every blob in one pass, filtering and converting their stats as arrays. Areas are pixel counts rather
+                than the area enclosed by an outline, so holes inside a blob are not counted, and blobs nested inside
+                another's hole are reported separately, to be joined with it when nearby boxes are merged.
+        '''
+
+        # Grana's block based labelling scans a mostly empty mask several times faster than the default algorithm.
+        count, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(mask, 8, cv2.CV_32S, cv2.CCL_GRANA)
+
+        # Row 0 is the background. Labels run in scan order, reversed to hand the merge step blobs in the order
+        #   findContours would, as how boxes are grouped depends on it.
+        stats = stats[count - 1:0:-1]
+        stats = stats[stats[:, cv2.CC_STAT_AREA] > minimum_area]
+
+        if not len(stats):
+            return []
+
+        # x, y, w, h -> x1, y1, x2, y2, offset into frame coordinates and taken to camera scale.
+        corners = stats[:, :4].copy()
+        corners[:, 2:] += corners[:, :2]
+        corners[:, 0::2] += offset[0]
+        corners[:, 1::2] += offset[1]
+
+        if self.analysis_scale != 1.0:
+            corners = (corners / self.analysis_scale).astype(np.int64)
+
+        return [{'x1' : x1, 'y1' : y1, 'x2' : x2, 'y2' : y2} for x1, y1, x2, y2 in corners.tolist()]
+
+
+    def detect_global_change(self, prev_map : np.ndarray, curr_map : np.ndarray) -> bool:
+
+        '''
+            Cheaply decide whether the whole scene changed between two downscaled greyscale frames.
+
+            A frame is gated when most of it changed, or when the mean brightness jumped and nearly as much of it changed.
+                Requiring both for the latter keeps a subject close to the camera, which also moves the mean, detectable.
+
+            Paramaters:
+                * prev_map (np.ndarray) : Downscaled greyscale reference frame.
+                * curr_map (np.ndarray) : Downscaled greyscale current frame.
+            Returns:
+                * global_change (bool) : Whether the frame should be skipped as a global change.
+        '''
+
+        mean_shift = abs(float(curr_map.mean()) - float(prev_map.mean()))
+        change_ratio = float(np.count_nonzero(cv2.absdiff(prev_map, curr_map) > self.change_pixel_threshold)) / curr_map.size
+
+        if change_ratio >= self.gate_change_ratio:
+            return True
+
+        return mean_shift >= self.gate_mean_shift and change_ratio >= self.gate_change_ratio * 0.75
+
+
+    def find_active_regions(self, prev_map : np.ndarray, curr_map : np.ndarray, frame_size : tuple[int, int]) -> list[tuple[int, int, int, int]]:
+
+        '''
+            Score each tile of the grid from the downscaled difference and group dirty tiles, together with their
+                neighbours, into rectangular regions worth analysing at full resolution.
+
+            Paramaters:
+                * prev_map (np.ndarray) : Downscaled greyscale reference frame.
+                * curr_map (np.ndarray) : Downscaled greyscale current frame.
+                * frame_size (tuple[int, int]) : Width and height of the full resolution frame.
+            Returns:
+                * regions (list[tuple[int, int, int, int]]) : x1, y1, x2, y2 of each region in frame coordinates.
+        '''
+
+        frame_width, frame_height = frame_size
+        columns, rows = self.tile_grid
+
+        # Downscaled pixels changed within each tile, area averaging the change mask down to one value per tile.
+        changed = (cv2.absdiff(prev_map, curr_map) > self.change_pixel_threshold).astype(np.float32)
+        scores = cv2.resize(changed, (columns, rows), interpolation=cv2.INTER_AREA) * (changed.size / (columns * rows))
+
+        dirty = (scores >= self.tile_dirty_pixels).astype(np.uint8)
+
+        # Neighbours are included so motion crossing into a quiet tile is still seen whole.
+        active = cv2.dilate(dirty, np.ones((3, 3), np.uint8))
+
+        self.tile_frames += 1
+        self.tile_activity += active
+        self.active_tiles = int(active.sum())
+        self.active_tiles_total += self.active_tiles
+
+        if not self.active_tiles:
+            return []
+
+        # Tile edges in pixels, spreading any remainder when the frame does not divide evenly.
+        column_edges = (np.arange(columns + 1) * frame_width) // columns
+        row_edges = (np.arange(rows + 1) * frame_height) // rows
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(active, connectivity=8)
+
+        regions = [
+            (int(column_edges[x]), int(row_edges[y]), int(column_edges[x + w]), int(row_edges[y + h]))
+            for x, y, w, h, _ in stats[1:count]
+        ]
+
+        # Past a point, per region overheads and overlapping rectangles cost more than one pass over the frame.
+        if sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) > self.tile_full_frame_ratio * frame_width * frame_height:
+            return [(0, 0, frame_width, frame_height)]
+
+        return regions
+
+
+    def stitch_bboxes(self, bboxes : list[dict]) -> list[dict]:
+
+        ''' Join boxes which overlap or touch, as happens when one object is found in two neighbouring regions. '''
+
+        stitched = []
+
+        for box in bboxes:
+
+            box = dict(box)
+
+            # Keep absorbing stitched boxes until this one touches none of them.
+            touching = True
+
+            while touching:
+
+                touching = False
+
+                for other in stitched:
+
+                    if box['x1'] <= other['x2'] + 1 and other['x1'] <= box['x2'] + 1 and \
+                        box['y1'] <= other['y2'] + 1 and other['y1'] <= box['y2'] + 1:
+
+                        box = {
+                            'x1' : min(box['x1'], other['x1']), 'y1' : min(box['y1'], other['y1']),
+                            'x2' : max(box['x2'], other['x2']), 'y2' : max(box['y2'], other['y2'])
+                        }
+
+                        stitched.remove(other)
+                        touching = True
+                        break
+
+            stitched.append(box)
+
+        return stitched
+
+
+    def tile_statistics(self) -> dict:
+
+        ''' Tile grid activity for tuning, the rate each tile was analysed at is laid out row by row. '''
+
+        frames = max(self.tile_frames, 1)
+        tile_count = self.tile_activity.size
+
+        return {
+            'grid' : list(self.tile_grid),
+            'frames' : self.tile_frames,
+            'active_tiles' : self.active_tiles,
+            'mean_active_fraction' : round(self.active_tiles_total / (frames * tile_count), 3),
+            'activity' : np.round(self.tile_activity / frames, 3).tolist()
+        }
+
+
+    def record_stage(self, stage : str, mark : float) -> float:
+
+        ''' Add time elapsed since mark to a detection stage, returning the current time as the next mark. '''
+
+        now = perf_counter()
+
+        # Stages run once per region accumulate across the call.
+        self.stage_timings[stage] = self.stage_timings.get(stage, 0.0) + now - mark
+
+        return now
+
+
+    def compile_small_contours(self, bboxes, merge_distance = None):
 
         ''' '''
 
         if not bboxes:
             return []
 
+        merge_distance = self.merge_distance if merge_distance is None else merge_distance
+
         np_bboxes = np.array([[box['x1'], box['y1'], box['x2'], box['y2']] for box in bboxes])
 
         merged_contours = []
@@ -134,4 +467,4 @@ class ObjectDetection(object):
 
         self.settings = settings
 
-        self.sensisitvity = settings.get('sensitivity')
+        self.sensisitvity = settings.get('sensitivity', self.sensisitvity)
@@ -1,4 +1,5 @@
 from .BboxUtils import calculate_center_point, measure_euclidean_distance, calculate_detection_surface_area
+from .LifecycleScheduler import LifecycleScheduler
 from time import time 
 from app.settings import * 
 
@@ -11,7 +12,8 @@ class ObjectTracking(object):
             self,
             EUCLIDEAN_DISTANCE_THRESHOLD : int = 125,
             MAXIMUM_THREAT_LEVEL : int = DEFAULT_SETTINGS['motion_detection']['maximum_threat_threshold'],
-            DEREGISTRATION_TIME : int = 4, ESCALATION_TIME : int = DEFAULT_SETTINGS['motion_detection']['threat_escalation_timer']
+            DEREGISTRATION_TIME : int = 4, ESCALATION_TIME : int = DEFAULT_SETTINGS['motion_detection']['threat_escalation_timer'],
+            clock = time
         ) -> None:
         
         '''
@@ -22,6 +24,7 @@ class ObjectTracking(object):
                 * MAXIMUM_THREAT_LEVEL (int) : Maximum threshold before a detection is considered a threat.
                 * DEREGISTRATION_TIME (int) : Time taken in seconds before a detection is pruned to free up resources. 
                 * ESCALATION_TIME (int) : Time taken in seconds for a detection to be present before its threat level is escalated.  
+                * clock (callable) : Returns the current time in seconds, replaced with a simulated clock to replay footage.
         '''
         
         # dictionary to hold detections data which can be used for IDs, bounding boxes and center points. 
@@ -44,6 +47,14 @@ class ObjectTracking(object):
 
         self.max_center_points = 5
 
+        self.clock = clock
+
+        # Next expiry and escalation of every track, popped as they fall due on each tick.
+        self.scheduler = LifecycleScheduler()
+
+        # Called as listener(event, detection, at) on registration, escalation and pruning, for the event log.
+        self.event_listener = None
+
     
     def update_tracker(self, detections : list[dict]) -> list[dict]:
 
@@ -62,7 +73,7 @@ class ObjectTracking(object):
             raise ValueError('Detections being parsed not a list of dictionaries.')
 
         # Get current time detections were being processed at. 
-        updated_at = time()
+        updated_at = self.clock()
 
         # Iterate over the current detections being ingested. 
         for current_detection in detections:
@@ -81,17 +92,39 @@ class ObjectTracking(object):
 
             else:
                 # Otherwise, handle fresh detection.
-                matched_ID = self.register_object(current_detection, updated_at, current_center_point)
+                self.register_object(current_detection, updated_at, current_center_point)
+
+        # Escalate and prune whichever tracks are due, returning those still held.
+        return self.tick(updated_at)
+
+
+    def tick(self, now : float | None = None) -> list[dict]:
+
+        '''
+            Run the lifecycle events which have fallen due, escalating tracks present long enough and pruning those unseen
+                for too long. Called on every frame, with or without detections, so tracks are escalated and pruned on
+                time rather than whenever something next moves.
+
+            Paramaters:
+                * now : (float | None) : Current time, defaults to the tracker's clock.
+            Returns:
+                * tracked_objects : (list[dict]) : Tracks still held.
+        '''
+
+        now = self.clock() if now is None else now
 
-            tracked_object = self.tracked_objects[matched_ID].copy()
+        for ID, event, _ in self.scheduler.pop_due(now):
 
-            if matched_ID in self.tracked_objects:
-                self.handle_detection_escalation(matched_ID, updated_at)
+            # Removed by an earlier event this tick.
+            if ID not in self.tracked_objects:
+                continue
 
-        # Check for objects that need pruning (exceed the threshold).
-        self.prune_outdated_objects(updated_at)
+            if event == 'escalate':
+                self.handle_detection_escalation(ID, now)
+
+            elif event == 'expire':
+                self.handle_detection_expiry(ID, now)
 
-        # Return list of parsed_detections.
         return list(self.tracked_objects.values())
     
 
@@ -175,6 +208,11 @@ class ObjectTracking(object):
         # Increment counter to keep ID values unique.
         self.ID_increment_counter += 1
 
+        self.scheduler.schedule(new_ID, 'escalate', seen_at + self.ESCALATION_TIME)
+        self.scheduler.schedule(new_ID, 'expire', seen_at + self.DEREGISTRATION_TIME)
+
+        self.emit_event('register', self.tracked_objects[new_ID], seen_at)
+
         return new_ID
     
 
@@ -214,50 +252,83 @@ class ObjectTracking(object):
         detection.update(self.tracked_objects[ID])
 
     
-    def prune_outdated_objects(self, updated_at : float) -> None:
+    def handle_detection_expiry(self, ID : int, updated_at : float) -> None:
 
         '''
-            Iterate over parameterised detections and prune those exceeding the set time limit threshold.
+            Prune a track whose expiry has fallen due if it has gone unseen for longer than the deregistration time.
+                Sightings do not reschedule expiry, so a track seen since is given a fresh deadline from its latest sighting
+                instead, costing one reschedule per deregistration period rather than one per frame.
 
-            Parameters:
-                * parsed_detections : list[dict] -> list of detection data entries.
-            Returns:
-                * None. 
+            Paramaters:
+                * ID : (int) : Detections unique identifier.
+                * updated_at : (float) : Current time.
         '''
 
-        # Initialise list to store ID values of detections to be pruned. 
-        stale_detections = [ID for ID, detection in self.tracked_objects.items()
-                            if (updated_at - detection['last_detected']) > self.DEREGISTRATION_TIME]
+        detection = self.tracked_objects[ID]
 
-        # Iterate over the IDs present. 
-        for ID in stale_detections:
-            # Use IDs to delete entries from tracked objects. 
-            del self.tracked_objects[ID]
+        if (updated_at - detection['last_detected']) > self.DEREGISTRATION_TIME:
+            self.remove_object(ID, updated_at)
+            return
+
+        self.scheduler.schedule(ID, 'expire', detection['last_detected'] + self.DEREGISTRATION_TIME)
+
+
+    def remove_object(self, ID : int, removed_at : float) -> None:
+
+        ''' Stop tracking a detection, cancelling its scheduled events. '''
+
+        self.scheduler.cancel(ID)
+        self.emit_event('prune', self.tracked_objects.pop(ID), removed_at)
 
 
     def update_settings(self, settings : dict):
 
-        ''' Apply user configuaration settings to camera ''' 
+        ''' Apply user motion detection settings to the tracker. ''' 
 
-        self.settings = settings.get('motion_detection', {})
-        self.MAXIMUM_THREAT_LEVEL = self.settings.get('maximum_threat_threshold')
-        self.ESCALATION_TIME = self.settings.get('threat_escalation_timer')
+        self.settings = settings
+        self.MAXIMUM_THREAT_LEVEL = self.settings.get('maximum_threat_threshold', self.MAXIMUM_THREAT_LEVEL)
+
+        escalation_time = self.settings.get('threat_escalation_timer', self.ESCALATION_TIME)
+
+        # Escalations already scheduled were timed with the previous timer, move them to the new one.
+        if escalation_time != self.ESCALATION_TIME:
+
+            self.ESCALATION_TIME = escalation_time
+
+            for ID, detection in self.tracked_objects.items():
+                self.scheduler.schedule(ID, 'escalate', detection['last_escalated'] + self.ESCALATION_TIME)
 
 
     def handle_detection_escalation(self, ID : int, updated_at : float) -> None:
 
+        '''
+            Raise the threat level of a track whose escalation has fallen due, scheduling its next escalation, or stop
+                tracking it once it exceeds the maximum threat level.
+
+            Paramaters:
+                * ID : (int) : Detections unique identifier.
+                * updated_at : (float) : Current time.
+        '''
+
         detection = self.tracked_objects[ID]
 
-        elapsed_time = (updated_at - detection['first_detected'])
-        last_escalation_time = (updated_at - detection['last_escalated'])
+        detection['threat_level'] += 1
+        detection['last_escalated'] = updated_at
+
+        self.emit_event('escalate', detection, updated_at)
+
+        if detection['threat_level'] > self.MAXIMUM_THREAT_LEVEL:
+            # Report detection.
+            print(f'Detection {ID} exceeded maximum threat level.')
+            self.remove_object(ID, updated_at)
+            return
+
+        self.scheduler.schedule(ID, 'escalate', updated_at + self.ESCALATION_TIME)
+
 
-        if elapsed_time >= self.ESCALATION_TIME \
-            and last_escalation_time >= self.ESCALATION_TIME:
+    def emit_event(self, event : str, detection : dict, at : float) -> None:
 
-            detection['threat_level'] += 1
-            detection['last_escalated'] = updated_at
+        ''' Pass a lifecycle event to the listener, if one is attached. '''
 
-            if detection['threat_level'] > self.MAXIMUM_THREAT_LEVEL:
-                # Report detection.
-                print(f'Detection {ID} exceeded maximum threat level.')
-                del self.tracked_objects[ID]
+        if self.event_listener is not None:
+            self.event_listener(event, detection, at)
@@ -0,0 +1,92 @@
+from app.utils.LazyImport import lazy_import
+from collections import deque
+import numpy as np
+
+cv2 = lazy_import('cv2')
+
+
+def dhash(frame : np.ndarray) -> int:
+
+    '''
+        Difference hash of a frame. The frame is shrunk to 9x8 greyscale and each bit records whether a pixel is brighter
+            than its right hand neighbour, so the hash follows the coarse structure of the scene and shrugs off noise,
+            compression and small overlays.
+
+        Paramaters:
+            * frame (np.ndarray) : BGR or greyscale frame.
+        Returns:
+            * hash (int) : 64 bit hash.
+    '''
+
+    # Trim to a whole number of blocks, area resizing by an integer factor takes a much faster path. Shrinking before
+    #   converting leaves the colour conversion only 72 pixels.
+    height, width = frame.shape[:2]
+    thumbnail = cv2.resize(frame[:height - height % 8, :width - width % 9], (9, 8), interpolation=cv2.INTER_AREA)
+
+    if thumbnail.ndim == 3:
+        thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(hash_a : int, hash_b : int) -> int:
+
+    ''' Number of bits two hashes differ by. '''
+
+    return (hash_a ^ hash_b).bit_count()
+
+
+class CaptureHashCache(object):
+
+    '''
+        Hashes of recent captures, for recognising a near identical frame before it is written again. Entries expire
+            after a time window and the cache holds a bounded number, so lookups stay a short scan.
+    '''
+
+    def __init__(self, window : float = 30.0, max_distance : int = 10, max_entries : int = 32):
+
+        '''
+            Paramaters:
+                * window (float) : Seconds a capture is matched against for.
+                * max_distance (int) : Most bits out of 64 a hash may differ by and still count as a duplicate.
+                * max_entries (int) : Most recent captures remembered.
+        '''
+
+        self.window = window
+        self.max_distance = max_distance
+
+        # Oldest first, each a dict of hash, path, time and the IDs attached to the capture.
+        self.entries = deque(maxlen=max_entries)
+
+
+    def expire(self, now : float) -> None:
+
+        ''' Drop captures older than the window. '''
+
+        while self.entries and now - self.entries[0]['time'] > self.window:
+            self.entries.popleft()
+
+
+    def find(self, frame_hash : int, now : float) -> dict | None:
+
+        ''' Closest recent capture within the allowed distance, None if the frame is new. '''
+
+        self.expire(now)
+
+        best, best_distance = None, self.max_distance + 1
+
+        for entry in self.entries:
+
+            distance = hamming_distance(frame_hash, entry['hash'])
+
+            if distance < best_distance:
+                best, best_distance = entry, distance
+
+        return best
+
+
+    def add(self, frame_hash : int, path : str, ID : int, now : float) -> None:
+
+        self.entries.append({'hash' : frame_hash, 'path' : path, 'time' : now, 'IDs' : [ID]})
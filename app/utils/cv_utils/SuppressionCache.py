@@ -0,0 +1,92 @@
+import time
+
+
+class SuppressionCache(object):
+
+    '''
+        Keys with individual time to live, for holding alerts back while a cooldown runs. Expired keys are dropped when
+            looked up, by a sweep at most once per sweep interval, and the entry due to expire soonest is evicted when
+            the cache is full, so its size stays bounded however long the unit runs.
+    '''
+
+    def __init__(self, default_ttl : float, max_entries : int = 1024, sweep_interval : float = 60.0):
+
+        '''
+            Paramaters:
+                * default_ttl (float) : Seconds a key is held for when added without its own.
+                * max_entries (int) : Hard cap on keys held.
+                * sweep_interval (float) : Seconds between sweeps for expired keys.
+        '''
+
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+
+        # Expiry time of each key.
+        self.expiries = {}
+        self.next_sweep = 0.0
+
+        # Running count of keys evicted early by the size cap.
+        self.evictions = 0
+
+
+    def __len__(self) -> int:
+
+        return len(self.expiries)
+
+
+    def contains(self, key, now : float | None = None) -> bool:
+
+        ''' Whether a key is held and has not yet expired. '''
+
+        now = time.time() if now is None else now
+
+        expiry = self.expiries.get(key)
+
+        if expiry is None:
+            return False
+
+        if expiry <= now:
+            del self.expiries[key]
+            return False
+
+        return True
+
+
+    def add(self, key, ttl : float | None = None, now : float | None = None) -> None:
+
+        ''' Hold a key for its time to live, restarting the cooldown if it is already held. '''
+
+        now = time.time() if now is None else now
+
+        self.expiries.pop(key, None)
+
+        if len(self.expiries) >= self.max_entries:
+
+            self.sweep(now)
+
+            if len(self.expiries) >= self.max_entries:
+                del self.expiries[min(self.expiries, key=self.expiries.get)]
+                self.evictions += 1
+
+        self.expiries[key] = now + (self.default_ttl if ttl is None else ttl)
+
+
+    def maintain(self, now : float | None = None) -> None:
+
+        ''' Sweep expired keys if the sweep interval has passed, cheap enough to call every frame. '''
+
+        now = time.time() if now is None else now
+
+        if now >= self.next_sweep:
+            self.sweep(now)
+
+
+    def sweep(self, now : float) -> None:
+
+        ''' Drop every expired key. '''
+
+        self.next_sweep = now + self.sweep_interval
+
+        for key in [key for key, expiry in self.expiries.items() if expiry <= now]:
+            del self.expiries[key]
@@ -1,9 +1,16 @@
-import cv2
-import yagmail 
 import os 
 from datetime import datetime 
 import time 
 from ...settings import *
+from app.utils.LazyImport import lazy_import
+from .PerceptualHash import CaptureHashCache, dhash
+from .SuppressionCache import SuppressionCache
+from .BboxUtils import calculate_center_point
+from .AlertDigest import AlertDigest, build_contact_sheet
+import tempfile
+
+cv2 = lazy_import('cv2')
+yagmail = lazy_import('yagmail')
 
 
 class ThreatManagement(object):
@@ -14,7 +21,8 @@ class ThreatManagement(object):
             CLIENT_PASSWORD : str,
             TARGET_EMAIL : str, 
             MAX_THREAT_LEVEL : int,
-            CAPTURES_DIR : str
+            CAPTURES_DIR : str,
+            CAMERA_NAME : str | None = None
         ):
 
         self.CLIENT_USERNAME = CLIENT_USERNAME
@@ -22,19 +30,81 @@ class ThreatManagement(object):
         self.TARGET_EMAIL = TARGET_EMAIL
         self.MAX_THREAT_LEVEL = MAX_THREAT_LEVEL
         self.CAPTURES_DIR = CAPTURES_DIR
+        self.CAMERA_NAME = CAMERA_NAME
         
         if not os.path.exists(self.CAPTURES_DIR):
             os.makedirs(self.CAPTURES_DIR)
 
-        self.yagmail_client = yagmail.SMTP(self.CLIENT_USERNAME, self.CLIENT_PASSWORD)
+        # SMTP client is only created, and logged in, once the first alert needs sending.
+        self.yagmail_client = None
+
+        # Alert cooldowns. A track is not alerted on again for ID_COOLDOWN seconds, and no track is alerted on within the
+        #   zone of a recent alert, or the zones beside it, for ZONE_COOLDOWN seconds. Zones divide the frame into a
+        #   ZONE_GRID of columns and rows, so a subject dropped and re-registered under a new ID in the same spot
+        #   does not raise a fresh alert.
+        self.ID_COOLDOWN = 600.0
+        self.ZONE_COOLDOWN = 60.0
+        self.ZONE_GRID = (8, 6)
+        self.suppressed_alerts = SuppressionCache(default_ttl=self.ID_COOLDOWN)
+
+        # Running count of alerts held back by a cooldown.
+        self.alerts_suppressed = 0
+
+        # Digest mode emails the first alert after a quiet period straight away, then gathers alerts into one email per
+        #   alerts frequency window instead of an email each.
+        self.DIGEST_ENABLED = DEFAULT_SETTINGS['alerts']['digest']
+        self.digest = AlertDigest(window=DEFAULT_SETTINGS['alerts']['frequency'])
+
+        # Email alerts are sent unless toggled off by the user.
+        self.ALERTS_ENABLED = True
+
+        # Frames of threats are written to the captures directory, disabled when replaying footage offline.
+        self.CAPTURES_ENABLED = True
+
+        # Running count of threats handled, exported by pipeline instrumentation.
+        self.alerts_raised = 0
+
+        # Running count of frames written to disk.
+        self.captures_taken = 0
+
+        # Several track IDs are often given to one lingering subject. Subjects hashing within a few bits of a capture's
+        #   subject from the last 30 seconds are attached to that capture rather than written and emailed again.
+        self.recent_captures = CaptureHashCache(window=30.0, max_distance=10)
+
+        # Running count of captures suppressed as duplicates.
+        self.captures_deduplicated = 0
+
+        # Time source for cooldowns and the deduplication window, replaced with a simulated clock to replay footage.
+        self.clock = time.time
+
+        # Called as listener(event, detection, at) when a detection is handled as a threat, for the event log.
+        self.event_listener = None
+
+
+    def update_settings(self, settings : dict):
 
-        self.handled_IDs = set()
+        ''' Apply user settings from any section concerning threat handling, keys not present are left untouched. '''
+
+        self.MAX_THREAT_LEVEL = settings.get('maximum_threat_threshold', self.MAX_THREAT_LEVEL)
+        self.ALERTS_ENABLED = bool(settings.get('toggle', self.ALERTS_ENABLED))
+        self.DIGEST_ENABLED = bool(settings.get('digest', self.DIGEST_ENABLED))
+        self.digest.window = settings.get('frequency', self.digest.window)
 
 
     def handle_threats(self, tracked_detections, frame):
 
         ''' Iterate over detections being tracked and assess their threat level. '''
 
+        now = self.clock()
+
+        self.suppressed_alerts.maintain(now)
+
+        # Send anything held over a digest window which has closed.
+        alerts = self.digest.collect(now)
+
+        if alerts and self.ALERTS_ENABLED:
+            self.send_digest_email(alerts)
+
         for detection in tracked_detections:
             self.check_threat_level(detection, frame) 
 
@@ -43,23 +113,127 @@ class ThreatManagement(object):
 
         ID = detection.get('ID')
 
-        if detection['threat_level'] >= self.MAX_THREAT_LEVEL and \
-            ID not in self.handled_IDs:
+        if detection['threat_level'] < self.MAX_THREAT_LEVEL:
+            return
+
+        now = self.clock()
+
+        if self.suppressed_alerts.contains(('ID', ID), now):
+            return
+
+        zone = self.locate_zone(detection, frame)
+
+        # A recent alert nearby already covers this subject, hold this track back for its own cooldown as well.
+        if any(self.suppressed_alerts.contains(key, now) for key in self.neighbouring_zones(zone)):
+
+            self.suppressed_alerts.add(('ID', ID), self.ID_COOLDOWN, now)
+            self.alerts_suppressed += 1
+
+            return
+
+        subject_hash = self.hash_subject(detection, frame) if self.CAPTURES_ENABLED else None
+        duplicate = self.recent_captures.find(subject_hash, now) if subject_hash is not None else None
+
+        # The subject of a recent capture under a new ID. It is attached to that capture instead of alerting again, with no
+        #   cooldown applied, so the track is still alerted on should it stop matching.
+        if duplicate is not None:
+            self.attach_duplicate(duplicate, detection, now)
+            return
+
+        print('Detection has exceeded maximum threat level, handling accordingly.')
+
+        if self.event_listener is not None:
+            self.event_listener('exceed', detection, now)
+
+        full_path = self.capture_frame(frame, ID, subject_hash) if self.CAPTURES_ENABLED else None
+
+        if self.ALERTS_ENABLED and full_path:
+
+            alert = {'time' : now, 'ID' : ID, 'threat_level' : detection['threat_level'], 'path' : full_path}
+
+            if not self.DIGEST_ENABLED or self.digest.submit(alert, frame, now):
+                self.send_email_alert(detection, full_path)
+
+        self.suppressed_alerts.add(('ID', ID), self.ID_COOLDOWN, now)
+        self.suppressed_alerts.add(('zone', *zone), self.ZONE_COOLDOWN, now)
+
+        self.alerts_raised += 1
+
+
+    def locate_zone(self, detection, frame) -> tuple[int, int]:
+
+        ''' Column and row of the zone a detection's center falls in. '''
+
+        center_x, center_y = calculate_center_point(detection['bboxes'])
+        frame_height, frame_width = frame.shape[:2]
+        columns, rows = self.ZONE_GRID
+
+        return (
+            min(max(center_x * columns // frame_width, 0), columns - 1),
+            min(max(center_y * rows // frame_height, 0), rows - 1)
+        )
+
+
+    def neighbouring_zones(self, zone : tuple[int, int]) -> list[tuple]:
+
+        ''' Cooldown keys of a zone and the zones around it, so a subject on a zone boundary is still matched. '''
+
+        column, row = zone
+
+        return [('zone', column + x, row + y) for x in (-1, 0, 1) for y in (-1, 0, 1)]
+
+
+    def hash_subject(self, detection, frame) -> int | None:
+
+        '''
+            Difference hash of a detection's bounding box, None when the box is too small to hash. Hashing the subject
+                rather than the frame keeps the static background, which dominates a fixed camera's view, from making
+                different subjects look alike.
+        '''
+
+        frame_height, frame_width = frame.shape[:2]
+        bbox = detection['bboxes']
+
+        x1, y1 = max(int(bbox['x1']), 0), max(int(bbox['y1']), 0)
+        x2, y2 = min(int(bbox['x2']), frame_width), min(int(bbox['y2']), frame_height)
+
+        # The hash shrinks to 9x8, anything smaller cannot fill it.
+        if x2 - x1 < 9 or y2 - y1 < 8:
+            return None
+
+        return dhash(frame[y1:y2, x1:x2])
+
+
+    def attach_duplicate(self, capture : dict, detection, now : float) -> None:
+
+        ''' Attach a track to the recent capture of its subject, recorded once per track in the event log. '''
+
+        ID = detection.get('ID')
+
+        if ID in capture['IDs']:
+            return
 
-            print('Detection has exceeded maximum threat level, handling accordingly.')
+        capture['IDs'].append(ID)
+        self.captures_deduplicated += 1
 
-            full_path = self.capture_frame(frame, ID)
+        print(f'Detection {ID} matches capture {os.path.basename(capture["path"])}, not saving a duplicate.')
 
-            self.send_email_alert(detection, full_path)
+        if self.event_listener is not None:
+            self.event_listener('duplicate', detection, now)
 
-            self.handled_IDs.add(ID)
 
+    def capture_frame(self, frame, ID, subject_hash : int | None = None):
 
-    def capture_frame(self, frame, ID):
+        ''' Write a frame of a threat to the captures directory, returning its path. Its subject's hash is remembered to recognise duplicates. '''
+
+        now = self.clock()
 
         timestamp = datetime.now().strftime(FORMATTED_FILENAME_DATE)
 
-        capture_filename = f'detection_{ID}_{timestamp}.jpg'
+        # Tag captures with the camera they came from when there is one to name.
+        camera_tag = f'_{self.CAMERA_NAME}' if self.CAMERA_NAME else ''
+
+        capture_filename = f'detection_{ID}_{timestamp}{camera_tag}.jpg'
         
         fullpath = os.path.join(self.CAPTURES_DIR, capture_filename)
 
@@ -68,11 +242,26 @@ class ThreatManagement(object):
         if not success:
             raise IOError(f'Failed to write image to {fullpath}')
 
+        self.captures_taken += 1
+
+        if subject_hash is not None:
+            self.recent_captures.add(subject_hash, fullpath, ID, now)
+
         print("Saving to:", CAPTURES_DIR_PATH)
 
         return fullpath
 
     
+    def fetch_email_client(self):
+
+        ''' Return the SMTP client, connecting on first use. '''
+
+        if self.yagmail_client is None:
+            self.yagmail_client = yagmail.SMTP(self.CLIENT_USERNAME, self.CLIENT_PASSWORD)
+
+        return self.yagmail_client
+
+    
     def send_email_alert(self, detection, fullpath, max_retries : int = 3, secs_delay : int = 10) -> None:
 
         ''' 
@@ -92,26 +281,85 @@ class ThreatManagement(object):
         if not os.path.exists(fullpath):
             raise FileNotFoundError(f"Capture not found at {fullpath}")
 
+        # Email subject. 
+        camera = f' on camera {self.CAMERA_NAME}' if self.CAMERA_NAME else ''
+
+        subject = f'Security Alert: Threat detected at level {detection["threat_level"]}{camera}'
+
+        # Email contents.
+        contents = f'''
+            Detected at: {time.strftime("%Y-%m-%d %H:%M:%S")}\n
+            Please see the capture attatched. 
+        '''
+
+        self.send_email(subject, contents, fullpath, max_retries, secs_delay)
+
+
+    def send_digest_email(self, alerts : list[dict], max_retries : int = 3, secs_delay : int = 10) -> None:
+
+        '''
+            Send alerts held over a digest window as one email, a line summarising each alert and a contact sheet of
+                their captures attached in place of each full resolution capture.
+
+            Paramaters:
+                * alerts (list[dict]) : Alerts collected from the digest.
+                * max_retries (int) : Number of tries before operation is terminated. 
+                * secs_delay (int) : Number of seconds until an attempt to resend the email if unsuccessful is made. 
+        '''
+
+        camera = f' on camera {self.CAMERA_NAME}' if self.CAMERA_NAME else ''
+
+        subject = f'Security Alert: {len(alerts)} further threat{"s" if len(alerts) > 1 else ""} detected{camera}'
+
+        summary = '\n'.join(
+            f'{time.strftime("%H:%M:%S", time.localtime(alert["time"]))} - Detection {alert["ID"]} at level '
+            f'{alert["threat_level"]}, saved as {os.path.basename(alert["path"])}'
+            for alert in alerts
+        )
+
+        thumbnailed = [alert for alert in alerts if 'thumbnail' in alert]
+
+        contents = f'''
+            Threats detected since the last alert:\n
+            {summary}\n
+            {"The contact sheet attached shows the first " + str(len(thumbnailed)) + " captures." if thumbnailed else ""}
+        '''
+
+        if not thumbnailed:
+            self.send_email(subject, contents, None, max_retries, secs_delay)
+            return
+
+        sheet = build_contact_sheet(
+            [alert['thumbnail'] for alert in thumbnailed],
+            [f'{time.strftime("%H:%M:%S", time.localtime(alert["time"]))} #{alert["ID"]} L{alert["threat_level"]}' for alert in thumbnailed]
+        )
+
+        # Attachments are sent from disk, the sheet only lives for the duration of the send.
+        with tempfile.TemporaryDirectory() as directory:
+
+            sheet_path = os.path.join(directory, f'digest_{datetime.now().strftime(FORMATTED_FILENAME_DATE)}.jpg')
+
+            if not cv2.imwrite(sheet_path, sheet, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+                raise IOError(f'Failed to write contact sheet to {sheet_path}')
+
+            self.send_email(subject, contents, sheet_path, max_retries, secs_delay)
+
+
+    def send_email(self, subject : str, contents : str, attachment : str | None, max_retries : int = 3, secs_delay : int = 10) -> None:
+
+        ''' Send an email to the recipient, retrying failed attempts after a delay. '''
+
         # Make an attempt until max retries threshold met.
         for attempt in range(max_retries + 1):
 
             try:
 
-                # Email subject. 
-                subject = f'Security Alert: Threat detected at level {detection["threat_level"]}'
-
-                # Email contents.
-                contents = f'''
-                    Detected at: {time.strftime("%Y-%m-%d %H:%M:%S")}\n
-                    Please see the capture attatched. 
-                '''
-
                 # Email object.
-                self.yagmail_client.send(
+                self.fetch_email_client().send(
                     to=self.TARGET_EMAIL,
                     subject=subject, 
                     contents=contents,
-                    attachments=fullpath
+                    attachments=attachment
                 )
 
                 # Return early if successful.
@@ -125,17 +373,3 @@ class ThreatManagement(object):
                 
                 # Delay next attempt.
                 time.sleep(secs_delay)
-
-    
-    def clean_set_IDs(self, persistence_timer : int = 600):
-
-        ''' Free up resources if values handled exceed their expiry. '''
-
-        current_time = time.time()
-
-        expired_IDs = [
-            ID for ID, time in self.handled_IDs.items() if current_time - time > persistence_timer
-        ]
-
-        for ID in expired_IDs:
-            del self.handled_IDs[ID]
@@ -1,8 +1,10 @@
 
-import picamera2
-import cv2
+from app.utils.LazyImport import lazy_import
+from app.utils.cv_utils.FrameFormat import CAPTURE_FORMATS, YUV420, bgr_to_yuv420, pack_yuv420
 import time 
 
+picamera2 = lazy_import('picamera2')
+
 
 class Camera(object):
 
@@ -11,23 +13,41 @@ class Camera(object):
         easier to handle simultaneous cameras. 
     '''
 
-    def __init__(self, resolution: tuple[int, int], framerate: int, content_type: str, use_video_port: bool):
+    def __init__(
+            self,
+            resolution: tuple[int, int],
+            framerate: int,
+            content_type: str,
+            use_video_port: bool,
+            camera_num: int = 0,
+            capture_format: str = 'rgb'
+        ):
 
         '''
             resolution: tuple(int, int) - The resolution of the captured video.
             framerate: int - Frame rate for the video stream.
             content_type: str - Type of content (unused currently, placeholder for future use).
             use_video_port: bool - Whether to use the video port (for speed).
+            camera_num: int - Index of the sensor to open on devices with more than one attached.
+            capture_format: str - 'rgb' for colour frames, or 'yuv420' for planar YUV whose luma plane is detected on directly.
         '''
 
+        if capture_format not in CAPTURE_FORMATS:
+            raise ValueError(f"Unknown capture format {capture_format}, expected one of {', '.join(CAPTURE_FORMATS)}.")
+
         self.resolution = resolution
         self.framerate = framerate
         self.content_type = content_type
         self.use_video_port = use_video_port
+        self.camera_num = camera_num
+        self.capture_format = capture_format
         self.camera = None
         self.uptime = None
         self.settings = {}
 
+        # Sequence number of the last frame delivered by read_stamped_frame, counting from one.
+        self.frame_sequence = 0
+
         # Initialise camera in constructor when object is called. 
         # Worked with old app structure. self.initialise_camera()
 
@@ -50,14 +70,20 @@ class Camera(object):
        
         try:
 
-            self.camera = picamera2.Picamera2()
+            self.camera = picamera2.Picamera2(self.camera_num)
 
             duration = int(1_000_000 // self.framerate)
 
             self.uptime = time.time()
 
+            main = {'size': self.resolution}
+
+            # Planar YUV straight from the ISP, colour is only converted for frames which are displayed or stored.
+            if self.capture_format == YUV420:
+                main['format'] = 'YUV420'
+
             config = self.camera.create_preview_configuration(
-                main={'size': self.resolution},
+                main=main,
                 controls={'FrameDurationLimits': (duration, duration)}
             )
             self.camera.configure(config)
@@ -78,12 +104,46 @@ class Camera(object):
 
             frame = self.camera.capture_array()
 
+            # Rows may be padded out to the sensor stride, which would misplace the chroma planes.
+            if self.capture_format == YUV420:
+                frame = pack_yuv420(frame, *self.resolution)
+
             return frame 
 
         except Exception as e:
             print(f'Client has since disconnected. Stream halting!\n\n{e}')
  
 
+    def read_stamped_frame(self):
+
+        '''
+            Read the next frame stamped as it arrives, so its age can be followed through the pipeline and out to viewers.
+
+            Returns:
+                * frame, sequence, captured_at (tuple[np.ndarray | None, int, float]) : Frame, None if the camera failed
+                    to deliver one, its sequence number and its time.monotonic() capture time.
+        '''
+
+        frame = self.read_frame()
+        captured_at = time.monotonic()
+
+        # Failed reads keep the sequence unchanged, gaps seen by viewers are frames dropped downstream.
+        if frame is not None:
+            self.frame_sequence += 1
+
+        return frame, self.frame_sequence, captured_at
+
+
+    def from_bgr(self, frame):
+
+        ''' Deliver a BGR frame produced in software in the configured capture format. '''
+
+        if frame is not None and self.capture_format == YUV420:
+            return bgr_to_yuv420(frame)
+
+        return frame
+
+
     def close_camera(self):
         
         ''' Close camera as demonstrated in Picamera2 docs. '''
@@ -103,15 +163,40 @@ class Camera(object):
 
     def update_settings(self, settings : dict):
 
-        ''' Apply user configuaration settings to camera ''' 
+        ''' 
+            Apply user configuaration settings to camera. Frame rate changes are pushed to the running sensor as 
+                controls, only a change in resolution requires the camera to be reconfigured.
+        ''' 
 
         self.settings = settings
         
         preferred_quality = self.settings.get('preferred_quality')
         quality = self.settings.get(preferred_quality, {})
 
-        self.resolution = tuple(quality.get('resolution'))
-        self.framerate = int(quality.get('framerate'))
+        resolution = tuple(quality.get('resolution', self.resolution))
+        framerate = int(quality.get('framerate', self.framerate))
 
-        self.close_camera()
-        self.initialise_camera()
+        resolution_changed = resolution != tuple(self.resolution)
+        framerate_changed = framerate != self.framerate
+
+        self.resolution = resolution
+        self.framerate = framerate
+
+        # Nothing to apply, or values will be picked up when the camera is next initialised.
+        if not self.is_active() or not (resolution_changed or framerate_changed):
+            return
+
+        if resolution_changed:
+            self.close_camera()
+            self.initialise_camera()
+        else:
+            self.apply_frame_duration()
+
+
+    def apply_frame_duration(self):
+
+        ''' Update the frame duration limits of the running camera without reconfiguring it. '''
+
+        duration = int(1_000_000 // self.framerate)
+
+        self.camera.set_controls({'FrameDurationLimits': (duration, duration)})
@@ -103,4 +103,39 @@ class ConfigManager(object):
         ''' Helper function to return current settings stored within the JSON file. '''
 
         return self.settings
-        
\ No newline at end of file
+        
+
+    @staticmethod
+    def diff_settings(previous : dict, current : dict) -> dict:
+
+        '''
+            Compare two settings dictionaries section by section, returning only what has changed.
+
+            Paramaters:
+                * previous (dict) : Settings currently applied.
+                * current (dict) : Incoming settings.
+            Returns:
+                * changes (dict) : Changed section names mapped to the set of keys which differ within them.
+        '''
+
+        changes = {}
+
+        for section, values in current.items():
+
+            previous_values = previous.get(section)
+
+            # Non dictionary values or fresh sections are treated as wholly changed.
+            if not isinstance(values, dict) or not isinstance(previous_values, dict):
+                if values != previous_values:
+                    changes[section] = set(values) if isinstance(values, dict) else {section}
+                continue
+
+            changed_keys = {
+                key for key in values.keys() | previous_values.keys()
+                if values.get(key) != previous_values.get(key)
+            }
+
+            if changed_keys:
+                changes[section] = changed_keys
+
+        return changes
@@ -0,0 +1,262 @@
+import threading
+import sqlite3
+import queue
+import time
+import os
+
+
+# Lifecycle events recorded, stored by their position in this tuple to keep rows compact. Append only, never reorder.
+EVENT_TYPES : tuple[str, ...] = ('register', 'escalate', 'exceed', 'prune', 'duplicate')
+
+SCHEMA : str = '''
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY,
+        time REAL NOT NULL,
+        session INTEGER NOT NULL,
+        camera TEXT NOT NULL,
+        track_id INTEGER NOT NULL,
+        event INTEGER NOT NULL,
+        threat_level INTEGER,
+        x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+        cx REAL, cy REAL
+    );
+    CREATE INDEX IF NOT EXISTS events_time ON events (time);
+    CREATE INDEX IF NOT EXISTS events_track ON events (camera, track_id, time);
+    CREATE INDEX IF NOT EXISTS events_track_id ON events (track_id, camera, time);
+'''
+
+
+class EventLog(object):
+
+    '''
+        Append only store of track lifecycle events in SQLite. Events are queued by the frame loop without waiting, and
+            written in batches by a background thread, one transaction per batch. The database runs in WAL mode so
+            queries read alongside the writer without blocking it.
+    '''
+
+    def __init__(self, path : str, batch_size : int = 256, flush_interval : float = 1.0, max_queued : int = 10000):
+
+        '''
+            Paramaters:
+                * path (str) : SQLite database file, created if missing.
+                * batch_size (int) : Most events written in one transaction.
+                * flush_interval (float) : Longest an event waits in the queue before it is written.
+                * max_queued (int) : Events held while the writer catches up, further events are dropped and counted.
+        '''
+
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # Track IDs start again from one every run, the session tells runs apart.
+        self.session = int(time.time())
+
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.writer_thread = None
+
+        # Running totals for the status page.
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+
+    def start(self) -> None:
+
+        ''' Create the database if needed and start the background writer. '''
+
+        if self.writer_thread is not None and self.writer_thread.is_alive():
+            return
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        connection = self.connect()
+
+        try:
+            # WAL mode persists in the database file, later connections pick it up.
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+        self.writer_thread = threading.Thread(target=self.run_writer, name='event-log-writer', daemon=True)
+        self.writer_thread.start()
+
+
+    def stop(self) -> None:
+
+        ''' Write anything still queued, then stop the writer. '''
+
+        if self.writer_thread is None:
+            return
+
+        self.queue.put(None)
+        self.writer_thread.join()
+        self.writer_thread = None
+
+
+    def connect(self) -> sqlite3.Connection:
+
+        ''' New connection, each thread opens its own. '''
+
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        # Under WAL a commit only needs to reach the log, not the main database, for the database to stay consistent.
+        connection.execute('PRAGMA synchronous=NORMAL')
+
+        return connection
+
+
+    def record(self, event : str, camera : str, detection : dict, at : float | None = None) -> bool:
+
+        '''
+            Queue an event for writing, returning straight away. Called from the frame loop, so a full queue drops the
+                event rather than waiting on the disk.
+
+            Paramaters:
+                * event (str) : One of EVENT_TYPES.
+                * camera (str) : Name of the camera the track belongs to.
+                * detection (dict) : Tracked detection, its ID, threat level, bounding box and center points are kept.
+                * at (float | None) : Time of the event in seconds since the epoch, defaults to now.
+            Returns:
+                * queued (bool) : Whether the event was accepted.
+        '''
+
+        bbox = detection.get('bboxes') or detection
+        center_points = detection.get('center_points')
+        cx, cy = center_points[-1] if center_points else (None, None)
+
+        row = (
+            time.time() if at is None else at, self.session, camera, detection.get('ID'), EVENT_TYPES.index(event),
+            detection.get('threat_level'), bbox.get('x1'), bbox.get('y1'), bbox.get('x2'), bbox.get('y2'), cx, cy
+        )
+
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        return True
+
+
+    def run_writer(self) -> None:
+
+        ''' Writer loop, collecting queued events into batches until a batch fills or the flush interval passes. '''
+
+        connection = self.connect()
+        stopping = False
+
+        try:
+
+            while not stopping:
+
+                try:
+                    rows = [self.queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+
+                deadline = time.monotonic() + self.flush_interval
+
+                while len(rows) < self.batch_size:
+
+                    try:
+                        rows.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+
+                # The stop sentinel ends the loop once the rows queued ahead of it are written.
+                if None in rows:
+                    stopping = True
+                    rows = [row for row in rows if row is not None]
+
+                if not rows:
+                    continue
+
+                try:
+
+                    with connection:
+                        connection.executemany(
+                            'INSERT INTO events (time, session, camera, track_id, event, threat_level, x1, y1, x2, y2, cx, cy) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            rows
+                        )
+
+                    self.written += len(rows)
+                    self.batches += 1
+
+                except sqlite3.Error as e:
+
+                    self.dropped += len(rows)
+                    print(f'Failed to write {len(rows)} events to the event log!\n\n{e}')
+
+        finally:
+            connection.close()
+
+
+    def query(
+            self,
+            start : float | None = None,
+            end : float | None = None,
+            camera : str | None = None,
+            track_id : int | None = None,
+            session : int | None = None,
+            event : str | None = None,
+            limit : int = 1000
+        ) -> list[dict]:
+
+        '''
+            Events matching every filter given, oldest first. Indexes cover a time range alone, a camera's events over
+                time, with or without a track, and a track over time whether or not its camera is given.
+
+            Paramaters:
+                * start (float | None) : Earliest event time in seconds since the epoch, inclusive.
+                * end (float | None) : Latest event time, exclusive.
+                * camera (str | None) : Camera name.
+                * track_id (int | None) : Track ID, IDs are only unique per camera and session.
+                * session (int | None) : Run of the application, the time it started.
+                * event (str | None) : One of EVENT_TYPES.
+                * limit (int) : Most events returned.
+        '''
+
+        clauses, values = [], []
+
+        for clause, value in (
+            ('time >= ?', start), ('time < ?', end), ('camera = ?', camera), ('track_id = ?', track_id),
+            ('session = ?', session), ('event = ?', EVENT_TYPES.index(event) if event is not None else None)
+        ):
+            if value is not None:
+                clauses.append(clause)
+                values.append(value)
+
+        statement = 'SELECT time, session, camera, track_id, event, threat_level, x1, y1, x2, y2, cx, cy FROM events'
+
+        if clauses:
+            statement += ' WHERE ' + ' AND '.join(clauses)
+
+        statement += ' ORDER BY time LIMIT ?'
+        values.append(limit)
+
+        connection = self.connect()
+
+        try:
+            rows = connection.execute(statement, values).fetchall()
+        finally:
+            connection.close()
+
+        return [
+            {
+                'time' : at, 'session' : run, 'camera' : camera, 'track_id' : track, 'event' : EVENT_TYPES[code],
+                'threat_level' : level, 'bbox' : [x1, y1, x2, y2], 'center' : [cx, cy] if cx is not None else None
+            }
+            for at, run, camera, track, code, level, x1, y1, x2, y2, cx, cy in rows
+        ]
+
+
+    def status(self) -> dict:
+
+        return {
+            'session' : self.session,
+            'queued' : self.queue.qsize(),
+            'written' : self.written,
+            'dropped' : self.dropped,
+            'batches' : self.batches
+        }
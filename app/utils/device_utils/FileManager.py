@@ -43,6 +43,8 @@ class FileManager(object):
                 ID = filename_parts[1]
                 capture_date = filename_parts[2]
                 capture_time = filename_parts[3]
+                # Camera the capture was taken by, absent from captures predating multiple cameras.
+                camera = filename_parts[4] if len(filename_parts) > 4 else ''
 
                 # Append the images data to the images dictionary. 
                 files.append({
@@ -57,7 +59,9 @@ class FileManager(object):
                     # Time the capture was taken.
                     'capture_time' : capture_time,
                     # Detection ID
-                    'ID' : ID
+                    'ID' : ID,
+                    # Camera name.
+                    'camera' : camera
                 })
 
         # Sort the files based on capture_date and capture_time
@@ -0,0 +1,129 @@
+from .Camera import Camera
+from app.utils.LazyImport import lazy_import
+import numpy as np
+import time
+
+cv2 = lazy_import('cv2')
+
+
+class SyntheticCamera(Camera):
+
+    '''
+        Stand-in for the onboard camera rendering a controlled number of moving blobs over a static, textured background.
+            Output is fully determined by the seed, allowing benchmarks and development without camera hardware.
+    '''
+
+    def __init__(
+            self,
+            resolution : tuple[int, int],
+            framerate : int,
+            blob_count : int = 3,
+            blob_size : int = 60,
+            seed : int = 0,
+            realtime : bool = True,
+            capture_format : str = 'rgb'
+        ):
+
+        '''
+            Paramaters:
+                * resolution (tuple[int, int]) : Width and height of the frames produced.
+                * framerate (int) : Frame rate frames are paced at when running in realtime.
+                * blob_count (int) : Number of independently moving blobs rendered into each frame.
+                * blob_size (int) : Side length in pixels of each blob.
+                * seed (int) : Seed for the background texture and blob trajectories.
+                * realtime (bool) : Pace read_frame to the frame rate, disable to produce frames as fast as possible.
+                * capture_format (str) : 'rgb' for BGR frames or 'yuv420' for planar YUV, as the onboard camera would deliver.
+        '''
+
+        super().__init__(
+            resolution=resolution,
+            framerate=framerate,
+            content_type='synthetic',
+            use_video_port=False,
+            capture_format=capture_format
+        )
+
+        self.blob_count = blob_count
+        self.blob_size = blob_size
+        self.seed = seed
+        self.realtime = realtime
+
+        self.background = None
+        self.positions = None
+        self.velocities = None
+        self.next_frame_at = 0.0
+
+
+    def initialise_camera(self):
+
+        ''' Build the background and starting blob trajectories from the seed. '''
+
+        width, height = self.resolution
+
+        rng = np.random.default_rng(self.seed)
+
+        # Gradient with a fixed layer of noise so the background has texture without changing between frames.
+        gradient = np.linspace(40, 160, width, dtype=np.float32)[np.newaxis, :].repeat(height, axis=0)
+        noise = rng.normal(0, 6, size=(height, width)).astype(np.float32)
+        greyscale = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+
+        self.background = cv2.cvtColor(greyscale, cv2.COLOR_GRAY2BGR)
+
+        max_position = np.array([width - self.blob_size, height - self.blob_size], dtype=np.float32)
+
+        self.positions = rng.uniform(0, 1, size=(self.blob_count, 2)).astype(np.float32) * max_position
+        self.velocities = rng.uniform(-12, 12, size=(self.blob_count, 2)).astype(np.float32)
+        self.colours = [tuple(int(channel) for channel in rng.integers(180, 256, size=3)) for _ in range(self.blob_count)]
+
+        self.camera = self
+        self.uptime = time.time()
+        self.next_frame_at = time.monotonic()
+
+
+    def read_frame(self):
+
+        ''' Render the next frame, advancing each blob and bouncing it off the frame edges. '''
+
+        if not self.camera:
+            raise RuntimeError('Camera not yet initialised.')
+
+        if self.realtime:
+
+            # Pace frames to the configured rate.
+            delay = self.next_frame_at - time.monotonic()
+
+            if delay > 0:
+                time.sleep(delay)
+
+            self.next_frame_at = max(self.next_frame_at, time.monotonic()) + (1 / self.framerate)
+
+        width, height = self.resolution
+        max_position = np.array([width - self.blob_size, height - self.blob_size], dtype=np.float32)
+
+        self.positions += self.velocities
+
+        # Reflect blobs which have left the frame back inside it.
+        out_of_bounds = (self.positions < 0) | (self.positions > max_position)
+        self.velocities[out_of_bounds] *= -1
+        np.clip(self.positions, 0, max_position, out=self.positions)
+
+        frame = self.background.copy()
+
+        for (x, y), colour in zip(self.positions.astype(int), self.colours):
+            cv2.rectangle(frame, (int(x), int(y)), (int(x) + self.blob_size, int(y) + self.blob_size), colour, -1)
+
+        return self.from_bgr(frame)
+
+
+    def apply_frame_duration(self):
+
+        ''' Frame pacing reads the frame rate directly, nothing to push to a device. '''
+
+        return
+
+
+    def close_camera(self):
+
+        ''' Release the synthetic source. '''
+
+        self.camera = None
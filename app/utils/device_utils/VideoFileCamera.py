@@ -0,0 +1,117 @@
+from .Camera import Camera
+from app.utils.LazyImport import lazy_import
+import time
+
+cv2 = lazy_import('cv2')
+
+
+class VideoFileCamera(Camera):
+
+    '''
+        Frame source replaying a recorded video file, allowing several sources to be run and tested without camera
+            hardware. Frames are resized to the configured resolution so the file behaves like the profile selected.
+    '''
+
+    def __init__(
+            self,
+            path : str,
+            resolution : tuple[int, int] | None,
+            framerate : int,
+            loop : bool = True,
+            realtime : bool = True,
+            capture_format : str = 'rgb'
+        ):
+
+        '''
+            Paramaters:
+                * path (str) : Path to any video file OpenCV can decode.
+                * resolution (tuple[int, int] | None) : Width and height of the frames produced, None to keep the file's own.
+                * framerate (int) : Frame rate frames are paced at when running in realtime.
+                * loop (bool) : Restart from the beginning at the end of the file, otherwise report it as finished.
+                * realtime (bool) : Pace read_frame to the frame rate, disable to decode as fast as possible.
+                * capture_format (str) : 'rgb' for BGR frames or 'yuv420' for planar YUV, as the onboard camera would deliver.
+        '''
+
+        super().__init__(
+            resolution=resolution,
+            framerate=framerate,
+            content_type='file',
+            use_video_port=False,
+            capture_format=capture_format
+        )
+
+        self.path = path
+        self.loop = loop
+        self.realtime = realtime
+
+        self.finished = False
+        self.next_frame_at = 0.0
+
+
+    def initialise_camera(self):
+
+        ''' Open the file for decoding. '''
+
+        capture = cv2.VideoCapture(self.path)
+
+        if not capture.isOpened():
+            raise RuntimeError(f'Failed to open video file {self.path}')
+
+        if self.resolution is None:
+            self.resolution = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        self.camera = capture
+        self.finished = False
+        self.uptime = time.time()
+        self.next_frame_at = time.monotonic()
+
+
+    def read_frame(self):
+
+        ''' Decode the next frame, None once a non looping file is exhausted. '''
+
+        if not self.camera:
+            raise RuntimeError('Camera not yet initialised.')
+
+        if self.realtime:
+
+            # Pace frames to the configured rate.
+            delay = self.next_frame_at - time.monotonic()
+
+            if delay > 0:
+                time.sleep(delay)
+
+            self.next_frame_at = max(self.next_frame_at, time.monotonic()) + (1 / self.framerate)
+
+        success, frame = self.camera.read()
+
+        if not success and self.loop:
+            self.camera.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self.camera.read()
+
+        if not success:
+            self.finished = True
+            return None
+
+        width, height = self.resolution
+
+        if frame.shape[1] != width or frame.shape[0] != height:
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+        return self.from_bgr(frame)
+
+
+    def apply_frame_duration(self):
+
+        ''' Frame pacing reads the frame rate directly, nothing to push to a device. '''
+
+        return
+
+
+    def close_camera(self):
+
+        ''' Release the decoder. '''
+
+        if self.camera:
+            self.camera.release()
+            self.camera = None
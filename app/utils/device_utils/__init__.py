@@ -1,4 +1,7 @@
 
 from .Camera import Camera
 from .ConfigManager import ConfigManager
-from .FileManager import FileManager
\ No newline at end of file
+from .EventLog import EventLog
+from .FileManager import FileManager
+from .SyntheticCamera import SyntheticCamera
+from .VideoFileCamera import VideoFileCamera
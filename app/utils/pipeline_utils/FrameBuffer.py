@@ -0,0 +1,123 @@
+import threading
+import time
+
+
+# Multipart part framing, the header is formatted once per published frame with the JPEG length and written ahead of
+#   the payload rather than concatenated onto it. Each part carries the camera's sequence number for the frame and its
+#   capture time as seconds since the epoch, letting viewers measure how stale the frame they are shown is.
+PART_HEADER : bytes = (
+    b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\nX-Frame-Seq: %d\r\nX-Capture-Time: %.4f\r\n\r\n'
+)
+PART_TRAILER : bytes = b'\r\n'
+
+
+class FrameBuffer(object):
+
+    '''
+        Single slot holding the latest encoded frame, shared by every connection. The pipeline publishes into it, readers
+            either block on it from a thread or register a listener to be woken from another event loop. Readers which
+            fall behind simply pick up the newest frame, nothing queues up per connection. Frames are held as ready to
+            write multipart parts of header, payload and trailer, so each connection writes them as they are.
+    '''
+
+    def __init__(self):
+
+        self.condition = threading.Condition()
+
+        # Latest multipart part as (header, payload, trailer) and the time.monotonic() capture time of its frame.
+        self.part = None
+        self.captured_at = None
+        self.sequence = 0
+
+        # Connections currently reading from the buffer.
+        self.subscribers = 0
+
+        # Callables invoked after every publish, from the publishing thread.
+        self.listeners = []
+
+
+    def publish(self, frame : bytes, frame_seq : int = 0, captured_at : float | None = None) -> None:
+
+        '''
+            Replace the latest frame and wake every reader.
+
+            Paramaters:
+                * frame (bytes) : Encoded JPEG.
+                * frame_seq (int) : Camera sequence number of the frame.
+                * captured_at (float | None) : time.monotonic() capture time of the frame, None for now.
+        '''
+
+        if captured_at is None:
+            captured_at = time.monotonic()
+
+        # Monotonic time means nothing to a viewer, translate it to wall clock time.
+        capture_time = time.time() - (time.monotonic() - captured_at)
+
+        part = (PART_HEADER % (len(frame), frame_seq, capture_time), frame, PART_TRAILER)
+
+        with self.condition:
+            self.part = part
+            self.captured_at = captured_at
+            self.sequence += 1
+            self.condition.notify_all()
+
+        for listener in self.listeners:
+            listener()
+
+
+    def latest(self) -> tuple[int, tuple[bytes, bytes, bytes] | None, float | None]:
+
+        ''' Latest sequence number, multipart part and capture time without blocking. '''
+
+        with self.condition:
+            return self.sequence, self.part, self.captured_at
+
+
+    def wait_for_frame(
+            self,
+            last_sequence : int,
+            timeout : float | None = None
+        ) -> tuple[int, tuple[bytes, bytes, bytes] | None, float | None]:
+
+        '''
+            Block until a frame newer than the last one seen is published.
+
+            Paramaters:
+                * last_sequence (int) : Sequence number of the last frame the reader consumed.
+                * timeout (float | None) : Seconds to wait before giving up.
+            Returns:
+                * sequence, part, captured_at (tuple[int, tuple[bytes, bytes, bytes] | None, float | None]) : Multipart
+                    header, payload and trailer, None if the wait timed out, and the frame's time.monotonic() capture time.
+        '''
+
+        with self.condition:
+
+            if not self.condition.wait_for(lambda: self.sequence != last_sequence, timeout=timeout):
+                return last_sequence, None, None
+
+            return self.sequence, self.part, self.captured_at
+
+
+    def subscribe(self) -> None:
+
+        with self.condition:
+            self.subscribers += 1
+
+
+    def unsubscribe(self) -> None:
+
+        with self.condition:
+            self.subscribers = max(0, self.subscribers - 1)
+
+
+    def add_listener(self, listener) -> None:
+
+        ''' Register a callable to be invoked after each publish. Must be cheap, it runs on the pipeline thread. '''
+
+        self.listeners.append(listener)
+
+
+    def remove_listener(self, listener) -> None:
+
+        if listener in self.listeners:
+            self.listeners.remove(listener)
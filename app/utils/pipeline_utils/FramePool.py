@@ -0,0 +1,97 @@
+import numpy as np
+import threading
+
+
+class FramePool(object):
+
+    '''
+        Fixed set of preallocated frame buffers handed between pipeline stages instead of allocating a fresh frame for
+            every copy and conversion. A buffer belongs to whoever acquired it until it is released, after which the
+            next stage to acquire one may overwrite it. Buffers are kept per shape, as stages may hold frames with
+            differing channel counts, and the least recently introduced shape is dropped once too many are held, such as
+            after a resolution switch.
+    '''
+
+    def __init__(self, size : int = 4, max_shapes : int = 4):
+
+        '''
+            Paramaters:
+                * size (int) : Buffers kept for reuse per shape, enough to cover every buffer of it held at once.
+                * max_shapes (int) : Distinct shapes buffers are kept for.
+        '''
+
+        self.size = size
+        self.max_shapes = max_shapes
+        self.lock = threading.Lock()
+
+        # Free buffers keyed by shape and element type.
+        self.free = {}
+
+        # Buffers currently handed out.
+        self.outstanding = 0
+
+        # Running count of buffers allocated, constant once the pool is warm unless ownership is leaking.
+        self.allocations = 0
+
+
+    def acquire(self, shape : tuple[int, ...], dtype = np.uint8) -> np.ndarray:
+
+        '''
+            Take ownership of a buffer of the given shape, contents undefined.
+
+            Paramaters:
+                * shape (tuple[int, ...]) : Frame shape.
+                * dtype : Frame element type.
+            Returns:
+                * buffer (np.ndarray) : Buffer owned by the caller until released.
+        '''
+
+        key = (tuple(shape), np.dtype(dtype))
+
+        with self.lock:
+
+            self.outstanding += 1
+
+            free = self.free.get(key)
+
+            if free:
+                return free.pop()
+
+            # New frame geometry, forget the oldest once over the cap. Its buffers are dropped as they are returned.
+            if free is None:
+
+                if len(self.free) >= self.max_shapes:
+                    del self.free[next(iter(self.free))]
+
+                self.free[key] = []
+
+            self.allocations += 1
+
+        return np.empty(key[0], dtype=key[1])
+
+
+    def release(self, buffer : np.ndarray | None) -> None:
+
+        ''' Hand a buffer back to the pool, the caller must not touch it afterwards. '''
+
+        if buffer is None:
+            return
+
+        with self.lock:
+
+            self.outstanding = max(0, self.outstanding - 1)
+
+            free = self.free.get((buffer.shape, buffer.dtype))
+
+            if free is not None and len(free) < self.size:
+                free.append(buffer)
+
+
+    def status(self) -> dict:
+
+        return {
+            'size' : self.size,
+            'free' : sum(len(free) for free in self.free.values()),
+            'outstanding' : self.outstanding,
+            'allocations' : self.allocations
+        }
@@ -0,0 +1,241 @@
+from bisect import bisect_left
+from time import perf_counter
+import threading
+
+
+# Upper bounds in seconds for latency histogram buckets, fixed so observations stay O(log n) with no allocation.
+LATENCY_BUCKETS : tuple[float, ...] = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histogram(object):
+
+    ''' Fixed bucket latency histogram following Prometheus cumulative "le" semantics when rendered. '''
+
+    def __init__(self, buckets : tuple[float, ...] = LATENCY_BUCKETS):
+
+        '''
+            Paramaters:
+                * buckets (tuple[float, ...]) : Ascending bucket upper bounds in seconds. Values above the last bound
+                    fall into an implicit +Inf bucket.
+        '''
+
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+
+    def observe(self, value : float) -> None:
+
+        ''' Record a single observation. '''
+
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+    def mean(self) -> float:
+
+        ''' Average of all observations, zero if none recorded. '''
+
+        return self.total / self.count if self.count else 0.0
+
+
+    def quantile(self, q : float) -> float:
+
+        '''
+            Estimate a quantile by linear interpolation within the bucket it falls in.
+
+            Paramaters:
+                * q (float) : Quantile between 0 and 1.
+            Returns:
+                * value (float) : Estimated value in seconds, the last finite bound if it lands in +Inf.
+        '''
+
+        if not self.count:
+            return 0.0
+
+        target = q * self.count
+        cumulative = 0
+
+        for index, bucket_count in enumerate(self.counts):
+
+            if cumulative + bucket_count >= target and bucket_count:
+
+                # Values beyond the last bound can only be reported as that bound.
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+
+                return lower + (upper - lower) * ((target - cumulative) / bucket_count)
+
+            cumulative += bucket_count
+
+        return self.buckets[-1]
+
+
+class PipelineMetrics(object):
+
+    '''
+        Low overhead instrumentation for the frame pipeline. Stages are timed with a monotonic clock and fed into fixed
+            bucket histograms, alongside simple counters and gauges. Written to by the pipeline thread only, read by routes,
+            except for stream latency which every viewer connection records under its own lock.
+    '''
+
+    # Stages timed within the frame loop, in pipeline order.
+    STAGES : tuple[str, ...] = (
+        'capture', 'preprocess', 'gate', 'tiles', 'threshold', 'contours', 'merge', 'tracking',
+        'annotation', 'colour_conversion', 'encode', 'yield'
+    )
+
+    # Counters exposed, monotonically increasing.
+    COUNTERS : tuple[str, ...] = ('frames', 'frames_dropped', 'global_changes', 'tracks', 'alerts', 'suppressed_alerts', 'duplicate_captures')
+
+    # Gauges exposed, free to go up or down.
+    GAUGES : tuple[str, ...] = ('active_tracks',)
+
+    def __init__(self, namespace : str = 'picam'):
+
+        '''
+            Paramaters:
+                * namespace (str) : Prefix applied to every exported metric name.
+        '''
+
+        self.namespace = namespace
+        self.histograms = {stage: Histogram() for stage in self.STAGES}
+        self.counters = {counter: 0 for counter in self.COUNTERS}
+        self.gauges = {gauge: 0 for gauge in self.GAUGES}
+
+        # Age of each frame from capture to being yielded to a viewer.
+        self.stream_latency = Histogram()
+        self.stream_latency_lock = threading.Lock()
+
+
+    def lap(self, stage : str, mark : float) -> float:
+
+        '''
+            Record time elapsed since a previous mark against a stage and return a fresh mark, allowing consecutive
+                stages to be timed with a single clock read each.
+
+            Paramaters:
+                * stage (str) : Stage name, must be one of STAGES.
+                * mark (float) : perf_counter value taken when the stage began.
+            Returns:
+                * now (float) : perf_counter value at the end of the stage.
+        '''
+
+        now = perf_counter()
+
+        self.histograms[stage].observe(now - mark)
+
+        return now
+
+
+    def observe(self, stage : str, seconds : float) -> None:
+
+        ''' Record a stage duration measured elsewhere. '''
+
+        self.histograms[stage].observe(seconds)
+
+
+    def observe_stream_latency(self, seconds : float) -> None:
+
+        ''' Record how old a frame was when yielded to a viewer, safe to call from any connection. '''
+
+        with self.stream_latency_lock:
+            self.stream_latency.observe(seconds)
+
+
+    def stream_latency_summary(self) -> dict:
+
+        ''' Capture to yield latency percentiles in milliseconds. '''
+
+        histogram = self.stream_latency
+
+        return {
+            'count' : histogram.count,
+            'mean_ms' : round(histogram.mean() * 1000, 2),
+            'p50_ms' : round(histogram.quantile(0.5) * 1000, 2),
+            'p95_ms' : round(histogram.quantile(0.95) * 1000, 2),
+            'p99_ms' : round(histogram.quantile(0.99) * 1000, 2)
+        }
+
+
+    def increment(self, counter : str, amount : int = 1) -> None:
+
+        ''' Increase a counter by the given amount. '''
+
+        self.counters[counter] += amount
+
+
+    def set_gauge(self, gauge : str, value : float) -> None:
+
+        ''' Set a gauge to its current value. '''
+
+        self.gauges[gauge] = value
+
+
+    def stage_summary(self) -> list[dict]:
+
+        ''' Per stage breakdown in milliseconds for rendering on the status page. '''
+
+        return [
+            {
+                'stage' : stage,
+                'count' : histogram.count,
+                'mean_ms' : round(histogram.mean() * 1000, 2),
+                'p50_ms' : round(histogram.quantile(0.5) * 1000, 2),
+                'p95_ms' : round(histogram.quantile(0.95) * 1000, 2)
+            }
+            for stage, histogram in self.histograms.items()
+        ]
+
+
+    def render_prometheus(self) -> str:
+
+        ''' Render all metrics in the Prometheus text exposition format. '''
+
+        lines = []
+
+        for counter, value in self.counters.items():
+            name = f'{self.namespace}_{counter}_total'
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name} {value}')
+
+        for gauge, value in self.gauges.items():
+            name = f'{self.namespace}_{gauge}'
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+
+        name = f'{self.namespace}_stage_duration_seconds'
+        lines.append(f'# TYPE {name} histogram')
+
+        for stage, histogram in self.histograms.items():
+
+            cumulative = 0
+
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+        name = f'{self.namespace}_capture_to_yield_seconds'
+        lines.append(f'# TYPE {name} histogram')
+
+        histogram = self.stream_latency
+        cumulative = 0
+
+        for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+
+        lines.append(f'{name}_bucket{{le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum {histogram.total}')
+        lines.append(f'{name}_count {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,317 @@
+from werkzeug.security import safe_join
+from collections import Counter
+from datetime import datetime
+import threading
+import cProfile
+import math
+import pstats
+import time
+import sys
+import io
+import os
+
+
+# Orderings a stored dump can be reported in.
+SORT_KEYS : frozenset[str] = frozenset(key.value for key in pstats.SortKey)
+
+
+class PipelineProfiler(object):
+
+    '''
+        Runs cProfile over the next N frames of the live pipeline. Armed from any thread, but enabled and disabled by the
+            pipeline thread itself as cProfile only observes the thread it was enabled on. Idle cost is a single attribute
+            check per frame made by the caller.
+    '''
+
+    def __init__(self, output_dir : str, max_frames : int = 10_000):
+
+        '''
+            Paramaters:
+                * output_dir (str) : Directory pstats dumps are written to.
+                * max_frames (int) : Upper bound on frames a single session may profile.
+        '''
+
+        self.output_dir = output_dir
+        self.max_frames = max_frames
+
+        self.lock = threading.Lock()
+
+        # True while a session is requested or running, the only value read by the pipeline when idle.
+        self.armed = False
+
+        self.frames_requested = 0
+        self.frames_remaining = 0
+        self.profile = None
+        self.last_dump = None
+
+
+    def request(self, frames : int) -> bool:
+
+        '''
+            Arm the profiler for the next number of frames.
+
+            Paramaters:
+                * frames (int) : Number of frames to profile, clamped to max_frames.
+            Returns:
+                * armed (bool) : False if a session is already in progress.
+        '''
+
+        with self.lock:
+
+            if self.armed:
+                return False
+
+            self.frames_requested = max(1, min(int(frames), self.max_frames))
+            self.frames_remaining = self.frames_requested
+            self.armed = True
+
+        return True
+
+
+    def begin_frame(self) -> None:
+
+        ''' Called by the pipeline thread at the start of a frame while armed, enables profiling on first use. '''
+
+        if self.profile is not None:
+            return
+
+        self.profile = cProfile.Profile()
+
+        try:
+            self.profile.enable()
+        except ValueError:
+            # Another profiler already holds the interpreter hook, give up on this session.
+            self.profile = None
+            self.armed = False
+
+
+    def end_frame(self) -> None:
+
+        ''' Called by the pipeline thread at the end of a frame while armed, dumps stats once enough frames are seen. '''
+
+        if self.profile is None:
+            return
+
+        self.frames_remaining -= 1
+
+        if self.frames_remaining > 0:
+            return
+
+        self.profile.disable()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        filename = f'profile_{datetime.now().strftime("%Y%m%d-%H%M%S")}_{self.frames_requested}f.pstats'
+
+        self.profile.dump_stats(os.path.join(self.output_dir, filename))
+
+        with self.lock:
+            self.profile = None
+            self.last_dump = filename
+            self.armed = False
+
+
+    def cancel(self) -> None:
+
+        ''' Drop a session that was armed but never picked up, for instance once the pipeline stops. '''
+
+        with self.lock:
+
+            if self.profile is not None:
+                self.profile.disable()
+                self.profile = None
+
+            self.armed = False
+
+
+    def status(self) -> dict:
+
+        ''' Current profiler state for the admin routes. '''
+
+        return {
+            'armed' : self.armed,
+            'running' : self.profile is not None,
+            'frames_requested' : self.frames_requested,
+            'frames_remaining' : self.frames_remaining if self.armed else 0,
+            'last_dump' : self.last_dump
+        }
+
+
+    def render_stats(self, filename : str, sort_key : str = 'cumulative', limit : int = 40) -> str:
+
+        '''
+            Render a stored dump as a plain text pstats report.
+
+            Paramaters:
+                * filename (str) : Dump within the output directory, paths leading outside it are refused.
+                * sort_key (str) : One of the pstats.SortKey values.
+                * limit (int) : Most functions listed.
+            Returns:
+                * report (str) : pstats report.
+            Raises:
+                * FileNotFoundError : No such dump within the output directory.
+                * ValueError : Unknown sort key.
+        '''
+
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key {sort_key}, expected one of {', '.join(sorted(SORT_KEYS))}.")
+
+        # Dumps are unmarshalled, so only ever read one from the output directory itself.
+        path = safe_join(self.output_dir, filename)
+
+        if path is None or not os.path.isfile(path):
+            raise FileNotFoundError(f'No profile {filename}.')
+
+        stream = io.StringIO()
+
+        stats = pstats.Stats(path, stream=stream)
+        stats.sort_stats(sort_key).print_stats(limit)
+
+        return stream.getvalue()
+
+
+class StackSampler(object):
+
+    '''
+        Low rate sampling profiler which periodically records the stack of a single thread from a background thread,
+            writing collapsed stacks suitable for flame graph tooling. Nothing runs unless a session is started.
+    '''
+
+    def __init__(self, output_dir : str, max_duration : float = 300.0):
+
+        '''
+            Paramaters:
+                * output_dir (str) : Directory collapsed stack files are written to.
+                * max_duration (float) : Seconds after which a session stops itself.
+        '''
+
+        self.output_dir = output_dir
+        self.max_duration = max_duration
+
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.samples = Counter()
+        self.sample_count = 0
+        self.last_dump = None
+
+
+    def is_running(self) -> bool:
+
+        return self.thread is not None and self.thread.is_alive()
+
+
+    def start(self, thread_id : int, interval : float = 0.02, duration : float | None = None) -> bool:
+
+        '''
+            Begin sampling a thread.
+
+            Paramaters:
+                * thread_id (int) : Identifier of the thread to sample, as returned by threading.get_ident.
+                * interval (float) : Seconds between samples, clamped between 1ms and 1s.
+                * duration (float | None) : Seconds to sample for, capped at max_duration, which None samples for.
+            Returns:
+                * started (bool) : False if a session is already running.
+            Raises:
+                * ValueError : Interval or duration is not a finite number, or the duration is not positive.
+        '''
+
+        # NaN slips through the clamps below and would leave the sampler spinning without any wait between samples.
+        if not math.isfinite(interval) or (duration is not None and not math.isfinite(duration)):
+            raise ValueError('Sampling interval and duration must be finite numbers of seconds.')
+
+        if duration is not None and duration <= 0:
+            raise ValueError('Sampling duration must be positive.')
+
+        with self.lock:
+
+            if self.is_running():
+                return False
+
+            self.samples = Counter()
+            self.sample_count = 0
+            self.stop_event.clear()
+
+            duration = min(duration if duration is not None else self.max_duration, self.max_duration)
+
+            self.thread = threading.Thread(
+                target=self.run,
+                args=(thread_id, min(max(interval, 0.001), 1.0), duration),
+                name='stack-sampler',
+                daemon=True
+            )
+            self.thread.start()
+
+        return True
+
+
+    def stop(self) -> str | None:
+
+        ''' Stop the running session, returning the filename its samples were written to. '''
+
+        thread = self.thread
+
+        if thread is None:
+            return self.last_dump
+
+        self.stop_event.set()
+        thread.join()
+
+        return self.last_dump
+
+
+    def run(self, thread_id : int, interval : float, duration : float) -> None:
+
+        ''' Sampling loop, runs on the sampler thread. '''
+
+        deadline = time.monotonic() + duration
+
+        while not self.stop_event.wait(interval) and time.monotonic() < deadline:
+
+            frame = sys._current_frames().get(thread_id)
+
+            # Target thread has exited.
+            if frame is None:
+                break
+
+            stack = []
+
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+
+            # Collapsed format lists frames root first.
+            self.samples[';'.join(reversed(stack))] += 1
+            self.sample_count += 1
+
+        self.write_collapsed()
+
+        with self.lock:
+            self.thread = None
+
+
+    def write_collapsed(self) -> None:
+
+        ''' Write samples as "frame;frame;frame count" lines. '''
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        filename = f'samples_{datetime.now().strftime("%Y%m%d-%H%M%S")}.collapsed'
+
+        with open(os.path.join(self.output_dir, filename), 'w') as output_file:
+            for stack, count in self.samples.most_common():
+                output_file.write(f'{stack} {count}\n')
+
+        self.last_dump = filename
+
+
+    def status(self) -> dict:
+
+        ''' Current sampler state for the admin routes. '''
+
+        return {
+            'running' : self.is_running(),
+            'samples' : self.sample_count,
+            'last_dump' : self.last_dump
+        }
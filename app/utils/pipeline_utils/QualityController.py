@@ -0,0 +1,174 @@
+from collections import deque
+import time
+
+
+# Degradation ladder, cheapest last. Each level trades JPEG quality first, then stream resolution, then analysis
+#   resolution, so the viewer notices a softer image well before detection accuracy is given up.
+QUALITY_LEVELS : tuple[dict, ...] = (
+    {'jpeg_quality' : 95, 'stream_scale' : 1.0, 'analysis_scale' : 1.0},
+    {'jpeg_quality' : 80, 'stream_scale' : 1.0, 'analysis_scale' : 1.0},
+    {'jpeg_quality' : 65, 'stream_scale' : 1.0, 'analysis_scale' : 1.0},
+    {'jpeg_quality' : 65, 'stream_scale' : 0.75, 'analysis_scale' : 1.0},
+    {'jpeg_quality' : 60, 'stream_scale' : 0.75, 'analysis_scale' : 0.75},
+    {'jpeg_quality' : 50, 'stream_scale' : 0.5, 'analysis_scale' : 0.75},
+    {'jpeg_quality' : 50, 'stream_scale' : 0.5, 'analysis_scale' : 0.5},
+)
+
+
+class QualityController(object):
+
+    '''
+        Closed loop controller stepping stream and analysis quality to hold a target frame rate. Quality is stepped down
+            as soon as the frame rate or per frame processing time misses its target, but only stepped back up after
+            several consecutive evaluations with clear headroom, so it settles rather than oscillating between levels.
+    '''
+
+    def __init__(
+            self,
+            target_fps : float,
+            name : str = 'main',
+            evaluate_interval : float = 2.0,
+            degrade_below : float = 0.9,
+            recover_budget : float = 0.6,
+            recover_after : int = 3,
+            history : int = 20
+        ):
+
+        '''
+            Paramaters:
+                * target_fps (float) : Frame rate to hold.
+                * name (str) : Camera the controller belongs to, included in the log.
+                * evaluate_interval (float) : Seconds between evaluations, also the minimum time between adjustments.
+                * degrade_below (float) : Fraction of the target frame rate below which quality is stepped down.
+                * recover_budget (float) : Fraction of the frame budget processing must fit within to count as headroom.
+                * recover_after (int) : Consecutive evaluations with headroom before quality is stepped back up.
+                * history (int) : Number of recent adjustments kept for the status page.
+        '''
+
+        self.target_fps = target_fps
+        self.name = name
+        self.evaluate_interval = evaluate_interval
+        self.degrade_below = degrade_below
+        self.recover_budget = recover_budget
+        self.recover_after = recover_after
+
+        self.enabled = True
+        self.level = 0
+        self.headroom_streak = 0
+
+        # None until the first update, which starts the clock so the first evaluation sees a full interval of frames.
+        self.next_evaluation = None
+
+        self.adjustments = deque(maxlen=history)
+
+
+    @property
+    def settings(self) -> dict:
+
+        ''' JPEG quality, stream scale and analysis scale of the current level. '''
+
+        return QUALITY_LEVELS[self.level]
+
+
+    def configure(self, enabled : bool, target_fps : float) -> None:
+
+        ''' Apply a new target, returning to full quality so the new target is approached from the top. '''
+
+        if enabled != self.enabled or target_fps != self.target_fps:
+            self.set_level(0, f'reconfigured to {target_fps} fps' if enabled else 'disabled')
+
+        self.enabled = enabled
+        self.target_fps = target_fps
+        self.headroom_streak = 0
+
+        # Judge the new target on frames produced under it rather than those still in the telemetry window.
+        self.next_evaluation = None
+
+
+    def update(self, fps : float, frame_seconds : float | None, now : float | None = None) -> bool:
+
+        '''
+            Evaluate the achieved frame rate and processing time, stepping quality by one level if needed.
+
+            Paramaters:
+                * fps (float) : Frame rate achieved over the recent window.
+                * frame_seconds (float | None) : Mean seconds spent processing each frame over the same window.
+                * now (float | None) : Monotonic time, defaults to the current time.
+            Returns:
+                * adjusted (bool) : Whether the level changed.
+        '''
+
+        now = time.monotonic() if now is None else now
+
+        # Startup frames are slow and few, wait a full interval before judging them.
+        if self.next_evaluation is None:
+            self.next_evaluation = now + self.evaluate_interval
+
+        # Nothing to judge until the pipeline has a window of frames behind it.
+        if not self.enabled or not self.target_fps or now < self.next_evaluation or not fps or frame_seconds is None:
+            return False
+
+        self.next_evaluation = now + self.evaluate_interval
+
+        budget = 1 / self.target_fps
+
+        # Processing over budget caps the frame rate outright. A low frame rate alone only counts when processing takes
+        #   a large share of the budget, otherwise the sensor is the bottleneck and lowering quality would not help.
+        busy = frame_seconds > budget * self.recover_budget
+
+        if frame_seconds > budget or (busy and fps < self.target_fps * self.degrade_below):
+
+            self.headroom_streak = 0
+
+            if self.level < len(QUALITY_LEVELS) - 1:
+                self.set_level(self.level + 1, f'{fps:.1f} fps, {frame_seconds * 1000:.1f} ms per frame')
+                return True
+
+            return False
+
+        if self.level == 0 or busy:
+            self.headroom_streak = 0
+            return False
+
+        self.headroom_streak += 1
+
+        if self.headroom_streak < self.recover_after:
+            return False
+
+        self.headroom_streak = 0
+        self.set_level(self.level - 1, f'{fps:.1f} fps, {frame_seconds * 1000:.1f} ms per frame')
+
+        return True
+
+
+    def set_level(self, level : int, reason : str) -> None:
+
+        ''' Move to a level, logging the change. '''
+
+        if level == self.level:
+            return
+
+        direction = 'down' if level > self.level else 'up'
+
+        self.level = level
+
+        adjustment = {'time' : time.time(), 'direction' : direction, 'level' : level, 'reason' : reason, **self.settings}
+        self.adjustments.append(adjustment)
+
+        print(
+            f'Adaptive quality for {self.name} stepped {direction} to level {level} ({reason}): jpeg quality {self.settings["jpeg_quality"]}, '
+            f'stream scale {self.settings["stream_scale"]}, analysis scale {self.settings["analysis_scale"]}.'
+        )
+
+
+    def status(self) -> dict:
+
+        ''' JSON serialisable view for the status page. '''
+
+        return {
+            'enabled' : self.enabled,
+            'target_fps' : self.target_fps,
+            'level' : self.level,
+            **self.settings,
+            'adjustments' : list(self.adjustments)
+        }
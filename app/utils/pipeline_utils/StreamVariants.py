@@ -0,0 +1,195 @@
+from .FrameBuffer import FrameBuffer
+import threading
+import math
+
+
+# JPEG quality used when a viewer does not ask for one, matching the OpenCV default.
+DEFAULT_JPEG_QUALITY : int = 95
+
+
+class StreamVariant(object):
+
+    ''' A scaled, paced and compressed rendition of the stream with its own frame buffer and subscribers. '''
+
+    def __init__(self, scale : float, fps : int | None, quality : int):
+
+        '''
+            Paramaters:
+                * scale (float) : Factor applied to both frame dimensions, 1.0 for full resolution.
+                * fps (int | None) : Target frame rate, None to encode every frame the pipeline produces.
+                * quality (int) : JPEG quality between 1 and 100.
+        '''
+
+        self.scale = scale
+        self.fps = fps
+        self.quality = quality
+
+        self.frame_buffer = FrameBuffer()
+
+        self.frame_interval = 1 / fps if fps else 0.0
+        self.next_due = 0.0
+
+
+    @property
+    def key(self) -> tuple[float, int | None, int]:
+
+        return self.scale, self.fps, self.quality
+
+
+    @property
+    def subscribers(self) -> int:
+
+        return self.frame_buffer.subscribers
+
+
+    def is_due(self, now : float) -> bool:
+
+        '''
+            Whether this variant should take the current frame, checked before any resizing or encoding so frames
+                dropped for pacing cost nothing.
+        '''
+
+        if self.subscribers == 0 or now < self.next_due:
+            return False
+
+        # Step the schedule forward, resynchronising after a stall instead of bursting to catch up.
+        self.next_due = max(self.next_due + self.frame_interval, now) if self.next_due else now + self.frame_interval
+
+        return True
+
+
+class VariantRegistry(object):
+
+    '''
+        Stream variants requested by viewers. Requests are normalised so viewers asking for similar streams share one
+            variant, and the number of distinct variants is capped to bound the encoding cost per frame.
+    '''
+
+    def __init__(self, max_variants : int = 6):
+
+        '''
+            Paramaters:
+                * max_variants (int) : Distinct variants allowed, further requests fall back to the default stream.
+        '''
+
+        self.max_variants = max_variants
+        self.lock = threading.Lock()
+
+        self.default = StreamVariant(scale=1.0, fps=None, quality=DEFAULT_JPEG_QUALITY)
+        self.variants = {self.default.key : self.default}
+
+        # Callables invoked after any variant publishes a frame.
+        self.listeners = []
+
+
+    @staticmethod
+    def normalise(scale : float | None, fps : int | None, quality : int | None) -> tuple[float, int | None, int]:
+
+        '''
+            Clamp and round requested parameters so near identical requests map to the same variant. Raises ValueError
+                for values which are not finite numbers, as NaN would pass straight through the clamps.
+        '''
+
+        for name, value in (('scale', scale), ('fps', fps), ('quality', quality)):
+            if value is not None and not math.isfinite(float(value)):
+                raise ValueError(f'Stream {name} must be a finite number, got {value}.')
+
+        scale = 1.0 if scale is None else min(max(round(float(scale), 2), 0.1), 1.0)
+        fps = None if not fps else min(max(int(fps), 1), 60)
+        quality = DEFAULT_JPEG_QUALITY if quality is None else min(max(int(quality), 10), 100)
+
+        return scale, fps, quality
+
+
+    def get(
+            self,
+            scale : float | None = None,
+            fps : int | None = None,
+            quality : int | None = None,
+            subscribe : bool = False
+        ) -> StreamVariant:
+
+        '''
+            Fetch or create the variant for the requested parameters.
+
+            Paramaters:
+                * scale (float | None) : Requested scale, full resolution when None.
+                * fps (int | None) : Requested frame rate, every frame when None.
+                * quality (int | None) : Requested JPEG quality.
+                * subscribe (bool) : Subscribe to the variant before releasing the lock, so it cannot be evicted as idle
+                    before the viewer starts reading. The caller must unsubscribe from its frame buffer when done.
+            Returns:
+                * variant (StreamVariant) : Requested variant, or the full stream once the cap is reached.
+        '''
+
+        key = self.normalise(scale, fps, quality)
+
+        with self.lock:
+
+            variant = self.variants.get(key)
+
+            if variant is None:
+                variant = self.create(key)
+
+            if subscribe:
+                variant.frame_buffer.subscribe()
+
+            return variant
+
+
+    def create(self, key : tuple[float, int | None, int]) -> StreamVariant:
+
+        ''' Add a variant, reusing an idle variant's slot or falling back to the full stream when over the cap. Called holding the lock. '''
+
+        if len(self.variants) >= self.max_variants:
+
+            idle = [existing for existing in self.variants.values() if existing is not self.default and not existing.subscribers]
+
+            if not idle:
+                return self.default
+
+            del self.variants[idle[0].key]
+
+        variant = StreamVariant(*key)
+
+        for listener in self.listeners:
+            variant.frame_buffer.add_listener(listener)
+
+        self.variants[key] = variant
+
+        return variant
+
+
+    def due(self, now : float) -> list[StreamVariant]:
+
+        ''' Variants with subscribers whose next frame is due. '''
+
+        return [variant for variant in list(self.variants.values()) if variant.is_due(now)]
+
+
+    def subscribers(self) -> int:
+
+        return sum(variant.subscribers for variant in list(self.variants.values()))
+
+
+    def add_listener(self, listener) -> None:
+
+        ''' Register a callable invoked after any variant publishes, including variants created later. '''
+
+        with self.lock:
+
+            self.listeners.append(listener)
+
+            for variant in self.variants.values():
+                variant.frame_buffer.add_listener(listener)
+
+
+    def remove_listener(self, listener) -> None:
+
+        with self.lock:
+
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+            for variant in self.variants.values():
+                variant.frame_buffer.remove_listener(listener)
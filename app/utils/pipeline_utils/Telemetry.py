@@ -0,0 +1,141 @@
+from collections import deque
+from datetime import date
+import time
+
+
+class TelemetryAggregator(object):
+
+    '''
+        In memory aggregate of live pipeline health, updated by the pipeline once per frame and read by the status routes.
+            Snapshots are built purely from memory so polling them never touches the filesystem.
+    '''
+
+    def __init__(self, camera, window : int = 60, stale_after : float = 2.0):
+
+        '''
+            Paramaters:
+                * camera (Camera) : Camera whose activity and uptime are reported.
+                * window (int) : Number of recent frames fps and latency are averaged over.
+                * stale_after (float) : Seconds without a frame before fps is reported as zero.
+        '''
+
+        self.camera = camera
+        self.stale_after = stale_after
+
+        self.frame_times = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+
+        self.active_tracks = 0
+        self.max_threat_level = 0
+
+        # Named callables returning the current depth of a queue.
+        self.queues = {}
+
+        # Named callables returning further JSON serialisable sections of the snapshot.
+        self.sections = {}
+
+        # Captures counted from the filesystem once at startup, incremented in memory thereafter.
+        self.captures_day = date.today()
+        self.captures_today = 0
+        self.captures_total_at_day_start = 0
+
+
+    def register_queue(self, name : str, depth) -> None:
+
+        '''
+            Report the depth of a queue in each snapshot.
+
+            Paramaters:
+                * name (str) : Label the depth is reported under.
+                * depth (callable) : Returns the current number of items queued.
+        '''
+
+        self.queues[name] = depth
+
+
+    def register_section(self, name : str, section) -> None:
+
+        '''
+            Include a further section in each snapshot.
+
+            Paramaters:
+                * name (str) : Key the section is reported under.
+                * section (callable) : Returns a JSON serialisable value.
+        '''
+
+        self.sections[name] = section
+
+
+    def seed_captures_today(self, count : int, captures_total : int = 0) -> None:
+
+        ''' Initialise the daily capture count, typically from a single scan of the captures directory. '''
+
+        self.captures_day = date.today()
+        self.captures_today = count
+        self.captures_total_at_day_start = captures_total - count
+
+
+    def record_frame(self, latency : float, tracked_detections : list[dict], captures_total : int) -> None:
+
+        '''
+            Record a processed frame.
+
+            Paramaters:
+                * latency (float) : Seconds taken to process the frame from capture to encode.
+                * tracked_detections (list[dict]) : Detections being tracked within the frame.
+                * captures_total (int) : Running total of captures taken since the pipeline started.
+        '''
+
+        self.frame_times.append(time.monotonic())
+        self.latencies.append(latency)
+
+        self.active_tracks = len(tracked_detections)
+        self.max_threat_level = max((detection.get('threat_level', 0) for detection in tracked_detections), default=0)
+
+        # Start counting afresh at midnight.
+        today = date.today()
+
+        if today != self.captures_day:
+            self.captures_day = today
+            self.captures_total_at_day_start = captures_total
+
+        self.captures_today = captures_total - self.captures_total_at_day_start
+
+
+    def fps(self) -> float:
+
+        ''' Frames per second achieved over the recent window. '''
+
+        if len(self.frame_times) < 2 or time.monotonic() - self.frame_times[-1] > self.stale_after:
+            return 0.0
+
+        elapsed = self.frame_times[-1] - self.frame_times[0]
+
+        return (len(self.frame_times) - 1) / elapsed if elapsed else 0.0
+
+
+    def latency(self) -> float | None:
+
+        ''' Mean seconds taken to process a frame over the recent window. '''
+
+        return sum(self.latencies) / len(self.latencies) if self.latencies else None
+
+
+    def snapshot(self) -> dict:
+
+        ''' Compact, JSON serialisable view of current pipeline health. '''
+
+        uptime = time.time() - self.camera.uptime if self.camera.uptime else None
+        latency = self.latency()
+
+        return {
+            'camera_active' : self.camera.is_active(),
+            'uptime_seconds' : int(uptime) if uptime is not None else None,
+            'fps' : round(self.fps(), 1),
+            'latency_ms' : round(latency * 1000, 1) if latency is not None else None,
+            'active_tracks' : self.active_tracks,
+            'max_threat_level' : self.max_threat_level,
+            'queues' : {name: depth() for name, depth in self.queues.items()},
+            'captures_today' : self.captures_today,
+            **{name: section() for name, section in self.sections.items()}
+        }
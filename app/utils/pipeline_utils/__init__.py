@@ -0,0 +1,8 @@
+
+from .Metrics import PipelineMetrics, Histogram
+from .Profiler import PipelineProfiler, StackSampler
+from .Telemetry import TelemetryAggregator
+from .FrameBuffer import FrameBuffer
+from .FramePool import FramePool
+from .StreamVariants import StreamVariant, VariantRegistry
+from .QualityController import QualityController
@@ -0,0 +1,439 @@
+'''
+    Reproducible benchmarks for the computer vision hot paths, run without camera hardware against synthetic frames.
+
+    Usage:
+        python -m benchmarks.cv_benchmark --output results.json
+        python -m benchmarks.cv_benchmark --compare baseline.json results.json
+'''
+
+from app.FrameProcessor import FrameProcessor
+from app.utils.cv_utils.Annotate import Annotations
+from app.utils.cv_utils.ObjectDetection import ObjectDetection, BBOX_EXTRACTIONS, CONTOURS
+from app.utils.cv_utils.ObjectTracking import ObjectTracking
+from app.utils.cv_utils.FrameFormat import CAPTURE_FORMATS
+from app.utils.device_utils.SyntheticCamera import SyntheticCamera
+from time import perf_counter
+import numpy as np
+import subprocess
+import tracemalloc
+import statistics
+import platform
+import argparse
+import json
+import sys
+import cv2
+import os
+
+
+DEFAULT_RESOLUTIONS : tuple[str, ...] = ('640x480', '1080x720')
+DEFAULT_BLOB_COUNTS : tuple[int, ...] = (0, 1, 4, 16)
+
+# Allocations at least this large are counted individually, comfortably below a greyscale QVGA frame.
+LARGE_ALLOCATION_BYTES : int = 64 * 1024
+
+
+def summarise(samples : list[float]) -> dict:
+
+    ''' Reduce per call durations in seconds to summary statistics in milliseconds. '''
+
+    if not samples:
+        return {'calls' : 0}
+
+    ordered = sorted(samples)
+
+    return {
+        'calls' : len(samples),
+        'mean_ms' : round(statistics.fmean(samples) * 1000, 4),
+        'median_ms' : round(statistics.median(samples) * 1000, 4),
+        'p95_ms' : round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+        'min_ms' : round(ordered[0] * 1000, 4),
+        'stdev_ms' : round(statistics.pstdev(samples) * 1000, 4),
+        'per_second' : round(len(samples) / sum(samples), 2) if sum(samples) else None
+    }
+
+
+def time_calls(function, arguments : list[tuple]) -> list[float]:
+
+    ''' Time a function once per argument tuple. '''
+
+    samples = []
+
+    for args in arguments:
+        start = perf_counter()
+        function(*args)
+        samples.append(perf_counter() - start)
+
+    return samples
+
+
+def count_allocations(function, calls : int, min_bytes : int = LARGE_ALLOCATION_BYTES) -> dict:
+
+    '''
+        Count memory allocated by repeated calls, line by line through every Python frame they run. After each line the
+            traced peak is compared with the memory held when the line began, so a buffer allocated and dropped within
+            the line still counts while reused buffers do not. Buffers from NumPy and OpenCV are traced alongside Python
+            objects. Tracing slows calls considerably, so this runs apart from the timed loops.
+
+        Paramaters:
+            * function : Callable taking no arguments.
+            * calls (int) : Number of calls to average over.
+            * min_bytes (int) : Smallest allocation counted as a frame sized allocation.
+        Returns:
+            * allocations (dict) : Frame sized allocations and kilobytes allocated per call.
+    '''
+
+    totals = {'allocations' : 0, 'bytes' : 0}
+    line_start = [0]
+
+    def trace(frame, event, arg):
+
+        current, peak = tracemalloc.get_traced_memory()
+        growth = peak - line_start[0]
+
+        if growth >= min_bytes:
+            totals['allocations'] += 1
+
+        totals['bytes'] += max(0, growth)
+
+        tracemalloc.reset_peak()
+        line_start[0] = tracemalloc.get_traced_memory()[0]
+
+        return trace
+
+    tracemalloc.start()
+
+    try:
+
+        for _ in range(calls):
+
+            line_start[0] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+            sys.settrace(trace)
+
+            try:
+                function()
+            finally:
+                sys.settrace(None)
+
+            trace(None, 'return', None)
+
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'calls' : calls,
+        'allocations_per_call' : round(totals['allocations'] / calls, 2) if calls else None,
+        'allocated_kb_per_call' : round(totals['bytes'] / calls / 1024, 1) if calls else None
+    }
+
+
+def generate_frames(resolution : tuple[int, int], blob_count : int, frame_count : int, seed : int) -> list[np.ndarray]:
+
+    ''' Pre-render synthetic frames so frame generation is excluded from stage timings. '''
+
+    camera = SyntheticCamera(resolution=resolution, framerate=30, blob_count=blob_count, seed=seed, realtime=False)
+    camera.initialise_camera()
+
+    frames = [camera.read_frame() for _ in range(frame_count)]
+
+    camera.close_camera()
+
+    return frames
+
+
+def benchmark_stages(frames : list[np.ndarray], warmup : int, extraction : str = CONTOURS) -> dict:
+
+    '''
+        Time each hot path in isolation. Inputs for later stages are recorded from earlier ones so every stage sees
+            realistic data, only the stage itself falls inside the timed region. Motion is detected with the given
+            bounding box extraction, and every extraction backend is timed against the same recorded motion masks.
+    '''
+
+    detector = ObjectDetection()
+    detector.bbox_extraction = extraction
+    tracker = ObjectTracking()
+    annotations = Annotations()
+    processor = FrameProcessor(SyntheticCamera(resolution=frames[0].shape[1::-1], framerate=30, realtime=False))
+
+    frame_pairs = list(zip(frames, frames[1:]))
+
+    # Record the unmerged bounding boxes handed to the merge step while timing detection.
+    unmerged_bboxes = []
+    compile_small_contours = detector.compile_small_contours
+
+    def record_merge_input(bboxes, *args, **kwargs):
+        unmerged_bboxes.append([bbox.copy() for bbox in bboxes])
+        return compile_small_contours(bboxes, *args, **kwargs)
+
+    detector.compile_small_contours = record_merge_input
+    motion = [detector.detect_motion(prev.copy(), curr) for prev, curr in frame_pairs]
+    del detector.compile_small_contours
+
+    detections = [bboxes for _, bboxes in motion]
+
+    detect_samples = time_calls(detector.detect_motion, [(prev.copy(), curr) for prev, curr in frame_pairs])
+
+    merge_samples = time_calls(detector.compile_small_contours, [(bboxes,) for bboxes in unmerged_bboxes])
+
+    # Whole frame masks, so each backend extracts every blob of the frame in one call.
+    extraction_arguments = [(mask, (0, 0), detector.sensisitvity) for mask, _ in motion]
+    extraction_samples = {}
+
+    for backend in BBOX_EXTRACTIONS:
+        detector.bbox_extraction = backend
+        extraction_samples[f'extract_{backend}'] = time_calls(detector.extract_bboxes, extraction_arguments)
+
+    detector.bbox_extraction = extraction
+
+    # Tracker mutates its inputs, hand it copies.
+    tracked = []
+    tracker_samples = []
+
+    for bboxes in detections:
+        bboxes = [bbox.copy() for bbox in bboxes]
+        start = perf_counter()
+        tracked_detections = tracker.update_tracker(bboxes) if bboxes else tracker.tick()
+        tracker_samples.append(perf_counter() - start)
+        tracked.append(tracked_detections)
+
+    annotate_samples = time_calls(
+        annotations.annotate_frame,
+        [(frame.copy(), detections) for frame, detections in zip(frames[1:], tracked)]
+    )
+
+    colour_samples = time_calls(processor.convert_frame_colour_channels, [(frame,) for frame in frames])
+    encode_samples = time_calls(processor.encode_frame_2_jpeg, [(frame,) for frame in frames])
+
+    return {
+        'detect_motion' : summarise(detect_samples[warmup:]),
+        'compile_small_contours' : summarise(merge_samples[warmup:]),
+        **{stage : summarise(samples[warmup:]) for stage, samples in extraction_samples.items()},
+        'update_tracker' : summarise(tracker_samples[warmup:]),
+        'annotate_frame' : summarise(annotate_samples[warmup:]),
+        'convert_frame_colour_channels' : summarise(colour_samples[warmup:]),
+        'encode_frame_2_jpeg' : summarise(encode_samples[warmup:])
+    }
+
+
+def benchmark_pipeline(
+        resolution : tuple[int, int],
+        blob_count : int,
+        frame_count : int,
+        seed : int,
+        warmup : int,
+        capture_format : str = 'rgb',
+        viewer : bool = True,
+        extraction : str = CONTOURS
+    ) -> dict:
+
+    '''
+        Time FrameProcessor.process_frame end to end, frame generation included under the capture stage. Frames are
+            delivered in the given capture format, so YUV420 ingest can be measured against RGB, with a full stream
+            viewer or headless as the unit mostly runs.
+    '''
+
+    camera = SyntheticCamera(
+        resolution=resolution, framerate=30, blob_count=blob_count, seed=seed, realtime=False, capture_format=capture_format
+    )
+    camera.initialise_camera()
+
+    processor = FrameProcessor(camera)
+    processor.object_detection.bbox_extraction = extraction
+
+    # Keep captures and alerts out of the measurement.
+    processor.update_modules_settings({
+        'alerts' : {'toggle' : False},
+        'motion_detection' : {'maximum_threat_threshold' : sys.maxsize}
+    })
+
+    # Variants are only encoded while watched, stand in for a single full stream viewer.
+    frame_buffer = processor.stream_variants.default.frame_buffer
+
+    if viewer:
+        frame_buffer.subscribe()
+
+    samples = []
+
+    for _ in range(frame_count):
+        start = perf_counter()
+        processor.process_frame()
+        samples.append(perf_counter() - start)
+
+    def process_and_consume():
+
+        # Stand in for the viewer taking each multipart part, as the stream generator does.
+        processor.process_frame()
+        frame_buffer.latest()
+
+    # Allocations are counted on a separate, untimed run of frames, the pool is already warm from the loop above.
+    allocations = count_allocations(process_and_consume, max(1, min(frame_count - warmup, 50)))
+    allocations['pool'] = processor.frame_pool.status()
+
+    if viewer:
+        frame_buffer.unsubscribe()
+
+    camera.close_camera()
+
+    return {
+        'frame' : summarise(samples[warmup:]),
+        'stages' : processor.metrics.stage_summary(),
+        'allocations' : allocations
+    }
+
+
+def environment() -> dict:
+
+    ''' Details needed to judge whether two result files are comparable. '''
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        'commit' : commit or None,
+        'python' : platform.python_version(),
+        'numpy' : np.__version__,
+        'opencv' : cv2.__version__,
+        'machine' : platform.machine(),
+        'platform' : platform.platform(),
+        'cpu_count' : os.cpu_count(),
+        'opencv_threads' : cv2.getNumThreads()
+    }
+
+
+def run(
+        resolutions : list[str],
+        blob_counts : list[int],
+        frame_count : int,
+        warmup : int,
+        seed : int,
+        capture_format : str = 'rgb',
+        viewer : bool = True,
+        extraction : str = CONTOURS
+    ) -> dict:
+
+    ''' Run every stage and the full pipeline for each resolution and blob count combination. '''
+
+    results = []
+
+    for resolution_label in resolutions:
+
+        resolution = tuple(int(value) for value in resolution_label.lower().split('x'))
+
+        for blob_count in blob_counts:
+
+            print(f'Benchmarking {resolution_label} with {blob_count} blobs...', file=sys.stderr)
+
+            frames = generate_frames(resolution, blob_count, frame_count, seed)
+
+            results.append({
+                'resolution' : resolution_label,
+                'blobs' : blob_count,
+                'stages' : benchmark_stages(frames, warmup, extraction),
+                'pipeline' : benchmark_pipeline(
+                    resolution, blob_count, frame_count, seed, warmup, capture_format, viewer, extraction
+                )
+            })
+
+    return {
+        'environment' : environment(),
+        'parameters' : {
+            'frames' : frame_count, 'warmup' : warmup, 'seed' : seed, 'capture_format' : capture_format, 'viewer' : viewer,
+            'extraction' : extraction
+        },
+        'results' : results
+    }
+
+
+def compare(baseline_path : str, candidate_path : str) -> None:
+
+    ''' Print the change in mean time per stage between two result files. '''
+
+    with open(baseline_path) as baseline_file, open(candidate_path) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+
+    baseline_results = {(result['resolution'], result['blobs']): result for result in baseline['results']}
+
+    print(f"{'case':<20}{'stage':<32}{'baseline ms':>14}{'candidate ms':>14}{'change':>10}")
+
+    for result in candidate['results']:
+
+        key = (result['resolution'], result['blobs'])
+
+        if key not in baseline_results:
+            continue
+
+        previous = baseline_results[key]
+
+        rows = [(stage, previous['stages'].get(stage, {}), stats) for stage, stats in result['stages'].items()]
+        rows.append(('pipeline', previous['pipeline']['frame'], result['pipeline']['frame']))
+
+        for stage, before, after in rows:
+
+            if not before.get('mean_ms') or 'mean_ms' not in after:
+                continue
+
+            change = (after['mean_ms'] - before['mean_ms']) / before['mean_ms'] * 100
+
+            print(f"{key[0] + ' x' + str(key[1]):<20}{stage:<32}{before['mean_ms']:>14.3f}{after['mean_ms']:>14.3f}{change:>+9.1f}%")
+
+        # Older result files predate allocation counting.
+        before, after = previous['pipeline'].get('allocations', {}), result['pipeline'].get('allocations', {})
+
+        for measure in ('allocations_per_call', 'allocated_kb_per_call'):
+
+            if before.get(measure) is None or after.get(measure) is None:
+                continue
+
+            change = (after[measure] - before[measure]) / before[measure] * 100 if before[measure] else 0.0
+
+            print(f"{key[0] + ' x' + str(key[1]):<20}{measure:<32}{before[measure]:>14.1f}{after[measure]:>14.1f}{change:>+9.1f}%")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the computer vision hot paths on synthetic frames.')
+    parser.add_argument('--resolutions', default=','.join(DEFAULT_RESOLUTIONS), help='Comma separated WIDTHxHEIGHT list.')
+    parser.add_argument('--blobs', default=','.join(map(str, DEFAULT_BLOB_COUNTS)), help='Comma separated moving blob counts.')
+    parser.add_argument('--frames', type=int, default=200, help='Frames per case.')
+    parser.add_argument('--warmup', type=int, default=20, help='Leading samples discarded from each stage.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic scene.')
+    parser.add_argument('--capture-format', choices=CAPTURE_FORMATS, default='rgb', help='Format the pipeline is fed frames in.')
+    parser.add_argument('--headless', action='store_true', help='Run the full pipeline without a stream viewer.')
+    parser.add_argument('--extraction', choices=BBOX_EXTRACTIONS, default=CONTOURS, help='Bounding box extraction to detect with.')
+    parser.add_argument('--threads', type=int, help='Pin the OpenCV thread count, defaults to the OpenCV default.')
+    parser.add_argument('--output', help='Write results JSON here, defaults to stdout.')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'), help='Compare two result files and exit.')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    results = run(
+        resolutions=args.resolutions.split(','),
+        blob_counts=[int(count) for count in args.blobs.split(',')],
+        frame_count=args.frames,
+        warmup=args.warmup,
+        seed=args.seed,
+        capture_format=args.capture_format,
+        viewer=not args.headless,
+        extraction=args.extraction
+    )
+
+    output = json.dumps(results, indent=4)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
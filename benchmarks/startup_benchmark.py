@@ -0,0 +1,161 @@
+'''
+    Measure cold boot to first frame. Each trial starts a fresh interpreter so import costs are paid every time.
+
+    Usage:
+        python -m benchmarks.startup_benchmark --trials 5 --output startup.json
+        python -m benchmarks.startup_benchmark --max-first-frame 4.0
+'''
+
+from time import perf_counter
+import subprocess
+import statistics
+import argparse
+import json
+import sys
+import os
+
+
+# Modules which should only be imported once first used, never by importing the app itself.
+HEAVY_MODULES : tuple[str, ...] = ('cv2', 'yagmail', 'picamera2')
+
+
+def child() -> None:
+
+    ''' Boot the application in this process and report how long each phase took as a JSON line. '''
+
+    start = perf_counter()
+
+    from app import build_app
+
+    imported = perf_counter()
+    heavy_modules = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    app = build_app()
+
+    built = perf_counter()
+
+    app.ready.wait(timeout=60)
+
+    ready = perf_counter()
+
+    if not app.ready.is_set():
+        print(json.dumps({'error' : app.startup_error or 'Pipeline did not become ready.'}), flush=True)
+        sys.exit(1)
+
+    client = app.test_client()
+    response = client.get('/video_feed', buffered=False)
+    first_chunk = next(iter(response.response))
+
+    first_frame = perf_counter()
+
+    response.close()
+
+    print(json.dumps({
+        'import_seconds' : imported - start,
+        'build_app_seconds' : built - imported,
+        'ready_seconds' : ready - start,
+        'first_frame_seconds' : first_frame - start,
+        'first_frame_bytes' : len(first_chunk),
+        'heavy_modules_loaded_at_import' : heavy_modules
+    }), flush=True)
+
+    # Skip interpreter teardown, only start up is being measured.
+    os._exit(0)
+
+
+def run_trial(source : str) -> dict:
+
+    ''' Spawn a fresh interpreter and time it from spawn to its first frame. '''
+
+    environment = {**os.environ, 'CAMERA_SOURCE' : source}
+
+    spawned = perf_counter()
+
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.startup_benchmark', '--child'],
+        stdout=subprocess.PIPE,
+        env=environment,
+        text=True
+    )
+
+    # Last line of output holds the report, the app may print its own messages beforehand.
+    report = {}
+
+    for line in process.stdout:
+        if line.startswith('{'):
+            report = json.loads(line)
+            report['spawn_to_first_frame_seconds'] = perf_counter() - spawned
+            break
+
+    process.wait()
+
+    return report
+
+
+def summarise(trials : list[dict]) -> dict:
+
+    ''' Median and worst case of each timed phase across trials. '''
+
+    summary = {}
+
+    for key in trials[0]:
+
+        if not key.endswith('_seconds'):
+            continue
+
+        values = [trial[key] for trial in trials]
+        summary[key] = {'median' : round(statistics.median(values), 4), 'max' : round(max(values), 4)}
+
+    return summary
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark cold boot to first frame.')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--trials', type=int, default=5, help='Number of fresh interpreters to time.')
+    parser.add_argument('--source', default='synthetic', help='CAMERA_SOURCE to boot with.')
+    parser.add_argument('--output', help='Write results JSON here, defaults to stdout.')
+    parser.add_argument('--max-first-frame', type=float, help='Exit non-zero if the median spawn to first frame exceeds this.')
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    trials = [run_trial(args.source) for _ in range(args.trials)]
+
+    failures = [trial for trial in trials if 'error' in trial or not trial]
+
+    if failures:
+        print(json.dumps({'failures' : failures}, indent=4))
+        sys.exit(1)
+
+    results = {
+        'source' : args.source,
+        'trials' : trials,
+        'summary' : summarise(trials)
+    }
+
+    output = json.dumps(results, indent=4)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+    # Lazily imported modules creeping back into import time is a regression in its own right.
+    if any(trial['heavy_modules_loaded_at_import'] for trial in trials):
+        print(f'Heavy modules imported with the app: {trials[0]["heavy_modules_loaded_at_import"]}', file=sys.stderr)
+        sys.exit(1)
+
+    median_first_frame = results['summary']['spawn_to_first_frame_seconds']['median']
+
+    if args.max_first_frame is not None and median_first_frame > args.max_first_frame:
+        print(f'Median first frame {median_first_frame:.3f}s exceeds {args.max_first_frame:.3f}s.', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
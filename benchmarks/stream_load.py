@@ -0,0 +1,513 @@
+'''
+    Load test the streaming endpoints with many concurrent viewers. Each client holds a /video_feed connection open,
+        parses the multipart stream into frames and records when each arrived, while the server's CPU and memory and the
+        pipeline's own frame rate are sampled alongside. Client counts are stepped through as a ramp, so the point at
+        which per-client frame rate collapses shows up in one run.
+
+    By default a local app is started on a synthetic frame source, otherwise point --url at one already running.
+
+    Usage:
+        python -m benchmarks.stream_load --clients 1,2,4,8,16 --duration 10 --output ramp.json
+        python -m benchmarks.stream_load --clients 4 --stream-mode asyncio --min-client-fps 12
+        python -m benchmarks.stream_load --url http://raspberrypi.local:5000 --clients 1,2,4 --query scale=0.5
+'''
+
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+from time import perf_counter
+import subprocess
+import statistics
+import argparse
+import asyncio
+import socket
+import json
+import time
+import sys
+import os
+import re
+
+
+# Counter of frames the pipeline has produced, read from /metrics to derive the producer's frame rate.
+PRODUCER_COUNTER : str = 'picam_frames_total'
+
+
+class ClientStats(object):
+
+    ''' Frames and bytes one viewer received during the current measurement window. '''
+
+    def __init__(self, index : int):
+
+        self.index = index
+        self.arrivals = []
+        self.bytes = 0
+        self.connected_at = None
+        self.first_frame_seconds = None
+        self.error = None
+
+
+    def reset(self) -> None:
+
+        ''' Begin a new measurement window. '''
+
+        self.arrivals = []
+        self.bytes = 0
+
+
+    def summary(self, window : float) -> dict:
+
+        ''' Frame rate, inter-frame jitter and throughput over a window of the given length in seconds. '''
+
+        intervals = [later - earlier for earlier, later in zip(self.arrivals, self.arrivals[1:])]
+        ordered = sorted(intervals)
+
+        return {
+            'client' : self.index,
+            'frames' : len(self.arrivals),
+            'fps' : round(len(self.arrivals) / window, 2),
+            'interval_ms' : round(statistics.fmean(intervals) * 1000, 2) if intervals else None,
+            'jitter_ms' : round(statistics.pstdev(intervals) * 1000, 2) if intervals else None,
+            'p95_interval_ms' : round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2) if intervals else None,
+            'bytes_per_second' : round(self.bytes / window),
+            'first_frame_seconds' : round(self.first_frame_seconds, 3) if self.first_frame_seconds is not None else None,
+            'error' : self.error
+        }
+
+
+async def read_headers(reader : asyncio.StreamReader) -> dict[str, str]:
+
+    ''' Read header lines up to the blank line ending them, names lowercased. '''
+
+    headers = {}
+
+    while True:
+
+        line = await reader.readline()
+
+        if not line:
+            raise ConnectionError('Connection closed while reading headers.')
+
+        if line in (b'\r\n', b'\n'):
+            return headers
+
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+async def read_body(reader : asyncio.StreamReader, chunked : bool):
+
+    ''' Yield the response body as it arrives, undoing chunked transfer encoding where the server applied it. '''
+
+    while True:
+
+        if not chunked:
+
+            data = await reader.read(65536)
+
+            if not data:
+                return
+
+            yield data
+            continue
+
+        size = int((await reader.readline()).split(b';', 1)[0], 16)
+
+        if size == 0:
+            return
+
+        data = await reader.readexactly(size + 2)
+
+        yield data[:-2]
+
+
+async def run_client(stats : ClientStats, url : str, stop : asyncio.Event) -> None:
+
+    '''
+        Hold one stream open until stopped, parsing multipart parts as they arrive. Parts carrying Content-Length are
+            read by length, others by scanning for the next boundary.
+    '''
+
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+
+    started = perf_counter()
+
+    try:
+
+        reader, writer = await asyncio.open_connection(host, port)
+
+    except OSError as e:
+        stats.error = f'Connect failed: {e}'
+        return
+
+    try:
+
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+
+        status_line = await reader.readline()
+        headers = await read_headers(reader)
+
+        if b' 200 ' not in status_line:
+            stats.error = status_line.decode('latin-1').strip()
+            return
+
+        stats.connected_at = perf_counter()
+
+        boundary = re.search(r'boundary="?([^";]+)', headers.get('content-type', ''))
+        delimiter = b'--' + (boundary.group(1) if boundary else 'frame').encode()
+
+        body = read_body(reader, headers.get('transfer-encoding', '').lower() == 'chunked')
+        buffer = bytearray()
+        needed = None
+
+        async for data in body:
+
+            stats.bytes += len(data)
+            buffer += data
+
+            while True:
+
+                # Waiting on the rest of a part whose length is known.
+                if needed is not None:
+
+                    if len(buffer) < needed:
+                        break
+
+                    del buffer[:needed]
+                    needed = None
+
+                    record_frame(stats, started)
+
+                start = buffer.find(delimiter)
+                header_end = buffer.find(b'\r\n\r\n', start) if start >= 0 else -1
+
+                if header_end < 0:
+                    break
+
+                length = re.search(rb'content-length:\s*(\d+)', bytes(buffer[start:header_end]), re.IGNORECASE)
+
+                if length:
+                    del buffer[:header_end + 4]
+                    needed = int(length.group(1))
+                    continue
+
+                # No length given, the part runs up to the next boundary.
+                following = buffer.find(b'\r\n' + delimiter, header_end)
+
+                if following < 0:
+                    break
+
+                del buffer[:following]
+
+                record_frame(stats, started)
+
+            if stop.is_set():
+                return
+
+    except (OSError, asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+
+        if not stop.is_set():
+            stats.error = f'{type(e).__name__}: {e}'
+
+    finally:
+
+        writer.close()
+
+
+def record_frame(stats : ClientStats, started : float) -> None:
+
+    now = perf_counter()
+
+    if stats.first_frame_seconds is None:
+        stats.first_frame_seconds = now - started
+
+    stats.arrivals.append(now)
+
+
+def process_usage(pid : int | None) -> tuple[float, int] | None:
+
+    ''' CPU seconds used and resident memory in bytes of a local process, None where /proc cannot be read. '''
+
+    if pid is None:
+        return None
+
+    try:
+
+        with open(f'/proc/{pid}/stat') as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+
+        with open(f'/proc/{pid}/statm') as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+
+    except (OSError, IndexError, ValueError):
+        return None
+
+    # Fields after the command name begin at the state, user and system time are the 12th and 13th of them.
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+    return cpu_seconds, resident_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def producer_frames(base_url : str) -> int | None:
+
+    ''' Frames the default camera's pipeline has produced so far, from its Prometheus counters. '''
+
+    try:
+        with urlopen(f'{base_url}/metrics', timeout=5) as response:
+            text = response.read().decode()
+    except OSError:
+        return None
+
+    match = re.search(rf'^{PRODUCER_COUNTER} (\d+)', text, re.MULTILINE)
+
+    return int(match.group(1)) if match else None
+
+
+def free_port() -> int:
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(stream_mode : str, log_path : str | None) -> tuple[subprocess.Popen, str, str]:
+
+    '''
+        Start the app on a synthetic frame source, listening on free local ports.
+
+        Returns:
+            * process, base_url, stream_base_url (tuple[subprocess.Popen, str, str]) : Server process, the Flask base
+                URL and the base URL streams are served from.
+    '''
+
+    port, stream_port = free_port(), free_port()
+
+    environment = {
+        **os.environ,
+        'CAMERA_SOURCE' : os.environ.get('CAMERA_SOURCE', 'synthetic'),
+        'HOST' : '127.0.0.1',
+        'PORT' : str(port),
+        'DEBUG' : '',
+        'STREAM_MODE' : stream_mode,
+        'STREAM_PORT' : str(stream_port)
+    }
+
+    log = open(log_path, 'w') if log_path else subprocess.DEVNULL
+
+    process = subprocess.Popen([sys.executable, 'main.py'], env=environment, stdout=log, stderr=subprocess.STDOUT)
+
+    base_url = f'http://127.0.0.1:{port}'
+    stream_base_url = f'http://127.0.0.1:{stream_port}' if stream_mode == 'asyncio' else base_url
+
+    return process, base_url, stream_base_url
+
+
+def wait_until_ready(base_url : str, timeout : float, process : subprocess.Popen | None = None) -> None:
+
+    ''' Poll /ready until the pipeline is warm. '''
+
+    deadline = perf_counter() + timeout
+
+    while perf_counter() < deadline:
+
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode} before becoming ready.')
+
+        try:
+            with urlopen(f'{base_url}/ready', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+
+        time.sleep(0.25)
+
+    raise RuntimeError(f'Server at {base_url} did not become ready within {timeout} seconds.')
+
+
+async def ramp(
+        stream_url : str,
+        base_url : str,
+        client_counts : list[int],
+        duration : float,
+        settle : float,
+        server_pid : int | None
+    ) -> list[dict]:
+
+    '''
+        Step through client counts, adding connections to reach each count, letting the server settle, then measuring
+            every client, the producer and the server over the window.
+
+        Paramaters:
+            * stream_url (str) : Full URL of the stream, with any variant query.
+            * base_url (str) : Base URL of the Flask app, for /metrics.
+            * client_counts (list[int]) : Concurrent clients at each step, ascending.
+            * duration (float) : Seconds each step is measured for.
+            * settle (float) : Seconds after new clients connect before measuring.
+            * server_pid (int | None) : Local server process to sample CPU and memory of.
+        Returns:
+            * steps (list[dict]) : Measurements of each step.
+    '''
+
+    stop = asyncio.Event()
+    clients = []
+    tasks = []
+    steps = []
+
+    try:
+
+        for count in client_counts:
+
+            while len(clients) < count:
+                stats = ClientStats(len(clients))
+                clients.append(stats)
+                tasks.append(asyncio.create_task(run_client(stats, stream_url, stop)))
+
+            print(f'{count} clients, settling for {settle}s then measuring for {duration}s...', file=sys.stderr)
+
+            await asyncio.sleep(settle)
+
+            for stats in clients:
+                stats.reset()
+
+            server_before = process_usage(server_pid)
+            frames_before = await asyncio.to_thread(producer_frames, base_url)
+            client_cpu_before = os.times()
+            started = perf_counter()
+
+            await asyncio.sleep(duration)
+
+            window = perf_counter() - started
+            server_after = process_usage(server_pid)
+            frames_after = await asyncio.to_thread(producer_frames, base_url)
+            client_cpu_after = os.times()
+
+            summaries = [stats.summary(window) for stats in clients]
+            client_fps = [summary['fps'] for summary in summaries]
+            jitters = [summary['jitter_ms'] for summary in summaries if summary['jitter_ms'] is not None]
+
+            steps.append({
+                'clients' : count,
+                'window_seconds' : round(window, 3),
+                'producer_fps' : round((frames_after - frames_before) / window, 2) \
+                    if frames_before is not None and frames_after is not None else None,
+                'client_fps' : {
+                    'min' : min(client_fps),
+                    'median' : statistics.median(client_fps),
+                    'max' : max(client_fps)
+                },
+                'mean_jitter_ms' : round(statistics.fmean(jitters), 2) if jitters else None,
+                'total_bytes_per_second' : sum(summary['bytes_per_second'] for summary in summaries),
+                'server_cpu_percent' : round((server_after[0] - server_before[0]) / window * 100, 1) \
+                    if server_before and server_after else None,
+                'server_rss_mb' : round(server_after[1] / 2 ** 20, 1) if server_after else None,
+                # The load generator competes for the same cores when run on the device, its own share is reported.
+                'load_generator_cpu_percent' : round(
+                    ((client_cpu_after.user + client_cpu_after.system) - (client_cpu_before.user + client_cpu_before.system)) / window * 100, 1
+                ),
+                'errors' : sorted({summary['error'] for summary in summaries if summary['error']}),
+                'per_client' : summaries
+            })
+
+    finally:
+
+        stop.set()
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return steps
+
+
+def print_table(steps : list[dict]) -> None:
+
+    print(
+        f"{'clients':>8}{'producer fps':>14}{'min fps':>10}{'median fps':>12}{'jitter ms':>11}{'MB/s':>9}"
+        f"{'server cpu %':>14}{'rss MB':>9}{'errors':>8}",
+        file=sys.stderr
+    )
+
+    for step in steps:
+
+        values = (
+            step['clients'], step['producer_fps'], step['client_fps']['min'], step['client_fps']['median'],
+            step['mean_jitter_ms'], round(step['total_bytes_per_second'] / 2 ** 20, 2), step['server_cpu_percent'],
+            step['server_rss_mb'], len(step['errors'])
+        )
+
+        print(''.join(f'{str(value if value is not None else "-"):>{width}}' for value, width in zip(values, (8, 14, 10, 12, 11, 9, 14, 9, 8))), file=sys.stderr)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Load test the streaming endpoints with concurrent viewers.')
+    parser.add_argument('--clients', default='1,2,4,8', help='Comma separated client counts to ramp through.')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds each step is measured for.')
+    parser.add_argument('--settle', type=float, default=2.0, help='Seconds after clients connect before measuring.')
+    parser.add_argument('--url', help='Base URL of a running app, otherwise one is started on a synthetic source.')
+    parser.add_argument('--stream-url', help='Base URL streams are served from when it differs from --url.')
+    parser.add_argument('--server-pid', type=int, help='Local process of a running app to sample CPU and memory of.')
+    parser.add_argument('--stream-mode', choices=('flask', 'asyncio'), default='flask', help='STREAM_MODE of a started app.')
+    parser.add_argument('--server-log', help='Write the started app\'s output here.')
+    parser.add_argument('--path', default='/video_feed', help='Stream path, e.g. /video_feed/<camera>.')
+    parser.add_argument('--query', default='', help='Variant query string, e.g. scale=0.5&fps=10.')
+    parser.add_argument('--min-client-fps', type=float, help='Exit non-zero if the median client frame rate of any step falls below this.')
+    parser.add_argument('--output', help='Write results JSON here, defaults to stdout.')
+    args = parser.parse_args()
+
+    client_counts = sorted(int(count) for count in args.clients.split(','))
+
+    process = None
+
+    if args.url:
+        base_url = args.url.rstrip('/')
+        stream_base_url = (args.stream_url or base_url).rstrip('/')
+        server_pid = args.server_pid
+    else:
+        process, base_url, stream_base_url = start_server(args.stream_mode, args.server_log)
+        server_pid = process.pid
+
+    try:
+
+        wait_until_ready(base_url, timeout=60, process=process)
+
+        stream_url = stream_base_url + args.path + (f'?{args.query}' if args.query else '')
+
+        steps = asyncio.run(ramp(stream_url, base_url, client_counts, args.duration, args.settle, server_pid))
+
+    finally:
+
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    results = {
+        'stream_url' : stream_url,
+        'parameters' : {'clients' : client_counts, 'duration' : args.duration, 'settle' : args.settle, 'stream_mode' : args.stream_mode},
+        'steps' : steps
+    }
+
+    print_table(steps)
+
+    output = json.dumps(results, indent=4)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+    if args.min_client_fps is not None:
+
+        failing = [step['clients'] for step in steps if step['client_fps']['median'] < args.min_client_fps]
+
+        if failing:
+            print(f'Median client frame rate fell below {args.min_client_fps} fps at {failing} clients.', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
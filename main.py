@@ -1,4 +1,7 @@
 from app import build_app
+from app.StreamServer import StreamServer
+from app.settings import STREAM_MODE, STREAM_PORT
+import threading
 import os
 
 def main():
@@ -6,13 +9,22 @@ def main():
     # Create an instance of the application. 
     app = build_app()
 
+    # Serve streaming endpoints from a single event loop, Flask continues to serve the pages.
+    if STREAM_MODE == 'asyncio':
+
+        stream_server = StreamServer(app, host=os.getenv('HOST'), port=STREAM_PORT)
+
+        threading.Thread(target=stream_server.run, name='stream-server', daemon=True).start()
+
     # Run server with set variables. 
     app.run(
         host=os.getenv('HOST'),
         port=os.getenv('PORT'),
-        debug=os.getenv('DEBUG')
+        debug=os.getenv('DEBUG'),
+        # The camera can only be owned by one process, the reloader would spawn a second.
+        use_reloader=False
     )
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
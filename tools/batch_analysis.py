@@ -0,0 +1,368 @@
+'''
+    Replay recorded footage through detection, tracking and threat handling faster than real time. Timers such as
+        escalation and deregistration run on a simulated clock driven by each file's frame rate, so results match what
+        the live pipeline would have produced watching the same footage.
+
+    Usage:
+        python -m tools.batch_analysis videos/*.mp4 --output events.jsonl
+        python -m tools.batch_analysis long.mp4 --segment-seconds 120 --workers 4 --format csv --output tracks.csv
+'''
+
+from app.utils.cv_utils.ObjectDetection import ObjectDetection
+from app.utils.cv_utils.ObjectTracking import ObjectTracking
+from app.utils.cv_utils.ThreatManagement import ThreatManagement
+from app.utils.SimulatedClock import SimulatedClock
+from app.settings import DEFAULT_SETTINGS
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from time import perf_counter
+import argparse
+import tempfile
+import json
+import csv
+import sys
+import cv2
+import os
+
+
+# Columns of the CSV output, one row per tracked object or event per frame.
+CSV_COLUMNS : tuple[str, ...] = ('file', 'frame', 'time', 'event', 'ID', 'threat_level', 'x1', 'y1', 'x2', 'y2')
+
+
+class FrameAnalyser(object):
+
+    '''
+        Detection, tracking and threat handling for one stream of frames, wired together as the live pipeline wires
+            them, reporting each frame as a compact record of its tracks and the events raised on it.
+    '''
+
+    def __init__(
+            self,
+            settings : dict,
+            captures_dir : str | None = None,
+            detector_options : dict | None = None,
+            tracker_options : dict | None = None
+        ):
+
+        '''
+            Paramaters:
+                * settings (dict) : Application settings, the motion_detection section is applied.
+                * captures_dir (str | None) : Write frames of threats here, None to only record them.
+                * detector_options (dict | None) : ObjectDetection attributes to override, e.g. tile_grid.
+                * tracker_options (dict | None) : ObjectTracking arguments, e.g. DEREGISTRATION_TIME.
+        '''
+
+        self.clock = SimulatedClock()
+
+        self.object_detection = ObjectDetection()
+        self.object_tracking = ObjectTracking(clock=self.clock, **(tracker_options or {}))
+        self.threat_manager = ThreatManagement(
+            CLIENT_USERNAME=None,
+            CLIENT_PASSWORD=None,
+            TARGET_EMAIL=None,
+            MAX_THREAT_LEVEL=3,
+            CAPTURES_DIR=captures_dir or tempfile.gettempdir()
+        )
+
+        # Replayed footage never emails, and only writes captures when asked to.
+        self.threat_manager.CAPTURES_ENABLED = bool(captures_dir)
+        self.threat_manager.clock = self.clock
+        self.threat_manager.ALERTS_ENABLED = False
+
+        for attribute, value in (detector_options or {}).items():
+            setattr(self.object_detection, attribute, value)
+
+        for module in (self.object_detection, self.object_tracking, self.threat_manager):
+            module.update_settings(settings.get('motion_detection', {}))
+
+        self.prev_frame = None
+
+        # Tracks which have reached the maximum threat level, reported once each.
+        self.exceeded = set()
+
+
+    def analyse(self, frame, timestamp : float) -> dict:
+
+        '''
+            Run a frame through the pipeline logic at a simulated time.
+
+            Paramaters:
+                * frame (np.ndarray) : BGR or greyscale frame.
+                * timestamp (float) : Seconds since the start of the footage the frame was captured at.
+            Returns:
+                * record (dict) : Detections found, tracks held as [ID, threat level, x1, y1, x2, y2] and events raised
+                    as [event, ID].
+        '''
+
+        self.clock.set(timestamp)
+
+        previous_levels = {ID : detection['threat_level'] for ID, detection in self.object_tracking.tracked_objects.items()}
+        next_ID = self.object_tracking.ID_increment_counter
+
+        detection_bboxes = []
+
+        if self.prev_frame is not None and self.prev_frame.shape == frame.shape:
+            detection_bboxes = self.object_detection.detect_motion(self.prev_frame, frame)[1]
+
+        # Tracks are still escalated and pruned through frames without detections, as in the live pipeline.
+        if detection_bboxes:
+            tracked_detections = self.object_tracking.update_tracker(detection_bboxes)
+        else:
+            tracked_detections = self.object_tracking.tick()
+
+        self.threat_manager.handle_threats(tracked_detections, frame)
+
+        self.prev_frame = frame
+
+        current_levels = {ID : detection['threat_level'] for ID, detection in self.object_tracking.tracked_objects.items()}
+
+        events = [['register', ID] for ID in current_levels if ID >= next_ID]
+        events += [['escalate', ID] for ID, level in current_levels.items() if level > previous_levels.get(ID, level)]
+        events += [['prune', ID] for ID in previous_levels if ID not in current_levels]
+
+        for detection in tracked_detections:
+            if detection['threat_level'] >= self.threat_manager.MAX_THREAT_LEVEL and detection['ID'] not in self.exceeded:
+                self.exceeded.add(detection['ID'])
+                events.append(['exceed', detection['ID']])
+
+        return {
+            'time' : round(timestamp, 3),
+            'detections' : len(detection_bboxes),
+            'global_change' : self.object_detection.global_change,
+            'tracks' : [
+                [detection['ID'], detection['threat_level'], *(detection['bboxes'][key] for key in ('x1', 'y1', 'x2', 'y2'))]
+                for detection in tracked_detections
+            ],
+            'events' : events
+        }
+
+
+def probe_video(path : str) -> tuple[int, float]:
+
+    ''' Frame count and frame rate of a video file. '''
+
+    capture = cv2.VideoCapture(path)
+
+    if not capture.isOpened():
+        raise RuntimeError(f'Failed to open video file {path}')
+
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(cv2.CAP_PROP_FPS)
+
+    capture.release()
+
+    return frame_count, fps
+
+
+def plan_jobs(paths : list[str], segment_seconds : float, fps_override : float | None) -> list[dict]:
+
+    '''
+        Split the files into jobs for the process pool, whole files or fixed length segments of them. Tracks are not
+            carried across segment boundaries, so segments trade a little continuity for parallelism within a file.
+    '''
+
+    jobs = []
+
+    for path in paths:
+
+        frame_count, fps = probe_video(path)
+        fps = fps_override or fps or 30.0
+
+        segment_frames = int(segment_seconds * fps) if segment_seconds else frame_count or sys.maxsize
+
+        for start in range(0, max(frame_count, 1), max(segment_frames, 1)):
+            jobs.append({'path' : path, 'start' : start, 'end' : start + segment_frames, 'fps' : fps})
+
+    return jobs
+
+
+def analyse_segment(job : dict, settings : dict, captures_dir : str | None = None, detector_options : dict | None = None) -> dict:
+
+    '''
+        Analyse one job, intended to run in a worker process.
+
+        Returns:
+            * result (dict) : The job, its per frame records and decode and analysis time in seconds.
+    '''
+
+    # Each worker already has a core of its own, OpenCV's internal threads would only contend for them.
+    cv2.setNumThreads(1)
+
+    started = perf_counter()
+
+    capture = cv2.VideoCapture(job['path'])
+
+    if job['start']:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, job['start'])
+
+    records = []
+    decode_seconds = analysis_seconds = 0.0
+
+    # Threat handling logs to stdout, which may be carrying the per frame output.
+    with redirect_stdout(sys.stderr):
+
+        analyser = FrameAnalyser(settings, captures_dir, detector_options)
+
+        for index in range(job['start'], job['end']):
+
+            mark = perf_counter()
+            success, frame = capture.read()
+            decoded = perf_counter()
+
+            if not success:
+                break
+
+            record = analyser.analyse(frame, index / job['fps'])
+            record['frame'] = index
+            records.append(record)
+
+            analysis_seconds += perf_counter() - decoded
+            decode_seconds += decoded - mark
+
+    capture.release()
+
+    return {
+        'job' : job,
+        'records' : records,
+        'decode_seconds' : decode_seconds,
+        'analysis_seconds' : analysis_seconds,
+        'wall_seconds' : perf_counter() - started
+    }
+
+
+def run_jobs(jobs : list[dict], settings : dict, workers : int, captures_dir : str | None = None, detector_options : dict | None = None) -> list[dict]:
+
+    ''' Analyse jobs across a process pool, returning results in job order. '''
+
+    if workers <= 1:
+        return [analyse_segment(job, settings, captures_dir, detector_options) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+
+        futures = [pool.submit(analyse_segment, job, settings, captures_dir, detector_options) for job in jobs]
+
+        return [future.result() for future in futures]
+
+
+def summarise(results : list[dict], wall_seconds : float, workers : int) -> dict:
+
+    ''' Throughput overall and per file, as frames per second and multiples of real time. '''
+
+    files = {}
+
+    for result in results:
+
+        job = result['job']
+        summary = files.setdefault(job['path'], {'frames' : 0, 'footage_seconds' : 0.0, 'decode_seconds' : 0.0, 'analysis_seconds' : 0.0})
+
+        summary['frames'] += len(result['records'])
+        summary['footage_seconds'] += len(result['records']) / job['fps']
+        summary['decode_seconds'] += result['decode_seconds']
+        summary['analysis_seconds'] += result['analysis_seconds']
+
+    for summary in files.values():
+        busy = summary['decode_seconds'] + summary['analysis_seconds']
+        summary['frames_per_second'] = round(summary['frames'] / busy, 1) if busy else None
+        summary['analysis_ms_per_frame'] = round(summary['analysis_seconds'] / summary['frames'] * 1000, 3) if summary['frames'] else None
+
+        for key in ('footage_seconds', 'decode_seconds', 'analysis_seconds'):
+            summary[key] = round(summary[key], 3)
+
+    frames = sum(summary['frames'] for summary in files.values())
+    footage = sum(summary['footage_seconds'] for summary in files.values())
+
+    return {
+        'workers' : workers,
+        'jobs' : len(results),
+        'frames' : frames,
+        'wall_seconds' : round(wall_seconds, 3),
+        'frames_per_second' : round(frames / wall_seconds, 1) if wall_seconds else None,
+        'realtime_factor' : round(footage / wall_seconds, 2) if wall_seconds else None,
+        'files' : files
+    }
+
+
+def write_json(results : list[dict], output, changes_only : bool) -> None:
+
+    ''' One JSON object per frame. '''
+
+    for result in results:
+        for record in result['records']:
+            if not changes_only or record['tracks'] or record['events']:
+                output.write(json.dumps({'file' : result['job']['path'], 'frame' : record['frame'], **record}, separators=(',', ':')) + '\n')
+
+
+def write_csv(results : list[dict], output, changes_only : bool) -> None:
+
+    ''' One row per tracked object and per event on each frame, frames with neither get one empty row unless skipped. '''
+
+    writer = csv.writer(output)
+    writer.writerow(CSV_COLUMNS)
+
+    for result in results:
+
+        path = result['job']['path']
+
+        for record in result['records']:
+
+            rows = [[path, record['frame'], record['time'], 'track', *track] for track in record['tracks']]
+            rows += [[path, record['frame'], record['time'], event, ID] for event, ID in record['events']]
+
+            if not rows and not changes_only:
+                rows = [[path, record['frame'], record['time'], '']]
+
+            writer.writerows(rows)
+
+
+def load_settings(path : str | None) -> dict:
+
+    ''' Settings file in the application's format, the defaults if none is given. '''
+
+    if not path:
+        return DEFAULT_SETTINGS
+
+    with open(path) as settings_file:
+        return {**DEFAULT_SETTINGS, **json.load(settings_file)}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Run detection, tracking and threat handling over recorded video.')
+    parser.add_argument('videos', nargs='+', help='Video files to analyse.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes to analyse jobs across.')
+    parser.add_argument('--segment-seconds', type=float, default=0, help='Split files into segments of this length, 0 for whole files.')
+    parser.add_argument('--fps', type=float, help='Frame rate to assume, overriding the files own.')
+    parser.add_argument('--settings', help='Settings JSON in the application format, defaults to the built in defaults.')
+    parser.add_argument('--captures-dir', help='Write frames of threats here, by default they are only recorded as events.')
+    parser.add_argument('--format', choices=('json', 'csv'), default='json', help='Per frame output format.')
+    parser.add_argument('--output', help='Write per frame output here, defaults to stdout.')
+    parser.add_argument('--changes-only', action='store_true', help='Omit frames without tracks or events.')
+    parser.add_argument('--summary', help='Write the throughput summary here, defaults to stderr.')
+    args = parser.parse_args()
+
+    settings = load_settings(args.settings)
+    jobs = plan_jobs(args.videos, args.segment_seconds, args.fps)
+
+    started = perf_counter()
+    results = run_jobs(jobs, settings, min(args.workers, len(jobs)), args.captures_dir)
+    wall_seconds = perf_counter() - started
+
+    writer = write_csv if args.format == 'csv' else write_json
+
+    if args.output:
+        with open(args.output, 'w', newline='') as output:
+            writer(results, output, args.changes_only)
+    else:
+        writer(results, sys.stdout, args.changes_only)
+
+    summary = json.dumps(summarise(results, wall_seconds, min(args.workers, len(jobs))), indent=4)
+
+    if args.summary:
+        with open(args.summary, 'w') as summary_file:
+            summary_file.write(summary)
+    else:
+        print(summary, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
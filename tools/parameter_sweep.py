@@ -0,0 +1,397 @@
+'''
+    Sweep motion detection and tracking parameters over labelled clips, reporting the accuracy and per frame CPU cost of
+        each setting so one both accurate and cheap enough for the Pi can be chosen.
+
+    Clips are labelled by a JSON file alongside each, clip.mp4 -> clip.labels.json, giving the boxes expected on each
+        evaluated frame. Frames absent from "boxes" are only evaluated, as empty, when they fall within "evaluate".
+
+        {"evaluate" : [0, 300], "boxes" : {"42" : [[x1, y1, x2, y2]], "43" : [[x1, y1, x2, y2]]}}
+
+    Usage:
+        python -m tools.parameter_sweep clips/*.mp4 --param sensitivity=40,100,200 --param binarisation_threshold=60,90
+        python -m tools.parameter_sweep clips/*.mp4 --random 40 --param merge_distance=80:240 --output sweep.json
+'''
+
+from tools.batch_analysis import FrameAnalyser, probe_video, load_settings
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from time import perf_counter, process_time
+import numpy as np
+import itertools
+import argparse
+import tempfile
+import hashlib
+import random
+import json
+import sys
+import cv2
+import os
+
+
+# Tunable parameters, the module each belongs to and its type. Sensitivity is a user setting, the rest are constants.
+PARAMETERS : dict[str, tuple[str, type]] = {
+    'sensitivity' : ('settings', int),
+    'binarisation_threshold' : ('detector', int),
+    'merge_distance' : ('detector', int),
+    'EUCLIDEAN_DISTANCE_THRESHOLD' : ('tracker', int),
+    'DEREGISTRATION_TIME' : ('tracker', float),
+}
+
+# Values swept when none are given, bracketing the current defaults.
+DEFAULT_SPACE : dict[str, list] = {
+    'sensitivity' : [40, 100, 200],
+    'binarisation_threshold' : [60, 90, 120],
+    'merge_distance' : [80, 160],
+    'EUCLIDEAN_DISTANCE_THRESHOLD' : [125],
+    'DEREGISTRATION_TIME' : [4],
+}
+
+
+def parse_space(specs : list[str]) -> dict[str, list | tuple]:
+
+    '''
+        Parse name=a,b,c value lists and name=low:high ranges. Ranges can only be sampled, by a random search.
+
+        Returns:
+            * space (dict[str, list | tuple]) : Values of each parameter, or (low, high) for ranges.
+    '''
+
+    space = {}
+
+    for spec in specs:
+
+        name, _, values = spec.partition('=')
+
+        if name not in PARAMETERS:
+            raise ValueError(f'Unknown parameter {name}, expected one of {", ".join(PARAMETERS)}.')
+
+        cast = PARAMETERS[name][1]
+
+        if ':' in values:
+            low, high = (cast(value) for value in values.split(':'))
+            space[name] = (low, high)
+        else:
+            space[name] = [cast(value) for value in values.split(',')]
+
+    return space or DEFAULT_SPACE
+
+
+def grid_trials(space : dict) -> list[dict]:
+
+    ''' Every combination of the listed values. '''
+
+    if any(isinstance(values, tuple) for values in space.values()):
+        raise ValueError('Ranges can only be sampled, pass --random or list values instead.')
+
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def random_trials(space : dict, count : int, seed : int) -> list[dict]:
+
+    ''' Distinct random draws, uniformly from ranges and by choice from lists. '''
+
+    generator = random.Random(seed)
+    trials = []
+
+    # Small spaces run out of distinct combinations, give up drawing well before looping forever.
+    for _ in range(count * 20):
+
+        trial = {}
+
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                cast = PARAMETERS[name][1]
+                trial[name] = round(generator.uniform(*values), 2) if cast is float else generator.randint(*values)
+            else:
+                trial[name] = generator.choice(values)
+
+        if trial not in trials:
+            trials.append(trial)
+
+        if len(trials) == count:
+            break
+
+    return trials
+
+
+def load_labels(path : str, frame_count : int) -> dict[int, list[list[int]]]:
+
+    ''' Expected boxes keyed by the index of each evaluated frame. '''
+
+    with open(os.path.splitext(path)[0] + '.labels.json') as labels_file:
+        labels = json.load(labels_file)
+
+    boxes = {int(index) : frame_boxes for index, frame_boxes in labels.get('boxes', {}).items()}
+
+    if 'evaluate' in labels:
+        start, end = labels['evaluate']
+        boxes = {index : boxes.get(index, []) for index in range(start, min(end, frame_count))} | boxes
+
+    return boxes
+
+
+def cache_frames(path : str, cache_dir : str) -> str:
+
+    '''
+        Decode a clip once and store it as greyscale frames, which every trial then memory maps instead of decoding and
+            converting the clip again. The cache is keyed by the file's path, size and modification time.
+
+        Returns:
+            * cache_path (str) : Path of the cached (frames, height, width) array.
+    '''
+
+    stat = os.stat(path)
+    key = hashlib.sha1(f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f'{os.path.splitext(os.path.basename(path))[0]}-{key}.npy')
+
+    if os.path.exists(cache_path):
+        return cache_path
+
+    capture = cv2.VideoCapture(path)
+    frames = []
+
+    while True:
+
+        success, frame = capture.read()
+
+        if not success:
+            break
+
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+
+    capture.release()
+
+    if not frames:
+        raise RuntimeError(f'No frames could be decoded from {path}')
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Written under a temporary name first so an interrupted run never leaves a truncated cache behind.
+    partial_path = cache_path + '.partial.npy'
+    np.save(partial_path, np.stack(frames))
+    os.replace(partial_path, cache_path)
+
+    return cache_path
+
+
+def box_iou(box_a, box_b) -> float:
+
+    ''' Intersection over union of two x1, y1, x2, y2 boxes. '''
+
+    width = min(box_a[2], box_b[2]) - max(box_a[0], box_b[0])
+    height = min(box_a[3], box_b[3]) - max(box_a[1], box_b[1])
+
+    if width <= 0 or height <= 0:
+        return 0.0
+
+    intersection = width * height
+    union = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1]) + (box_b[2] - box_b[0]) * (box_b[3] - box_b[1]) - intersection
+
+    return intersection / union if union else 0.0
+
+
+def match_boxes(predicted : list, expected : list, iou_threshold : float) -> int:
+
+    ''' Greedily pair predicted with expected boxes best overlap first, returning how many pairs clear the threshold. '''
+
+    pairs = sorted(
+        ((box_iou(box_a, box_b), index_a, index_b) for index_a, box_a in enumerate(predicted) for index_b, box_b in enumerate(expected)),
+        reverse=True
+    )
+
+    used_a, used_b = set(), set()
+
+    for iou, index_a, index_b in pairs:
+
+        if iou < iou_threshold:
+            break
+
+        if index_a not in used_a and index_b not in used_b:
+            used_a.add(index_a)
+            used_b.add(index_b)
+
+    return len(used_a)
+
+
+def run_trial(trial : dict, clip : dict, settings : dict, iou_threshold : float) -> dict:
+
+    '''
+        Replay a cached clip with one setting, intended to run in a worker process.
+
+        Returns:
+            * result (dict) : Match counts over the evaluated frames, tracks registered, alerts raised and CPU seconds.
+    '''
+
+    # Each worker already has a core of its own, and CPU time is only comparable between trials single threaded.
+    cv2.setNumThreads(1)
+
+    frames = np.load(clip['cache_path'], mmap_mode='r')
+    labels = {int(index) : boxes for index, boxes in clip['labels'].items()}
+
+    options = {'settings' : {}, 'detector' : {}, 'tracker' : {}}
+
+    for name, value in trial.items():
+        options[PARAMETERS[name][0]][name] = value
+
+    settings = {**settings, 'motion_detection' : {**settings.get('motion_detection', {}), **options['settings']}}
+
+    true_positives = false_positives = false_negatives = alerts = 0
+    cpu_seconds = 0.0
+
+    with redirect_stdout(sys.stderr):
+
+        analyser = FrameAnalyser(settings, detector_options=options['detector'], tracker_options=options['tracker'])
+
+        for index in range(len(frames)):
+
+            # Copy out of the memory map so page faults are not billed to the trial.
+            frame = np.array(frames[index])
+
+            mark = process_time()
+            record = analyser.analyse(frame, index / clip['fps'])
+            cpu_seconds += process_time() - mark
+
+            alerts += sum(1 for event, _ in record['events'] if event == 'exceed')
+
+            if index not in labels:
+                continue
+
+            predicted = [track[2:] for track in record['tracks']]
+            matched = match_boxes(predicted, labels[index], iou_threshold)
+
+            true_positives += matched
+            false_positives += len(predicted) - matched
+            false_negatives += len(labels[index]) - matched
+
+    return {
+        'frames' : len(frames),
+        'true_positives' : true_positives,
+        'false_positives' : false_positives,
+        'false_negatives' : false_negatives,
+        'tracks_registered' : analyser.object_tracking.ID_increment_counter - 1,
+        'alerts' : alerts,
+        'cpu_seconds' : cpu_seconds
+    }
+
+
+def score(trial : dict, results : list[dict]) -> dict:
+
+    ''' Combine a setting's results across clips into precision, recall, F1 and CPU milliseconds per frame. '''
+
+    totals = {key : sum(result[key] for result in results) for key in results[0]}
+
+    predicted = totals['true_positives'] + totals['false_positives']
+    expected = totals['true_positives'] + totals['false_negatives']
+
+    precision = totals['true_positives'] / predicted if predicted else 1.0
+    recall = totals['true_positives'] / expected if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    return {
+        'parameters' : trial,
+        'precision' : round(precision, 4),
+        'recall' : round(recall, 4),
+        'f1' : round(f1, 4),
+        'cpu_ms_per_frame' : round(totals['cpu_seconds'] / totals['frames'] * 1000, 3),
+        'tracks_registered' : totals['tracks_registered'],
+        'alerts' : totals['alerts'],
+    }
+
+
+def mark_pareto_front(scores : list[dict]) -> None:
+
+    ''' Flag settings no other setting beats on both F1 and CPU cost, the shortlist worth choosing between. '''
+
+    for candidate in scores:
+        candidate['pareto'] = not any(
+            other['f1'] >= candidate['f1'] and other['cpu_ms_per_frame'] <= candidate['cpu_ms_per_frame'] and
+            (other['f1'] > candidate['f1'] or other['cpu_ms_per_frame'] < candidate['cpu_ms_per_frame'])
+            for other in scores
+        )
+
+
+def sweep(trials : list[dict], clips : list[dict], settings : dict, workers : int, iou_threshold : float) -> list[dict]:
+
+    ''' Run every trial over every clip across a process pool, best F1 first and cheapest first between equals. '''
+
+    jobs = [(trial, clip) for trial in trials for clip in clips]
+
+    if workers <= 1:
+        results = [run_trial(trial, clip, settings, iou_threshold) for trial, clip in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_trial, *zip(*jobs), itertools.repeat(settings), itertools.repeat(iou_threshold)))
+
+    scores = [score(trial, results[index * len(clips):(index + 1) * len(clips)]) for index, trial in enumerate(trials)]
+
+    mark_pareto_front(scores)
+
+    return sorted(scores, key=lambda entry: (-entry['f1'], entry['cpu_ms_per_frame']))
+
+
+def print_table(scores : list[dict]) -> None:
+
+    ''' Scores as an aligned table, Pareto optimal settings starred. '''
+
+    names = list(scores[0]['parameters'])
+    header = [*names, 'precision', 'recall', 'f1', 'cpu ms/frame', 'tracks', 'alerts']
+
+    rows = [
+        [*(str(entry['parameters'][name]) for name in names), *(str(entry[key]) for key in ('precision', 'recall', 'f1', 'cpu_ms_per_frame', 'tracks_registered', 'alerts'))]
+        for entry in scores
+    ]
+
+    widths = [max(len(row[column]) for row in [header, *rows]) for column in range(len(header))]
+
+    print('  ' + '  '.join(value.ljust(width) for value, width in zip(header, widths)))
+
+    for entry, row in zip(scores, rows):
+        print(('* ' if entry['pareto'] else '  ') + '  '.join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Sweep motion detection and tracking parameters over labelled clips.')
+    parser.add_argument('clips', nargs='+', help='Video files, each labelled by a .labels.json file alongside it.')
+    parser.add_argument('--param', action='append', default=[], help=f'name=a,b,c or name=low:high, names: {", ".join(PARAMETERS)}.')
+    parser.add_argument('--random', type=int, help='Sample this many settings rather than running the full grid.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for random search.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes to run trials across.')
+    parser.add_argument('--iou', type=float, default=0.3, help='Overlap a track needs with a labelled box to count as finding it.')
+    parser.add_argument('--settings', help='Settings JSON in the application format, for parameters not being swept.')
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'rpi-security-sweep'), help='Where decoded clips are cached.')
+    parser.add_argument('--output', help='Write the scores as JSON.')
+    args = parser.parse_args()
+
+    space = parse_space(args.param)
+    trials = random_trials(space, args.random, args.seed) if args.random else grid_trials(space)
+
+    started = perf_counter()
+
+    clips = []
+
+    for path in args.clips:
+
+        frame_count, fps = probe_video(path)
+
+        clips.append({
+            'path' : path,
+            'fps' : fps or 30.0,
+            'cache_path' : cache_frames(path, args.cache_dir),
+            'labels' : load_labels(path, frame_count)
+        })
+
+    print(f'Running {len(trials)} settings over {len(clips)} clips across {args.workers} workers.', file=sys.stderr)
+
+    scores = sweep(trials, clips, load_settings(args.settings), args.workers, args.iou)
+
+    print_table(scores)
+    print(f'\nFinished in {perf_counter() - started:.1f}s, * marks settings no other beats on both F1 and CPU cost.')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(scores, output, indent=4)
+
+
+if __name__ == '__main__':
+    main()